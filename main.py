@@ -26,14 +26,16 @@ def main():
     # Creates PMF class object and produces the corresponding PMF graph in the figures folder
     PMF = pmf.PMF(PATH_TO_PMF_JSONS, PMF_json, file_name, PATH_TO_FIGURES, plot_PMF=True)
 
-    # Create a GEFII object based on the PMF_json object.
-    GEFII = gefii.GEFII(PATH_TO_GEFII_JSONS, PATH_TO_FIGURES, PMF_json,
-                        file_name, plot_CS=True,plot_GEFII=True
+    # Create a GEFII object based on the model of the PMF, which is not parsed
+    # again. It is fully validated below, so the construction skips validation.
+    GEFII = gefii.GEFII(PATH_TO_GEFII_JSONS, PATH_TO_FIGURES, PMF.PMF_model,
+                        file_name, plot_CS=True,plot_GEFII=True,
+                        validation=utils.VALIDATION_NONE
                         )
     # Checks if the produced object is well-formed and valid given the GEFII JSON schema.
     GEFII.validate_GEFII(message=True)
-    # Stores the GEFII graph in the figures folder
-    GEFII.visualize_GEFII(plot_GEFII=True) # FAIL -> want a tree like representation
+    # Stores the GEFII graph, laid out as a tree, in the figures folder
+    GEFII.visualize_GEFII(plot_GEFII=True)
     # Saves the GEFII in a JSON file in the GEFII JSON folder
     GEFII.save_GEFII_to_json()
     
@@ -0,0 +1,337 @@
+import numpy as np
+
+CHOICE = 0
+OUTCOME = 1
+
+def GEFII_dict_from_events(events):
+    """Builds a GEFII dictionary from depth-first events, without recursion.
+
+    Args:
+        events (iterable): Events as yielded by GEFII._iterate_GEFII or
+        GEFIIArrays.iter_events
+
+    Returns:
+        dict: Dict representing either an information-set or an outcome
+        node. The syntax is valid along our default GEFII jschema.
+    """
+    root = None
+    open_nodes = []
+    for event in events:
+        if event[0] == "choice":
+            node = {"children" : [], "kind" : "choice", "information-set" : int(event[2]), "player" : int(event[1])}
+        elif event[0] == "outcome":
+            node = {"payoffs" : int(event[1]), "kind" : "outcome"}
+        else:
+            open_nodes.pop()
+            continue
+        if open_nodes:
+            open_nodes[-1]["children"].append(node)
+        else:
+            root = node
+        if event[0] == "choice":
+            open_nodes.append(node)
+    return root
+
+class GEFIIArrays:
+    """Columnar representation of a GEFII tree. Nodes are numbered in
+    depth-first (pre-)order, hence the subtree of node i is the range of
+    nodes [i, subtree_end[i]). All node attributes are flat numpy arrays.
+    """
+    __slots__ = ("kind", "player", "information_set", "payoff", "parent",
+                 "action", "depth", "subtree_end", "child_offsets", "children")
+
+    def __init__(self, kind, player, information_set, payoff, parent, action, depth, subtree_end,
+                 child_offsets=None, children=None):
+        """Initializes the arrays and derives the children in compressed
+        sparse row format: the children of node i are
+        children[child_offsets[i]:child_offsets[i+1]].
+
+        Args:
+            kind (numpy 1d array): CHOICE or OUTCOME for every node
+            player (numpy 1d array): LO player of choice nodes, -1 for outcomes
+            information_set (numpy 1d array): Information set of choice nodes,
+            -1 for outcomes
+            payoff (numpy 1d array): Payoff of outcome nodes, -1 for choices
+            parent (numpy 1d array): Parent node, -1 for the root
+            action (numpy 1d array): Decision of the parent leading to the
+            node, -1 for the root
+            depth (numpy 1d array): Depth of the node, 0 for the root
+            subtree_end (numpy 1d array): End (excluded) of the node's subtree
+            child_offsets (numpy 1d array, optional): Children offsets, if
+            already derived. Defaults to None.
+            children (numpy 1d array, optional): Children, if already
+            derived. Defaults to None.
+        """
+        self.kind = np.asarray(kind, dtype=np.int8)
+        self.player = np.asarray(player, dtype=np.int64)
+        self.information_set = np.asarray(information_set, dtype=np.int64)
+        self.payoff = np.asarray(payoff, dtype=np.int64)
+        self.parent = np.asarray(parent, dtype=np.int64)
+        self.action = np.asarray(action, dtype=np.int64)
+        self.depth = np.asarray(depth, dtype=np.int64)
+        self.subtree_end = np.asarray(subtree_end, dtype=np.int64)
+        if children is not None:
+            self.child_offsets = np.asarray(child_offsets, dtype=np.int64)
+            self.children = np.asarray(children, dtype=np.int64)
+            return
+        # Children sorted by parent, siblings keep their depth-first order
+        self.children = np.argsort(self.parent[1:], kind="stable") + 1
+        counts = np.bincount(self.parent[1:], minlength=len(self.kind))
+        self.child_offsets = np.zeros(len(self.kind) + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.child_offsets[1:])
+
+    @classmethod
+    def from_numbering(cls, numbering, prefix=(), first_payoff=0, progress=None):
+        """Builds the complete GEFII tree of an InfosetNumbering level by
+        level with vectorized numpy operations. Every path goes through all
+        players in LO order, so the player at depth k is the LO player k and
+        the depth-first position of a node follows from its history.
+
+        Args:
+            numbering (InfosetNumbering): Numbering of the information sets
+            prefix (tuple, optional): Decisions of the first LO players, only
+            the subtree they lead to is built. Defaults to the empty prefix,
+            i.e. the whole tree.
+            first_payoff (int, optional): Payoff of the first outcome node.
+            Defaults to 0.
+            progress (ProgressReporter, optional): Updated with the number of
+            nodes built after every level. Defaults to None.
+
+        Returns:
+            GEFIIArrays: The GEFII tree, or subtree rooted at depth len(prefix)
+        """
+        number_of_players = numbering.number_of_players
+        decisions = numbering.possible_decisions
+        prefix = np.asarray(prefix, dtype=np.int64)
+        prefix_length = len(prefix)
+        # subtree_sizes[k] is the size of any subtree rooted at depth k
+        subtree_sizes = np.ones(number_of_players + 1, dtype=np.int64)
+        for k in range(number_of_players - 1, -1, -1):
+            subtree_sizes[k] = 1 + decisions[k] * subtree_sizes[k + 1]
+        number_of_nodes = int(subtree_sizes[prefix_length])
+        kind = np.full(number_of_nodes, OUTCOME, dtype=np.int8)
+        player = np.full(number_of_nodes, -1, dtype=np.int64)
+        information_set = np.full(number_of_nodes, -1, dtype=np.int64)
+        payoff = np.full(number_of_nodes, -1, dtype=np.int64)
+        parent = np.full(number_of_nodes, -1, dtype=np.int64)
+        action = np.full(number_of_nodes, -1, dtype=np.int64)
+        depth = np.zeros(number_of_nodes, dtype=np.int64)
+        subtree_end = np.zeros(number_of_nodes, dtype=np.int64)
+        # Positions of the nodes at the current depth, in history order
+        positions = np.zeros(1, dtype=np.int64)
+        nodes_built = 0
+        for k in range(prefix_length, number_of_players + 1):
+            depth[positions] = k - prefix_length
+            subtree_end[positions] = positions + subtree_sizes[k]
+            if k == number_of_players:
+                payoff[positions] = first_payoff + np.arange(len(positions))
+                if progress is not None:
+                    progress.update(number_of_nodes)
+                break
+            kind[positions] = CHOICE
+            player[positions] = k
+            # Digits of the predecessors in the histories at depth k, the
+            # history index being the mixed-radix value of the decisions
+            # following the prefix
+            history_index = np.arange(len(positions), dtype=np.int64)
+            digit_strides = np.ones(k, dtype=np.int64)
+            if k - prefix_length > 1:
+                digit_strides[prefix_length:k - 1] = np.cumprod(decisions[prefix_length + 1:k][::-1])[::-1]
+            predecessors = numbering.predecessors[k]
+            in_prefix = predecessors < prefix_length
+            local_informationset = np.full(len(positions), int(prefix[predecessors[in_prefix]] @ numbering.strides[k][in_prefix]),
+                                           dtype=np.int64)
+            predecessors = predecessors[~in_prefix]
+            digits = history_index[:, None] // digit_strides[predecessors] % decisions[predecessors]
+            local_informationset += digits @ numbering.strides[k][~in_prefix]
+            information_set[positions] = numbering.informationset_offsets[k] + local_informationset
+            # Children of every node, decision by decision
+            children_positions = np.add.outer(positions + 1, np.arange(decisions[k]) * subtree_sizes[k + 1])
+            parent[children_positions] = positions[:, None]
+            action[children_positions] = np.arange(decisions[k])[None, :]
+            nodes_built += len(positions)
+            if progress is not None:
+                progress.update(nodes_built)
+            positions = children_positions.ravel()
+        return cls(kind, player, information_set, payoff, parent, action, depth, subtree_end)
+
+    @classmethod
+    def from_events(cls, events):
+        """Builds the arrays from depth-first events.
+
+        Args:
+            events (iterable): Events as yielded by GEFII._iterate_GEFII or
+            GEFIIArrays.iter_events
+
+        Returns:
+            GEFIIArrays: The GEFII tree
+        """
+        kind, player, information_set, payoff, parent, action, depth, subtree_end = [], [], [], [], [], [], [], []
+        # For every open choice node: [node, number of children so far]
+        open_nodes = []
+        for event in events:
+            if event[0] == "end":
+                node = open_nodes.pop()[0]
+                subtree_end[node] = len(kind)
+                continue
+            node = len(kind)
+            if open_nodes:
+                parent.append(open_nodes[-1][0])
+                action.append(open_nodes[-1][1])
+                open_nodes[-1][1] += 1
+            else:
+                parent.append(-1)
+                action.append(-1)
+            depth.append(len(open_nodes))
+            subtree_end.append(node + 1)
+            if event[0] == "choice":
+                kind.append(CHOICE)
+                player.append(event[1])
+                information_set.append(event[2])
+                payoff.append(-1)
+                open_nodes.append([node, 0])
+            else:
+                kind.append(OUTCOME)
+                player.append(-1)
+                information_set.append(-1)
+                payoff.append(event[1])
+        return cls(kind, player, information_set, payoff, parent, action, depth, subtree_end)
+
+    @classmethod
+    def from_dict(cls, GEFII_json):
+        """Builds the arrays from a GEFII dictionary.
+
+        Args:
+            GEFII_json (dict): GEFII dictionary
+
+        Returns:
+            GEFIIArrays: The GEFII tree
+        """
+        def _events():
+            stack = [GEFII_json]
+            while stack:
+                node = stack.pop()
+                if node is None:
+                    yield ("end",)
+                elif node["kind"] == "choice":
+                    yield ("choice", node["player"], node["information-set"], len(node["children"]))
+                    stack.append(None)
+                    stack.extend(reversed(node["children"]))
+                else:
+                    yield ("outcome", node["payoffs"])
+        return cls.from_events(_events())
+
+    @property
+    def number_of_nodes(self):
+        """int: Number of nodes of the tree"""
+        return len(self.kind)
+
+    def children_of(self, node):
+        """Returns the children of a node in decision order.
+
+        Args:
+            node (int): Node index
+
+        Returns:
+            numpy 1d array: Children's node indices
+        """
+        return self.children[self.child_offsets[node]:self.child_offsets[node + 1]]
+
+    def nodes_of_informationset(self, informationset):
+        """Returns all choice nodes of an information set.
+
+        Args:
+            informationset (int): Information set's index
+
+        Returns:
+            numpy 1d array: Node indices
+        """
+        return np.flatnonzero((self.kind == CHOICE) & (self.information_set == informationset))
+
+    def nodes_in_subtrees(self, roots):
+        """Returns a boolean mask of the nodes lying in the subtrees of roots.
+
+        Args:
+            roots (numpy 1d array): Node indices of the subtrees' roots
+
+        Returns:
+            numpy 1d array: Boolean mask over all nodes
+        """
+        delta = np.zeros(self.number_of_nodes + 1, dtype=np.int64)
+        np.add.at(delta, roots, 1)
+        np.add.at(delta, self.subtree_end[roots], -1)
+        return np.cumsum(delta[:-1]) > 0
+
+    def outcomes_under(self, player, decision):
+        """Returns all outcome nodes reached after the given player chose the
+        given decision.
+
+        Args:
+            player (int): Player index in the LO
+            decision (int): Decision of the player
+
+        Returns:
+            numpy 1d array: Node indices of the outcomes
+        """
+        roots = np.flatnonzero(self.action == decision)
+        roots = roots[self.player[self.parent[roots]] == player]
+        return np.flatnonzero(self.nodes_in_subtrees(roots) & (self.kind == OUTCOME))
+
+    def iter_events(self, root=0):
+        """Yields the depth-first events of the tree, in the format of
+        GEFII._iterate_GEFII.
+
+        Args:
+            root (int, optional): Node whose subtree is walked. Defaults to
+            the root of the tree.
+
+        Yields:
+            tuple: ("choice", player, information-set, number of children),
+            ("end",) or ("outcome", payoff)
+        """
+        open_nodes = []
+        for node in range(root, int(self.subtree_end[root])):
+            while open_nodes and self.subtree_end[open_nodes[-1]] <= node:
+                open_nodes.pop()
+                yield ("end",)
+            if self.kind[node] == CHOICE:
+                yield ("choice", int(self.player[node]), int(self.information_set[node]),
+                       int(self.child_offsets[node + 1] - self.child_offsets[node]))
+                open_nodes.append(node)
+            else:
+                yield ("outcome", int(self.payoff[node]))
+        for _ in open_nodes:
+            yield ("end",)
+
+    def to_dict(self):
+        """Returns the GEFII dictionary of the tree.
+
+        Returns:
+            dict: GEFII dictionary valid along our default GEFII jschema
+        """
+        return GEFII_dict_from_events(self.iter_events())
+
+    def validate(self):
+        """Checks the structural consistency of the arrays: node kinds,
+        players and information sets of choice nodes, payoffs of outcome nodes
+        and parent/subtree relations.
+
+        Raises:
+            ValueError: If the arrays do not describe a valid GEFII tree
+        """
+        number_of_nodes = self.number_of_nodes
+        is_choice = self.kind == CHOICE
+        if number_of_nodes == 0:
+            raise ValueError("Error: empty GEFII")
+        if not np.all(is_choice | (self.kind == OUTCOME)):
+            raise ValueError("Error: nor choice nor payoff node")
+        if np.any(self.player[is_choice] < 0) or np.any(self.information_set[is_choice] < 0):
+            raise ValueError("Error: choice node without player or information-set")
+        if np.any(self.payoff[~is_choice] < 0):
+            raise ValueError("Error: outcome node without payoffs")
+        if self.parent[0] != -1 or np.any(self.parent[1:] < 0) or np.any(self.parent[1:] >= np.arange(1, number_of_nodes)):
+            raise ValueError("Error: nodes are not in depth-first order")
+        if not np.all(is_choice[self.parent[1:]]):
+            raise ValueError("Error: outcome node with children")
+        if np.any(self.subtree_end[1:] > self.subtree_end[self.parent[1:]]) or self.subtree_end[0] != number_of_nodes:
+            raise ValueError("Error: subtree is not nested in its parent's subtree")
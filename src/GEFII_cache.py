@@ -0,0 +1,188 @@
+import hashlib
+import json
+import os
+import tempfile
+import zipfile
+import numpy as np
+from src import utils
+from src.GEFII_arrays import GEFIIArrays
+
+def causal_structure_key(PMF_json):
+    """Returns the canonical hash of the causal structure of a PMF, i.e. of
+    the data the conversion to a GEFII depends on (see
+    utils.extract_causal_structure).
+
+    Args:
+        PMF_json (dict or PMFModel): PMF dictionary or model
+
+    Returns:
+        string: Hexadecimal SHA-256 digest
+    """
+    causal_structure = utils.extract_causal_structure(PMF_json)
+    return hashlib.sha256(json.dumps(causal_structure, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+class ConversionCache:
+    """Content-addressed on-disk cache of PMF to GEFII conversions. Every
+    entry is a .npz file named after the causal structure key and holding the
+    GEFII arrays, the LO mapping and optionally T. The total size of the
+    cache is capped, the least recently used entries are evicted first.
+    """
+    def __init__(self, cache_directory, max_bytes=1 << 30):
+        """Initializes the cache, creating its directory if needed.
+
+        Args:
+            cache_directory (string): Directory storing the cache entries
+            max_bytes (int, optional): Size cap of the cache in bytes.
+            Defaults to 1 GiB.
+        """
+        self.cache_directory = cache_directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(cache_directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_directory, key + ".npz")
+
+    def get(self, key):
+        """Returns the cached conversion of a causal structure.
+
+        Args:
+            key (string): Causal structure key
+
+        Returns:
+            dict or None: Dictionary with "GEFII_arrays" (GEFIIArrays),
+            "map_LOplayer2CSplayer" (list) and "T" (list of tuples, or None
+            if T was not stored), or None on a cache miss
+        """
+        path = self._path(key)
+        try:
+            with np.load(path) as entry:
+                GEFII_arrays = GEFIIArrays(*(entry[name] for name in
+                                             ("kind", "player", "information_set", "payoff",
+                                              "parent", "action", "depth", "subtree_end")))
+                map_LOplayer2CSplayer = entry["map_LOplayer2CSplayer"].tolist()
+                T = None
+                if "T_players" in entry:
+                    T = list(zip(entry["T_players"].tolist(), entry["T_histories"],
+                                 entry["T_indices"].tolist()))
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+            self.misses += 1
+            return None
+        # Mark the entry as most recently used, unless another process
+        # evicted it meanwhile
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        self.hits += 1
+        return {"GEFII_arrays": GEFII_arrays, "map_LOplayer2CSplayer": map_LOplayer2CSplayer, "T": T}
+
+    def put(self, key, GEFII_arrays, map_LOplayer2CSplayer, T=None):
+        """Stores a conversion and evicts least recently used entries if the
+        size cap is exceeded. Several processes may store the same key
+        concurrently. Failing to write is not fatal, the conversion is then
+        simply not cached.
+
+        Args:
+            key (string): Causal structure key
+            GEFII_arrays (GEFIIArrays): The converted GEFII
+            map_LOplayer2CSplayer (list): Mapping from LO to CS players
+            T (sequence, optional): Matrix map T to store along. Defaults to
+            None.
+        """
+        arrays = {name: getattr(GEFII_arrays, name)
+                  for name in ("kind", "player", "information_set", "payoff",
+                               "parent", "action", "depth", "subtree_end")}
+        arrays["map_LOplayer2CSplayer"] = np.asarray(map_LOplayer2CSplayer, dtype=np.int64)
+        if T is not None:
+            arrays["T_players"] = np.asarray([entry[0] for entry in T], dtype=np.int64)
+            arrays["T_histories"] = np.asarray([entry[1] for entry in T], dtype=np.int64).reshape(len(T), -1)
+            arrays["T_indices"] = np.asarray([entry[2] for entry in T], dtype=np.int64)
+        # Write to a temporary file of this writer first so that readers
+        # never see partial entries
+        try:
+            descriptor, temporary_path = tempfile.mkstemp(suffix=".tmp", dir=self.cache_directory)
+        except OSError:
+            return
+        try:
+            with os.fdopen(descriptor, "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(temporary_path, self._path(key))
+        except OSError:
+            try:
+                os.remove(temporary_path)
+            except FileNotFoundError:
+                pass
+            return
+        self._evict()
+
+    def _evict(self):
+        """Removes the least recently used entries until the cache fits its
+        size cap."""
+        entries = []
+        for file_name in os.listdir(self.cache_directory):
+            if file_name.endswith(".npz"):
+                # Entries may be removed by other processes meanwhile
+                try:
+                    stat = os.stat(os.path.join(self.cache_directory, file_name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, file_name))
+        total_bytes = sum(entry[1] for entry in entries)
+        for _, size, file_name in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_directory, file_name))
+                self.evictions += 1
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+
+    def clear(self):
+        """Removes all entries from the cache."""
+        for file_name in os.listdir(self.cache_directory):
+            if file_name.endswith(".npz"):
+                os.remove(os.path.join(self.cache_directory, file_name))
+
+    def stats(self):
+        """Returns the hit/miss counters of the cache.
+
+        Returns:
+            dict: Number of hits, misses and evictions
+        """
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+# Cache shared by the conversions of the process, opened by default_cache
+_default_cache = None
+
+def default_cache_directory():
+    """Returns the directory of the default conversion cache: $GEFII_CACHE_DIR
+    if set, otherwise quantumgameconverter in the user's cache folder
+    ($XDG_CACHE_HOME, or ~/.cache).
+
+    Returns:
+        string: Directory of the default cache
+    """
+    if os.environ.get("GEFII_CACHE_DIR"):
+        return os.environ["GEFII_CACHE_DIR"]
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "quantumgameconverter")
+
+def default_cache():
+    """Returns the conversion cache used by GEFII unless told otherwise,
+    opened on first use in default_cache_directory().
+
+    Returns:
+        ConversionCache or None: The default cache, or None if its directory
+        cannot be created, in which case conversions are simply not cached
+    """
+    global _default_cache
+    if _default_cache is None or _default_cache.cache_directory != default_cache_directory():
+        try:
+            _default_cache = ConversionCache(default_cache_directory())
+        except OSError:
+            return None
+    return _default_cache
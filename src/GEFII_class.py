@@ -1,16 +1,23 @@
-import copy
-import json
-import jsonschema
-import networkx as nx
-import matplotlib.pyplot as plt
+import itertools
+import time
+from typing import TYPE_CHECKING
 import numpy as np
 from src import utils
+from src.GEFII_numbering import InfosetNumbering, TableView
+from src.GEFII_arrays import GEFIIArrays, CHOICE
+from src.PMF_model import PMFModel
+from src import instrumentation
+
+if TYPE_CHECKING:
+    import networkx as nx
 
 class GEFII:
     """Game in Extensive Form with Imperfect Information (GEFII) class
     """
     def __init__(self,PATH_TO_GEFII_JSONS, PATH_TO_FIGURES, PMF_json, PMF_name, 
-                 plot_CS=False, plot_GEFII=False
+                 plot_CS=False, plot_GEFII=False, build_T=False, cache=True,
+                 validation=utils.VALIDATION_STRUCTURAL, workers=None, shard_depth=1,
+                 progress=None, profile=instrumentation.PROFILE_NONE
                  ):
         """Initializes a GEFII object by converting a PMF JSON dictionary. The
         GEFII JSON dictionary is checked for well-formedness and valid along
@@ -21,26 +28,58 @@ class GEFII:
             GEFII JSON files.
             PATH_TO_FIGURES (string): Path to desired storage location for all
             PNG figures.
-            PMF_json (dict): Dict object representing a quantum experiment in
-            process matrix format.
+            PMF_json (dict or PMFModel): Dict object representing a quantum
+            experiment in process matrix format, or its PMFModel, e.g. the
+            PMF_model of a PMF object, which is then not parsed again.
             PMF_name (string): Name of the quantum experiment. Will be used for
             sensible file naming.
             plot_CS (bool, optional): If True, stores a visual representation
             of the causal structure graph. Defaults to False.
             plot_GEFII (bool, optional): If True, stores a visual
             representation of the GEFII graph. Defaults to False.
+            Matplotlib is only imported when plotting.
+            build_T (bool or string, optional): If True, materializes the
+            matrix map T and looks information sets up in it. If "vectorized",
+            T is built blockwise as a TableView. Otherwise information sets
+            are numbered in closed form by an InfosetNumbering. All yield the
+            same numbering. Defaults to False.
+            cache (bool or ConversionCache, optional): On-disk cache the
+            conversion is looked up in and stored to, keyed on the causal
+            structure of PMF_json. True uses GEFII_cache.default_cache(),
+            False or None converts without any cache. Defaults to True.
+            validation (string, optional): Validation level of the produced
+            GEFII, one of utils.VALIDATION_LEVELS ("none", "structural" or
+            "full"). Defaults to "structural".
+            workers (int, optional): If given, the subtrees below the first
+            shard_depth players are built in parallel by this many worker
+            processes and stitched together. Defaults to None.
+            shard_depth (int, optional): Number of LO players above the
+            subtrees built in parallel. Defaults to 1.
+            progress (bool or callable, optional): If True, prints the
+            progress and ETA of building T and the tree to stderr. A callable
+            receives the progress events instead, see
+            instrumentation.ProgressReporter. Defaults to None.
+            profile (string, optional): One of instrumentation.PROFILE_MODES,
+            "cprofile" or "tracemalloc" capture the whole conversion in
+            self.stats. Defaults to "none".
         """
         self._PATH_TO_GEFII_JSONS = PATH_TO_GEFII_JSONS
         self._PATH_TO_FIGURES = PATH_TO_FIGURES
         self.GEFII_name = PMF_name
 
-        self.GEFII_json: dict
-        self.CS_graph: nx.DiGraph
-        self.LO: nx.DiGraph
-        self.GEFII_graph: nx.DiGraph
+        self.GEFII_arrays: GEFIIArrays
+        # Model of the converted PMF, edits of apply_delta are not applied to it
+        self.PMF_model: PMFModel
+        self._GEFII_json: dict
+        self.CS_graph: "nx.DiGraph"
+        self.LO: "nx.DiGraph"
+        self._GEFII_graph: "nx.DiGraph"
         self.map_LOplayer2CSplayer: list
+        self.map_CSplayer2LOplayer: dict
         self._predecessors: dict
         self._successors: dict
+        self._predecessors_matrix: np.ndarray
+        self._successors_matrix: np.ndarray
         self.possible_decisions: dict
         self.number_of_players: int
 
@@ -48,79 +87,98 @@ class GEFII:
         self.number_of_payoffs: int
         self.number_of_nodes: int
         
+        self.numbering: InfosetNumbering
         self.T: list
+        self._T_index: dict
         self._informationset_index: int
         self._payoff_index: int
 
-        with open(str(PATH_TO_GEFII_JSONS + "GEFII_schema.jschema"), "r", encoding="utf-8") as GEFII_schema:
-            self.GEFII_schema = json.load(GEFII_schema)
+        # Compiled on first full validation, once per process and shared by
+        # all GEFII objects
+        self._GEFII_schema_path = str(PATH_TO_GEFII_JSONS + "GEFII_schema.jschema")
         self._informationset_increment_bis = -1
         
-        self._convert_PMF_to_GEFII(PMF_json, plot_CS, validate_GEFII=True)
+        self.T = None
+        self._GEFII_json = None
+        self._GEFII_graph = None
+        # Wall time in seconds, peak of allocated bytes when tracemalloc is
+        # tracing and counts of every conversion stage
+        self.stats = instrumentation.ConversionStats(profile)
+        self.timings = self.stats.timings
+        self.memory_peaks = self.stats.memory_peaks
+        self._progress = instrumentation.progress_callback(progress)
+        self._informationset_lookups = 0
+        if cache is True:
+            from src.GEFII_cache import default_cache
+            cache = default_cache()
+        elif cache is False:
+            cache = None
+        self.stats.start_profile()
+        try:
+            self._convert_PMF_to_GEFII(PMF_json, plot_CS, validation=validation, build_T=build_T, cache=cache,
+                                       workers=workers, shard_depth=shard_depth)
+        finally:
+            self.stats.stop_profile()
         self.number_of_nodes = self.number_of_informationsets + self.number_of_payoffs
 
-        self.validate_GEFII(message=False)
         self.visualize_GEFII(plot_GEFII)
 
     def _build_CS_graph(self, PMF_json, plot_CS=False):
-        """Build a networkx DiGraph called CS_graph given the PMF_json dict
+        """Build a networkx DiGraph called CS_graph given the PMF model
 
         Args:
-            PMF_json (dict): python storage of the PMF JSON
+            PMF_json (dict or PMFModel): python storage of the PMF JSON, or
+            its model
             plot_CS (bool, optional): If True, stores a visual representation
             of the causal structure graph. Defaults to False.
         """
-        # Get the Labs and Wires arrays
-        data_dictionary = utils.extract_PMF_data(PMF_json)
-        labs_array = data_dictionary["Labs_array"]
-        wires_array = data_dictionary["Wires_array"]
+        # Labs and wires as flat arrays, CPMaps are not parsed
+        self.PMF_model = PMFModel.from_PMF(PMF_json)
+        model = self.PMF_model
         
         nodes = []
         edges = []
         map_playeridx2labidx = {"a":{},"x":{}}
         nodes_color = []
         nodes_label = {}
-        player_index = 0
-        # Iterate over all labs.
-        for lab in labs_array:
-            # Ignore the start and end labs.
-            lab_idx = lab["Index"]
-            if lab_idx == 0 or lab_idx == 1:
-                pass
-            else:
-                # Add classical decision node
-                player_a = player_index
-                # Get the number of possible measurement axes (i.e. actions)
-                number_of_measurement_axes = len(lab["Measurements"])
-                nodes.append((player_a,
-                              {"number_of_measurement_options": number_of_measurement_axes}
-                              ))
-                nodes_color.append((144/256,238/256,144/256))
-                nodes_label[player_a] = "a" + str(lab_idx)
-                map_playeridx2labidx["a"][lab_idx] = player_a
-                # Add a classical outcome node.
-                player_x = player_index + 1
-                # Get the number of possible measurement outcomes (i.e. actions)
-                number_of_measurement_outcomes = len(lab["Measurements"][0]["CPMaps"])
-                nodes.append((player_x,
-                              {"number_of_measurement_options": number_of_measurement_outcomes}
-                              ))
-                nodes_color.append((255/256,99/256,71/256))
-                nodes_label[player_x] = "x" + str(lab_idx)
-                map_playeridx2labidx["x"][lab_idx] = player_x
-                # Add an edge between both classical nodes of the same lab
-                edges.append((player_a,player_x))
-                # Increment player_idx by 2
-                player_index += 2
-
-        edges.extend([
-            (map_playeridx2labidx["x"][wire["From"]["LabIdx"]],
-             map_playeridx2labidx["x"][wire["To"]["LabIdx"]])
-            for wire in wires_array
-            if wire["From"]["LabIdx"] > 1 and wire["To"]["LabIdx"] > 1
-            ])
+        # Iterate over all labs but the start and end labs.
+        player_labs = model.player_labs
+        for player_index, lab_idx, number_of_measurement_axes, number_of_measurement_outcomes in zip(
+                range(0, 2 * len(player_labs), 2), model.lab_indices[player_labs].tolist(),
+                model.number_of_axes[player_labs].tolist(), model.number_of_outcomes[player_labs].tolist()):
+            # Add classical decision node, whose actions are the possible
+            # measurement axes
+            player_a = player_index
+            nodes.append((player_a,
+                          {"number_of_measurement_options": number_of_measurement_axes}
+                          ))
+            nodes_color.append((144/256,238/256,144/256))
+            nodes_label[player_a] = "a" + str(lab_idx)
+            map_playeridx2labidx["a"][lab_idx] = player_a
+            # Add a classical outcome node, whose actions are the possible
+            # measurement outcomes
+            player_x = player_index + 1
+            nodes.append((player_x,
+                          {"number_of_measurement_options": number_of_measurement_outcomes}
+                          ))
+            nodes_color.append((255/256,99/256,71/256))
+            nodes_label[player_x] = "x" + str(lab_idx)
+            map_playeridx2labidx["x"][lab_idx] = player_x
+            # Add an edge between both classical nodes of the same lab
+            edges.append((player_a,player_x))
 
+        # Outcome player of every lab position, -1 for Start and End
+        map_position2playerx = np.full(model.number_of_labs, -1, dtype=np.int64)
+        map_position2playerx[player_labs] = np.arange(1, 2 * len(player_labs), 2)
+        sources = map_position2playerx[model.wire_sources]
+        targets = map_position2playerx[model.wire_targets]
+        between_players = (sources >= 0) & (targets >= 0)
+        edges.extend(zip(sources[between_players].tolist(), targets[between_players].tolist()))
+
+        # Kept to apply deltas referring to labs
+        self._map_labidx2CSplayer = map_playeridx2labidx
         # Graph plot with networkx
+        import networkx as nx
         self.CS_graph = nx.DiGraph()
         self.CS_graph.add_nodes_from(nodes)
         self.CS_graph.add_edges_from(edges)
@@ -131,67 +189,133 @@ class GEFII:
     def _build_LO_order(self):
         """Build a linear order of the causal structure graph. Additionaly, 
         create a mapping from CS_graph nodes to LO nodes and store for every 
-        LO node its predecessors and successors.
+        LO node its predecessors and successors, both as lists and as rows of
+        boolean matrices for cheap membership tests.
         """
+        import networkx as nx
         # Get linearisation of CS graph
         self.LO = nx.lexicographical_topological_sort(self.CS_graph)
         # maping (as a list) from a LO index to a CS index for players
         self.map_LOplayer2CSplayer = list(self.LO)
-        # LO order indices # HERE maybe recall ancestors descendants
+        # reverse mapping from a CS index to a LO index for players
+        self.map_CSplayer2LOplayer = {CS_player: i for i, CS_player in enumerate(self.map_LOplayer2CSplayer)}
+        # The transitive closure is computed once for all players
+        CS_closure = nx.transitive_closure(self.CS_graph)
+        number_of_players = len(self.map_LOplayer2CSplayer)
+        # LO order indices. Row i of the boolean matrices flags the
+        # predecessors (resp. successors) of the LO player i.
         self._predecessors = {}
-        for i, player in enumerate(self.map_LOplayer2CSplayer):
-            self._predecessors[i] = [self.map_LOplayer2CSplayer.index(CS_player)
-                                    for CS_player
-                                    in list(nx.transitive_closure(self.CS_graph).predecessors(player))]
         self._successors = {}
+        self._predecessors_matrix = np.zeros((number_of_players, number_of_players), dtype=bool)
         for i, player in enumerate(self.map_LOplayer2CSplayer):
-            self._successors[i] = [self.map_LOplayer2CSplayer.index(CS_player) 
-                                  for CS_player in list(nx.transitive_closure(self.CS_graph).successors(player))]
-        
-    def _build_T(self):
+            self._predecessors[i] = [self.map_CSplayer2LOplayer[CS_player]
+                                     for CS_player in CS_closure.predecessors(player)]
+            self._successors[i] = [self.map_CSplayer2LOplayer[CS_player]
+                                   for CS_player in CS_closure.successors(player)]
+            self._predecessors_matrix[i, self._predecessors[i]] = True
+        self._successors_matrix = self._predecessors_matrix.T.copy()
+
+    def _build_T(self, vectorized=False):
         """Build the matrix map T in LO order mapping an incomplete history to
-        an information-set or a complete history to a payoff array."""
-        def _T_recursion(player_index, temp_history):
-            """Recurse through all players to touch every possible history. 
-            Store the tuples (player_index, history, informationset_index) in self.T
-
-            Args:
-                player_index (int): player index
-                temp_history (numpy 1d array): current history in the recursion tree
-            """
-            history = copy.deepcopy(temp_history)
-            # Get the array of unseen predecessors
-            unseen_predecessors = [predecessor
-                                   for predecessor
-                                   in self._predecessors[player_index]
-                                   if history[predecessor] == -1]
-            if len(unseen_predecessors) > 0:
-                next_predecessor = unseen_predecessors[0]
-                # Touched each possible outcome of the predecessor, hence enter further layer of recursion
-                for outcome in range(0, self.possible_decisions[self.map_LOplayer2CSplayer[next_predecessor]]):
-                    history[next_predecessor] = outcome
-                    _T_recursion(player_index, history)
-            else:
-                self.T.append((player_index,history,self._informationset_index))
+        an information-set or a complete history to a payoff array.
+        The histories of a player are enumerated iteratively as the cartesian
+        product of its predecessors' decisions, the first predecessor varying
+        the slowest, in a single history buffer copied only when stored.
+
+        Args:
+            vectorized (bool, optional): If True, enumerates the histories of
+            each player in one numpy operation and stores them as blocks
+            behind a TableView instead of a list of tuples. Defaults to False.
+        """
+        if vectorized:
+            self.T = TableView(self.numbering)
+            self._T_index = None
+            self._informationset_index = self.numbering.number_of_informationsets
+            self._payoff_index = self.numbering.number_of_payoffs
+            self.number_of_informationsets = self._informationset_index
+            self.number_of_payoffs = self._payoff_index
+            return
+        self.T = []
+        self._T_index = {}
+        self._informationset_index = 0
+        self._payoff_index = 0
+        progress = None
+        if self._progress is not None:
+            progress = instrumentation.ProgressReporter(self._progress, "build_T", self.numbering.number_of_informationsets
+                                                        + self.numbering.number_of_payoffs)
+        history = np.atleast_1d(np.full((self.number_of_players),fill_value=-1))
+        for player_index in range(0, self.number_of_players):
+            predecessors = np.asarray(self._predecessors[player_index], dtype=int)
+            decision_ranges = [range(0, self.possible_decisions[self.map_LOplayer2CSplayer[predecessor]])
+                               for predecessor in predecessors]
+            is_leaf = not self._successors_matrix[player_index].any()
+            for outcomes in itertools.product(*decision_ranges):
+                history[predecessors] = outcomes
+                self._add_to_T(player_index, history.copy(), self._informationset_index)
                 self._informationset_index += 1
                 # If the current player is a leaf node (i.e. has no other 
                 # successors in the CS graph) add the payoff node.
-                if len(self._successors[player_index]) == 0:
+                if is_leaf:
                     for outcome in range(0, self.possible_decisions[self.map_LOplayer2CSplayer[player_index]]):
-                        payoff_history = copy.deepcopy(history)
-                        payoff_history[player_index] = outcome
-                        self.T.append((-1, payoff_history,self._payoff_index))
+                        history[player_index] = outcome
+                        self._add_to_T(-1, history.copy(), self._payoff_index)
                         self._payoff_index += 1
-        # Now start with the actual function _build_T()
-        self.T = []
-        self._informationset_index = 0
-        self._payoff_index = 0
-        for player_index in range(0, self.number_of_players):
-            _T_recursion(player_index, 
-                         np.atleast_1d(np.full((self.number_of_players),fill_value=-1)))
+                    history[player_index] = -1
+                if progress is not None and self._informationset_index % 4096 == 0:
+                    progress.update(len(self.T))
+            history[predecessors] = -1
+        if progress is not None:
+            progress.update(len(self.T))
         self.number_of_informationsets = self._informationset_index
         self.number_of_payoffs = self._payoff_index
 
+    def _add_to_T(self, player, history, index):
+        """Appends the tuple (player, history, index) to self.T and registers
+        it in the hash index self._T_index used by _infoset_from_T.
+
+        Args:
+            player (int): Player index in the LO, or -1 for a payoff
+            history (numpy 1d array): Masked history of the information set
+            index (int): Information set's or payoff's index
+        """
+        key = (player, history.tobytes())
+        assert key not in self._T_index, "Error: information-set is not a single value. I.e. there exist more than one tuple for the same information-set"
+        self._T_index[key] = index
+        self.T.append((player, history, index))
+
+    def _infoset_from_numbering(self, player, history):
+        """Returns the index of the information set corresponding to the given
+        history and player based on self.numbering. Same result as _infoset_from_T.
+
+        Args:
+            player (int): Player index in the LO
+            history (list): History corresponding to the searched information set
+
+        Returns:
+            int: Information set's index
+        """
+        if player != -1: # Player node
+            return self.numbering.informationset(player, history)
+        else: # Payoff node, the leaf player is the last one in the history
+            leaf_player = np.argwhere(history != -1)[-1][0]
+            return self.numbering.payoff(leaf_player, history)
+
+    def _infoset(self, player, history):
+        """Returns the index of the information set corresponding to the given
+        history and player, using T if it was built.
+
+        Args:
+            player (int): Player index in the LO
+            history (list): History corresponding to the searched information set
+
+        Returns:
+            int: Information set's index
+        """
+        self._informationset_lookups += 1
+        if self.T is not None:
+            return self._infoset_from_T(player, history)
+        return self._infoset_from_numbering(player, history)
+
     def _infoset_from_T(self,player,history):
         """Returns the index of the information set corresponding to the given
         history and player based on self.T.
@@ -204,152 +328,384 @@ class GEFII:
             int: Information set's index
         """
         if player != -1: # Player node
-            LO_history = np.atleast_1d(np.full((self.number_of_players),fill_value=-1))
-            predecessors = self._predecessors[player]
-            LO_history[predecessors] = history[predecessors]
+            LO_history = np.where(self._predecessors_matrix[player], history, -1)
         else: # Payoff node
             LO_history = history
         #print(player, LO_history)
-        informationset = [tuple[2]
-                          for tuple
-                          in self.T
-                          if (tuple[0] == player and (tuple[1] == LO_history).all())]
-        assert len(informationset) == 1, "Error: information-set is not a single value. I.e. there exist more than one tuple for the same information-set"
-        return informationset[0]
+        if self._T_index is None: # Blocks of a vectorized T
+            return self.T.lookup(player, LO_history)
+        # O(1) lookup in the index built alongside T in _add_to_T
+        informationset = self._T_index.get((player, LO_history.tobytes()))
+        assert informationset is not None, "Error: information-set is not a single value. I.e. there exist no tuple for this information-set"
+        return informationset
    
-    def _GEFII_recursion(self, temp_history):
-        """Recursion used when building a GEFII dictionary.
-        Players are indexed according to their position in the linear order (LO).
+    def _iterate_GEFII(self, prefix=(), first_payoff=0, progress=None):
+        """Walks the GEFII tree in depth-first order without recursion, using
+        an explicit stack and a single history buffer mutated in place.
+        Players are indexed according to their position in the linear order
+        (LO), so the player deciding at depth d is the LO player d.
 
         Args:
-            temp_history (list): History object
+            prefix (tuple, optional): Decisions of the first LO players, the
+            walk is then restricted to the subtree they lead to. Defaults to
+            the empty prefix, i.e. the whole tree.
+            first_payoff (int, optional): Payoff of the first outcome node
+            reached. Defaults to 0.
+            progress (ProgressReporter, optional): Updated with the number of
+            nodes walked. Defaults to None.
 
-        Returns:
-            dict: Dict representing either an information-set or an outcome
-            node. The syntax is valid along our default GEFII jschema.
+        Yields:
+            tuple: ("choice", player, information-set, number of children)
+            when entering a choice node, ("end",) after its last child and
+            ("outcome", payoff) for an outcome node.
         """
-        # First deepcopy history
-        history = copy.deepcopy(temp_history)
-        # Get player
-        unseen_players = np.argwhere(history == -1)
-        if (len(unseen_players) > 0): # Player
-            player = unseen_players[0][0] # first unseen one
-            children = []
-            for i in range(0,self.possible_decisions[self.map_LOplayer2CSplayer[player]]):
-                updated_history = history
-                updated_history[player] = i
-                children.append(self._GEFII_recursion(updated_history))
-            return {"children" : children, "kind" : "choice", "information-set" : int(self._infoset_from_T(player, history)), "player" : int(player)}
-        else: # Payoff
-            self._informationset_increment_bis += 1
-            return {"payoffs" : self._informationset_increment_bis , "kind" : "outcome"} # int(self._infoset_from_T(-1, history))
-
-    def _convert_PMF_to_GEFII(self, PMF_json, plot_CS=False, validate_GEFII=False):
+        history = np.atleast_1d(np.full((self.number_of_players),fill_value=-1))
+        history[:len(prefix)] = prefix
+        depth = len(prefix)
+        decisions = self.numbering.possible_decisions
+        payoff = first_payoff
+        # next decision to explore for every open choice node, the k-th open
+        # node belonging to player depth + k
+        next_decisions = []
+        player = depth
+        nodes = 0
+        while True:
+            nodes += 1
+            if progress is not None and (nodes % 65536 == 0):
+                progress.update(nodes)
+            if player < self.number_of_players: # Player
+                yield ("choice", player, self._infoset(player, history), int(decisions[player]))
+                next_decisions.append(0)
+            else: # Payoff
+                yield ("outcome", payoff)
+                payoff += 1
+            # Move to the next unexplored child, closing exhausted choice nodes
+            while next_decisions:
+                player = depth + len(next_decisions) - 1
+                decision = next_decisions[-1]
+                if decision < decisions[player]:
+                    history[player] = decision
+                    next_decisions[-1] = decision + 1
+                    player += 1
+                    break
+                history[player] = -1
+                next_decisions.pop()
+                yield ("end",)
+            else:
+                if progress is not None:
+                    progress.update(nodes)
+                return
+
+    @property
+    def GEFII_schema(self):
+        """dict: GEFII JSON schema given while initializing this GEFII."""
+        return utils.load_schema_validator(self._GEFII_schema_path).schema
+
+    @property
+    def GEFII_json(self):
+        """dict: GEFII dictionary, built from GEFII_arrays on first access."""
+        if self._GEFII_json is None:
+            self._GEFII_json = self.GEFII_arrays.to_dict()
+        return self._GEFII_json
+
+    @GEFII_json.setter
+    def GEFII_json(self, GEFII_json):
+        self._GEFII_json = GEFII_json
+        self.GEFII_arrays = GEFIIArrays.from_dict(GEFII_json)
+
+    def _convert_PMF_to_GEFII(self, PMF_json, plot_CS=False, validation=utils.VALIDATION_NONE, build_T=False, cache=None,
+                              workers=None, shard_depth=1):
         """Converts a given PMF dictionary to a GEFII dictionary and sets
         useful member variables of the GEFII class object.
 
         Args:
-            PMF_json (dict): PMF JSON dictionary to be converted from
+            PMF_json (dict or PMFModel): PMF JSON dictionary or model to be
+            converted from
             plot_CS (bool, optional): If True, stores a visual representation
             of the causal structure graph. Defaults to False.
-            validate_GEFII (bool, optional): If True, checks that produced GEFII
-            dictionary is well-formed and valid along the jschema given at
-            during the class initialization. Defaults to False.
+            validation (string, optional): Validation level of the produced
+            GEFII, see validate_GEFII. Defaults to "none".
+            build_T (bool or string, optional): If True, builds the matrix map
+            T, blockwise if "vectorized". Defaults to False.
+            cache (ConversionCache, optional): On-disk cache to reuse the
+            GEFII arrays and T from. Defaults to None.
+            workers (int, optional): Number of worker processes building the
+            subtrees below the first shard_depth players. Defaults to None,
+            i.e. serial.
+            shard_depth (int, optional): Depth of the subtrees built in
+            parallel. Defaults to 1.
         """
+        stage_start = time.perf_counter()
         # Get CS graph including number of classical decisions/outcomes from a PMF json dictionary 
         self._build_CS_graph(PMF_json, plot_CS=plot_CS)
+        stage_start = self._record_timing("build_CS_graph", stage_start, players=self.CS_graph.number_of_nodes())
         # dictionary from CS_graph nodes to the number of decisions there # HERE recall possible_decisions to actions
         self.possible_decisions = dict(self.CS_graph.nodes(data="number_of_measurement_options",default=1))
         # Set LO_order, the mapping LO to CS as well as the dictionary of predecessors and one for successorsfor each LO node
         self._build_LO_order()
+        stage_start = self._record_timing("build_LO_order", stage_start, players=len(self.map_LOplayer2CSplayer))
         # total number of players 
         self.number_of_players = len(self.map_LOplayer2CSplayer)
-        # Build matrix T
-        self._build_T()
+        # Closed form numbering of information sets and payoffs
+        self.numbering = InfosetNumbering(self._predecessors, self._successors,
+                                          [self.possible_decisions[CS_player]
+                                           for CS_player in self.map_LOplayer2CSplayer])
+        self.number_of_informationsets = self.numbering.number_of_informationsets
+        self.number_of_payoffs = self.numbering.number_of_payoffs
+        stage_start = self._record_timing("numbering", stage_start, players=self.number_of_players,
+                                          informationsets=self.number_of_informationsets,
+                                          payoffs=self.number_of_payoffs)
+        # Look the conversion up in the cache, the causal structure fully determines it
+        cached = None
+        if cache is not None:
+            from src.GEFII_cache import causal_structure_key
+            cache_key = causal_structure_key(self.PMF_model)
+            cached = cache.get(cache_key)
+            if cached is not None:
+                assert cached["map_LOplayer2CSplayer"] == self.map_LOplayer2CSplayer, "Error: cached LO order does not match the causal structure"
+        # Build matrix T only on request
+        if build_T is True and cached is not None and cached["T"] is not None:
+            self.T = []
+            self._T_index = {}
+            for player, history, index in cached["T"]:
+                self._add_to_T(player, history, index)
+            self._informationset_index = self.number_of_informationsets
+            self._payoff_index = self.number_of_payoffs
+        elif build_T:
+            self._build_T(vectorized=build_T == "vectorized")
+        stage_start = self._record_timing("build_T", stage_start, nodes_visited=0 if self.T is None else len(self.T))
         # Initialise GEFII tree
         assert self.number_of_players >= 1, "Error: there is no lab to be used in convert_PMF_to_GEFII"
-        # Call _GEFII_recursion
-        root_history = np.atleast_1d(np.full((self.number_of_players),fill_value=-1))
-        self.GEFII_json = self._GEFII_recursion(root_history)
-        if validate_GEFII:
-            self.validate_GEFII(message=False)
+        # Build the GEFII tree as flat arrays, level by level from the closed
+        # form numbering or by walking the tree when T is used
+        progress = None
+        if self._progress is not None and cached is None:
+            progress = instrumentation.ProgressReporter(self._progress, "build_tree", self.numbering.number_of_tree_nodes)
+        self._informationset_lookups = 0
+        if cached is not None:
+            self.GEFII_arrays = cached["GEFII_arrays"]
+        elif self.T is None and workers is not None:
+            from src import GEFII_parallel
+            self.GEFII_arrays = GEFII_parallel.build_GEFII_arrays_parallel(self.numbering, shard_depth, workers,
+                                                                           progress=progress)
+        elif self.T is None:
+            self.GEFII_arrays = GEFIIArrays.from_numbering(self.numbering, progress=progress)
+        else:
+            self.GEFII_arrays = GEFIIArrays.from_events(
+                self._iterate_GEFII(first_payoff=self._informationset_increment_bis + 1, progress=progress))
+        # Store new conversions, and T if it was missing from the cached one
+        if cache is not None and (cached is None or (cached["T"] is None and isinstance(self.T, list))):
+            cache.put(cache_key, self.GEFII_arrays, self.map_LOplayer2CSplayer,
+                      T=self.T if isinstance(self.T, list) else None)
+        self._GEFII_json = None
+        self._informationset_increment_bis = int(self.GEFII_arrays.payoff.max())
+        stage_start = self._record_timing("build_tree", stage_start, nodes_visited=self.GEFII_arrays.number_of_nodes,
+                                          informationset_lookups=self._informationset_lookups)
+        self.validate_GEFII(message=False, level=validation)
+        self._record_timing("validate", stage_start,
+                            nodes_visited=0 if validation == utils.VALIDATION_NONE else self.GEFII_arrays.number_of_nodes)
+
+    def apply_delta(self, delta, validation=utils.VALIDATION_STRUCTURAL):
+        """Applies a PMF edit to this GEFII and recomputes only what the edit
+        changes, see GEFII_delta.apply_delta_to_CS_graph for the edits. The
+        causal structure graph is edited in place, and the LO order and the
+        numbering, which only cost a traversal of this small graph, are
+        recomputed. If the tree keeps its shape, i.e. every LO player keeps
+        its number of decisions, only the information sets of the players
+        whose numbering changed are recomputed, from the histories of their
+        nodes. Otherwise the tree is rebuilt. The result is the same as
+        converting the edited PMF from scratch.
+
+        Args:
+            delta (dict): The edit
+            validation (string, optional): Validation level of the edited
+            GEFII. Defaults to "structural".
 
-    def validate_GEFII(self, message=False):
+        Returns:
+            dict: Maps every old information set to the list of information
+            sets it became
+
+        Raises:
+            ValueError: If the edit is invalid, in which case the GEFII is
+            left unchanged
+        """
+        from src import GEFII_delta
+        stage_start = time.perf_counter()
+        self.stats.reset_memory_peak()
+        old_numbering = self.numbering
+        old_LOplayer2CSplayer = self.map_LOplayer2CSplayer
+        GEFII_delta.apply_delta_to_CS_graph(self.CS_graph, self._map_labidx2CSplayer, delta)
+        self.possible_decisions = dict(self.CS_graph.nodes(data="number_of_measurement_options",default=1))
+        self._build_LO_order()
+        self.number_of_players = len(self.map_LOplayer2CSplayer)
+        self.numbering = InfosetNumbering(self._predecessors, self._successors,
+                                          [self.possible_decisions[CS_player]
+                                           for CS_player in self.map_LOplayer2CSplayer])
+        self.number_of_informationsets = self.numbering.number_of_informationsets
+        self.number_of_payoffs = self.numbering.number_of_payoffs
+        self.number_of_nodes = self.number_of_informationsets + self.number_of_payoffs
+        mapping = GEFII_delta.informationset_mapping(old_numbering, old_LOplayer2CSplayer,
+                                                     self.numbering, self.map_LOplayer2CSplayer)
+        if self.T is not None:
+            self._build_T(vectorized=not isinstance(self.T, list))
+        same_shape = (self.number_of_players == old_numbering.number_of_players
+                      and np.array_equal(self.numbering.possible_decisions, old_numbering.possible_decisions))
+        if same_shape:
+            GEFII_delta.renumber_informationsets(self.GEFII_arrays, old_numbering, self.numbering)
+        else:
+            self.GEFII_arrays = GEFIIArrays.from_numbering(self.numbering)
+        self._informationset_increment_bis = int(self.GEFII_arrays.payoff.max())
+        self._GEFII_json = None
+        self._GEFII_graph = None
+        stage_start = self._record_timing("apply_delta", stage_start, players=self.number_of_players,
+                                          informationsets=self.number_of_informationsets,
+                                          payoffs=self.number_of_payoffs,
+                                          nodes_visited=self.GEFII_arrays.number_of_nodes)
+        self.validate_GEFII(message=False, level=validation)
+        self._record_timing("validate", stage_start,
+                            nodes_visited=0 if validation == utils.VALIDATION_NONE else self.GEFII_arrays.number_of_nodes)
+        return mapping
+
+    def _record_timing(self, stage, stage_start, **counts):
+        """Stores the wall time of a conversion stage in self.timings, its
+        counts in self.stats and, if tracemalloc is tracing, the peak of
+        memory allocated during the stage in self.memory_peaks.
+
+        Args:
+            stage (string): Name of the stage
+            stage_start (float): time.perf_counter() at the start of the stage
+            **counts (int): Counts of the stage, see ConversionStats.record
+
+        Returns:
+            float: time.perf_counter() at the end of the stage, i.e. the start
+            of the next one
+        """
+        return self.stats.record(stage, stage_start, **counts)
+
+    def validate_GEFII(self, message=False, level=utils.VALIDATION_FULL):
         """Validates the member variable GEFII_json with respect to the schema
         given while initializing this GEFII.
 
         Args:
             message (bool, optional): If True, prints whether the underlying
             GEFII dictionary is well-formed and valid. Defaults to False.
+            level (string, optional): "none" skips validation, "structural"
+            checks GEFII_arrays in linear time without building the GEFII
+            dictionary and "full" validates GEFII_json against the jschema.
+            Defaults to "full".
         """
-        jsonschema.validate(instance=self.GEFII_json,schema=self.GEFII_schema)
+        assert level in utils.VALIDATION_LEVELS, "Error: unknown validation level " + str(level)
+        if level == utils.VALIDATION_NONE:
+            return
+        if level == utils.VALIDATION_STRUCTURAL:
+            self.GEFII_arrays.validate()
+        else:
+            utils.load_schema_validator(self._GEFII_schema_path).validate(self.GEFII_json)
         if message:
             print("GEFII is valid")
 
-    def visualize_GEFII(self, plot_GEFII=False):
+    @property
+    def GEFII_graph(self):
+        """nx.DiGraph: Graph of the GEFII tree, nodes numbered depth-first.
+        Built from GEFII_arrays on first access."""
+        if self._GEFII_graph is None:
+            import networkx as nx
+            GEFII_arrays = self.GEFII_arrays
+            self._GEFII_graph = nx.DiGraph()
+            self._GEFII_graph.add_nodes_from(range(0, GEFII_arrays.number_of_nodes))
+            self._GEFII_graph.add_edges_from(zip(GEFII_arrays.parent[1:].tolist(),
+                                                 range(1, GEFII_arrays.number_of_nodes)))
+        return self._GEFII_graph
+
+    def visualize_GEFII(self, plot_GEFII=False, layout="tree", file_format="png",
+                        max_depth=None, collapse=False, sample=None):
         """Visualizes the given spacetime game in extensive form with imperfect information.
+        Plotting backends are only imported and the graph only built if plot_GEFII is True.
 
         Args:
             plot_GEFII (bool, optional): If True, stores a visual 
             representation of the GEFII object. Defaults to False.
+            layout (string, optional): "tree" places the nodes in layers by
+            LO player in linear time (see GEFII_layout.tree_layout),
+            "kamada_kawai" runs the planar and Kamada-Kawai layouts of
+            networkx, which are only fit for small games. Defaults to "tree".
+            file_format (string, optional): "png" draws with matplotlib, "svg"
+            and "dot" are written directly from the tree layout. Defaults to
+            "png".
+            max_depth (int, optional): Tree layout only, depth below which
+            nodes are hidden. Defaults to None.
+            collapse (bool, optional): Tree layout only, if True, repeated
+            identical subtrees are collapsed. Defaults to False.
+            sample (int, optional): Tree layout only, number of randomly
+            sampled leaves to display. Defaults to None.
         """
-        # Initialize nodes and edges for graph
-        nodes = []
-        edges = []
-        nodes_color = []
-        nodes_labels = {}
-        self._node_index = 0
-
-        # Fill nodes and edges from current
-        def _GEFII_set_nodes_and_edges_reccursion(GEFII_json):
-            this_index = self._node_index
-            if GEFII_json["kind"] == "choice":
-                nodes.append((this_index)) #, {GEFII_json["information-set"], GEFII_json["player"]}
-                self._node_index += 1
-                nodes_labels[this_index] = str(GEFII_json["information-set"])
-                nodes_color.append("white") #(255/256,99/256,71/256)
-                for child in GEFII_json["children"]:
-                    node_index = _GEFII_set_nodes_and_edges_reccursion(child)
-                    edges.append((this_index, node_index))
-            elif GEFII_json["kind"] == "outcome":
-                nodes.append((this_index)) #, (GEFII_json["payoffs"])
-                self._node_index += 1
-                nodes_labels[this_index] = str(GEFII_json["payoffs"])
-                nodes_color.append("red") # (144/256,238/256,144/256)
-            else:
-                assert False, "Error: nor choice nor payoff node"
-            return this_index
-        _GEFII_set_nodes_and_edges_reccursion(self.GEFII_json)
-
-        # Graph plot with networkx
-        self.GEFII_graph = nx.DiGraph()
-        self.GEFII_graph.add_nodes_from(nodes)
-        self.GEFII_graph.add_edges_from(edges)
-        # Plot graph
-        if plot_GEFII:
-            plt.figure()
-            graph_options = {
-                "font_size": 10,
-                "node_size": 500,
-                "node_color": nodes_color, # "white",
-                "labels": nodes_labels,
-                "edgecolors": "black",
-                "alpha": 0.75,
-                "linewidths": 0.1,
-                #"width": 3,
-                #"margins": (10,10)
-            }
-            # Draw in the causal order
-            pos = nx.planar_layout(self.GEFII_graph, scale=2)
-            pos = nx.kamada_kawai_layout(self.GEFII_graph, pos=pos)
-            nx.draw_networkx(self.GEFII_graph, pos, **graph_options)
-
-            # Set margins for the axes so that nodes aren't clipped
+        if not plot_GEFII:
+            return
+        assert layout in ("tree", "kamada_kawai"), "Error: unknown layout " + str(layout)
+        assert file_format in ("png", "svg", "dot"), "Error: unknown file format " + str(file_format)
+        assert layout == "tree" or file_format == "png", "Error: the Kamada-Kawai layout is only drawn to png"
+        path = str(self._PATH_TO_FIGURES+self.GEFII_name+"_GEFII_graph")
+        if layout == "tree":
+            from src import GEFII_layout
+            tree_layout = GEFII_layout.tree_layout(self.GEFII_arrays, max_depth=max_depth,
+                                                   collapse=collapse, sample=sample)
+            if file_format == "svg":
+                GEFII_layout.write_svg(tree_layout, path + ".svg")
+                return
+            if file_format == "dot":
+                GEFII_layout.write_dot(tree_layout, path + ".dot")
+                return
+        import matplotlib.pyplot as plt
+        plt.figure()
+        if layout == "tree":
+            from matplotlib.collections import LineCollection
+            has_parent = tree_layout.parent >= 0
+            edges = np.stack((np.column_stack((tree_layout.x, -tree_layout.y))[tree_layout.parent[has_parent]],
+                              np.column_stack((tree_layout.x, -tree_layout.y))[has_parent]), axis=1)
             ax = plt.gca()
+            ax.add_collection(LineCollection(edges, colors="black", linewidths=0.5, zorder=1))
+            ax.scatter(tree_layout.x, -tree_layout.y, s=500 if tree_layout.number_of_nodes <= 100 else 20,
+                       c=[GEFII_layout.LAYOUT_COLORS[kind] for kind in tree_layout.kind],
+                       edgecolors="black", linewidths=0.1, alpha=0.75, zorder=2)
+            # Labels are unreadable beyond a few hundred nodes
+            if tree_layout.number_of_nodes <= 500:
+                for x, y, label in zip(tree_layout.x, tree_layout.y, tree_layout.label):
+                    ax.text(x, -y, label, fontsize=10, ha="center", va="center", zorder=3)
             ax.margins(0.2)
             plt.axis("off")
-            #plt.show()
-            plt.savefig(str(self._PATH_TO_FIGURES+self.GEFII_name+"_GEFII_graph"))
+            plt.savefig(path)
+            return
+        import networkx as nx
+        # Colors and labels straight from the arrays, nodes are numbered depth-first
+        GEFII_arrays = self.GEFII_arrays
+        is_choice = GEFII_arrays.kind == CHOICE
+        nodes_color = np.where(is_choice, "white", "red").tolist()
+        nodes_labels = dict(enumerate(np.where(is_choice, GEFII_arrays.information_set,
+                                               GEFII_arrays.payoff).astype(str).tolist()))
+
+        # Plot graph
+        graph_options = {
+            "font_size": 10,
+            "node_size": 500,
+            "node_color": nodes_color, # "white",
+            "labels": nodes_labels,
+            "edgecolors": "black",
+            "alpha": 0.75,
+            "linewidths": 0.1,
+            #"width": 3,
+            #"margins": (10,10)
+        }
+        # Draw in the causal order
+        pos = nx.planar_layout(self.GEFII_graph, scale=2)
+        pos = nx.kamada_kawai_layout(self.GEFII_graph, pos=pos)
+        nx.draw_networkx(self.GEFII_graph, pos, **graph_options)
+
+        # Set margins for the axes so that nodes aren't clipped
+        ax = plt.gca()
+        ax.margins(0.2)
+        plt.axis("off")
+        #plt.show()
+        plt.savefig(path)
 
     def plot_CS_graph(self, nodes_color, nodes_label):
         """Stores a png matplotlib plot of the causal structure graph of the underlying GEFII
@@ -358,6 +714,8 @@ class GEFII:
             nodes_color (array of plt color string): maps a color to each node in the CS graph
             nodes_label (array of strings): maps a string to each node in the CS graph
         """
+        import networkx as nx
+        import matplotlib.pyplot as plt
         # Plot graph
         plt.figure()
         graph_options = {
@@ -379,7 +737,84 @@ class GEFII:
         #plt.show()
         plt.savefig(str(self._PATH_TO_FIGURES+self.GEFII_name+"_CS_graph"))
 
-    def save_GEFII_to_json(self):
+    def save_GEFII_to_json(self, streaming=False, compact=False, file=None,
+                           workers=None, shard_depth=1, spill_directory=None):
         """Saves the current GEFII json
+
+        Args:
+            streaming (bool, optional): Kept for compatibility, the nodes are
+            always written incrementally from GEFII_arrays, without building
+            the GEFII dictionary nor its text. Defaults to False.
+            compact (bool, optional): If True, writes the JSON without
+            indentation nor whitespace. Defaults to False.
+            file (string or file-like, optional): Path or text file-like
+            object to write to. Defaults to the GEFII JSON folder.
+            workers (int, optional): If given, the subtrees below the first
+            shard_depth players are serialized in parallel by this many worker
+            processes. The output is identical. Defaults to None.
+            shard_depth (int, optional): Number of LO players above the
+            subtrees serialized in parallel. Defaults to 1.
+            spill_directory (string, optional): Folder where every parallel
+            subtree is spilled to its own file before being copied, instead
+            of being kept in memory. Defaults to None.
+        """
+        if file is None:
+            file = str(self._PATH_TO_GEFII_JSONS+self.GEFII_name+"_GEFII")
+        if workers is not None:
+            from src import GEFII_parallel
+            GEFII_parallel.save_GEFII_to_json_parallel(self.numbering, file, shard_depth=shard_depth, workers=workers,
+                                                       compact=compact, spill_directory=spill_directory)
+        else:
+            # Same output as the dictionary dump, written from the arrays
+            utils.save_GEFII_events_to_json(self.GEFII_arrays.iter_events(), file, compact=compact)
+
+    def save_GEFII_to_DAG_json(self, compact=True, file=None):
+        """Saves the GEFII in the hash-consed DAG format, where subtrees only
+        differing by their payoffs are stored once. Load it back with
+        utils.load_GEFII_DAG_json.
+
+        Args:
+            compact (bool, optional): If True, writes the JSON without
+            indentation nor whitespace. Defaults to True.
+            file (string, optional): Path to write to. Defaults to the GEFII
+            JSON folder.
+        """
+        if file is None:
+            file = str(self._PATH_TO_GEFII_JSONS+self.GEFII_name+"_GEFII_DAG")
+        from src.GEFII_dag import GEFIIDAG
+        utils.save_to_json(GEFIIDAG.from_arrays(self.GEFII_arrays).to_dict(), file, compact=compact)
+
+    def save_GEFII_to_store(self, directory=None):
+        """Saves the GEFII as a directory of memory-mappable numpy arrays, to
+        be opened with GEFII_storage.GEFIIStore.
+
+        Args:
+            directory (string, optional): Folder to write the store to.
+            Defaults to the GEFII JSON folder.
+        """
+        if directory is None:
+            directory = str(self._PATH_TO_GEFII_JSONS+self.GEFII_name+"_GEFII_store")
+        from src import GEFII_storage
+        GEFII_storage.save_GEFII_store(self.GEFII_arrays, directory, GEFII_name=self.GEFII_name)
+
+    def to_normal_form(self, leaf_values=None, file=None, max_bytes=None):
+        """Exports the normal form of the GEFII, indexed by the pure strategy
+        of every LO player, see GEFII_normal_form.export_normal_form.
+
+        Args:
+            leaf_values (numpy 1d array, optional): Value of every outcome, by
+            payoff index. Defaults to the payoff indices.
+            file (string, optional): Path of a .npy file to stream the tensor
+            to. Defaults to None.
+            max_bytes (int, optional): Cap on the working memory of one chunk
+            of strategy profiles. Defaults to
+            GEFII_normal_form.DEFAULT_MAX_BYTES, i.e. 256 MiB.
+
+        Returns:
+            numpy ndarray or memmap: The normal form payoff tensor
         """
-        utils.save_to_json(self.GEFII_json, str(self._PATH_TO_GEFII_JSONS+self.GEFII_name+"_GEFII"))
+        from src import GEFII_normal_form
+        if max_bytes is None:
+            max_bytes = GEFII_normal_form.DEFAULT_MAX_BYTES
+        return GEFII_normal_form.export_normal_form(self.numbering, leaf_values=leaf_values,
+                                                    path=file, max_bytes=max_bytes)
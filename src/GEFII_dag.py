@@ -0,0 +1,216 @@
+import numpy as np
+from src.GEFII_arrays import GEFIIArrays, GEFII_dict_from_events, CHOICE, OUTCOME
+
+# Name and version of the DAG interchange format
+DAG_FORMAT = "GEFII-DAG"
+DAG_VERSION = 1
+
+class GEFIIDAG:
+    """Hash-consed representation of a GEFII tree. Subtrees that only differ
+    by their payoff counters are stored once: every DAG node holds the player
+    and information set of a choice node, its children as DAG nodes and, per
+    child, the offset of the child's first payoff from the node's first
+    payoff. All outcome nodes collapse into one DAG node, so the payoffs of a
+    subtree are recovered while walking it from the root payoff.
+
+    DAG nodes are numbered bottom-up, children before parents, and their
+    children are stored in compressed sparse row format: the children of
+    node i are children[child_offsets[i]:child_offsets[i+1]].
+    """
+    __slots__ = ("kind", "player", "information_set", "child_offsets", "children",
+                 "payoff_offsets", "root", "root_payoff")
+
+    def __init__(self, kind, player, information_set, child_offsets, children, payoff_offsets, root, root_payoff):
+        """Initializes the DAG from its arrays.
+
+        Args:
+            kind (numpy 1d array): CHOICE or OUTCOME for every DAG node
+            player (numpy 1d array): LO player of choice nodes, -1 for outcomes
+            information_set (numpy 1d array): Information set of choice nodes,
+            -1 for outcomes
+            child_offsets (numpy 1d array): Start of the children of every DAG
+            node, followed by the total number of edges
+            children (numpy 1d array): Child DAG node of every edge
+            payoff_offsets (numpy 1d array): Payoff offset of every edge
+            root (int): DAG node of the tree's root
+            root_payoff (int): First payoff of the tree
+        """
+        self.kind = np.asarray(kind, dtype=np.int8)
+        self.player = np.asarray(player, dtype=np.int64)
+        self.information_set = np.asarray(information_set, dtype=np.int64)
+        self.child_offsets = np.asarray(child_offsets, dtype=np.int64)
+        self.children = np.asarray(children, dtype=np.int64)
+        self.payoff_offsets = np.asarray(payoff_offsets, dtype=np.int64)
+        self.root = int(root)
+        self.root_payoff = int(root_payoff)
+
+    @classmethod
+    def from_arrays(cls, GEFII_arrays):
+        """Hash-conses a GEFII tree, see hash_cons.
+
+        Args:
+            GEFII_arrays (GEFIIArrays): The GEFII tree
+
+        Returns:
+            GEFIIDAG: The hash-consed GEFII
+        """
+        return cls.hash_cons(GEFII_arrays)[0]
+
+    @classmethod
+    def hash_cons(cls, GEFII_arrays):
+        """Hash-conses a GEFII tree bottom-up, one depth at a time. The nodes
+        of a depth with the same number of children are deduplicated at once
+        by sorting their signatures (player, information set, child DAG
+        nodes, child payoff offsets).
+
+        Args:
+            GEFII_arrays (GEFIIArrays): The GEFII tree
+
+        Returns:
+            tuple: The hash-consed GEFII (GEFIIDAG) and the DAG node of every
+            tree node (numpy 1d array)
+        """
+        number_of_nodes = GEFII_arrays.number_of_nodes
+        dag_ids = np.zeros(number_of_nodes, dtype=np.int64)
+        # First payoff of the subtree of every tree node
+        first_payoffs = np.where(GEFII_arrays.kind == OUTCOME, GEFII_arrays.payoff, 0)
+        signatures = {}
+        kind, player, information_set = [OUTCOME], [-1], [-1]
+        children, payoff_offsets, child_counts = [], [], [0]
+        number_of_children = np.diff(GEFII_arrays.child_offsets)
+        for depth in range(int(GEFII_arrays.depth.max()), -1, -1):
+            at_depth = GEFII_arrays.depth == depth
+            choices = np.nonzero(at_depth & (GEFII_arrays.kind == CHOICE))[0]
+            for count in np.unique(number_of_children[choices]):
+                nodes = choices[number_of_children[choices] == count]
+                edges = GEFII_arrays.children[GEFII_arrays.child_offsets[nodes][:, None] + np.arange(count)]
+                child_ids = dag_ids[edges]
+                if count > 0:
+                    first_payoffs[nodes] = first_payoffs[edges[:, 0]]
+                offsets = first_payoffs[edges] - first_payoffs[nodes][:, None]
+                rows = np.column_stack((GEFII_arrays.player[nodes], GEFII_arrays.information_set[nodes],
+                                        child_ids, offsets))
+                unique_rows, inverse = np.unique(rows, axis=0, return_inverse=True)
+                unique_ids = np.empty(len(unique_rows), dtype=np.int64)
+                for i, row in enumerate(unique_rows):
+                    signature = tuple(row.tolist())
+                    if signature not in signatures:
+                        signatures[signature] = len(kind)
+                        kind.append(CHOICE)
+                        player.append(signature[0])
+                        information_set.append(signature[1])
+                        children.extend(signature[2:2 + count])
+                        payoff_offsets.extend(signature[2 + count:])
+                        child_counts.append(count)
+                    unique_ids[i] = signatures[signature]
+                dag_ids[nodes] = unique_ids[inverse.reshape(-1)]
+        child_offsets = np.zeros(len(kind) + 1, dtype=np.int64)
+        np.cumsum(child_counts, out=child_offsets[1:])
+        return (cls(kind, player, information_set, child_offsets, children, payoff_offsets,
+                    dag_ids[0], first_payoffs[0]), dag_ids)
+
+    @classmethod
+    def from_dict(cls, GEFII_DAG_json):
+        """Builds a DAG from its interchange dictionary.
+
+        Args:
+            GEFII_DAG_json (dict): Dictionary as returned by to_dict
+
+        Returns:
+            GEFIIDAG: The hash-consed GEFII
+        """
+        assert GEFII_DAG_json.get("format") == DAG_FORMAT, "Error: not a " + DAG_FORMAT + " dictionary"
+        assert GEFII_DAG_json.get("version") == DAG_VERSION, "Error: unsupported " + DAG_FORMAT + " version"
+        return cls(GEFII_DAG_json["kind"], GEFII_DAG_json["player"], GEFII_DAG_json["information-set"],
+                   GEFII_DAG_json["child-offsets"], GEFII_DAG_json["children"],
+                   GEFII_DAG_json["payoff-offsets"], GEFII_DAG_json["root"], GEFII_DAG_json["root-payoff"])
+
+    def to_dict(self):
+        """Returns the interchange dictionary of the DAG, with one list per
+        column.
+
+        Returns:
+            dict: Dictionary of the DAG
+        """
+        return {"format": DAG_FORMAT, "version": DAG_VERSION,
+                "root": self.root, "root-payoff": self.root_payoff,
+                "kind": self.kind.tolist(), "player": self.player.tolist(),
+                "information-set": self.information_set.tolist(),
+                "child-offsets": self.child_offsets.tolist(), "children": self.children.tolist(),
+                "payoff-offsets": self.payoff_offsets.tolist()}
+
+    @property
+    def number_of_nodes(self):
+        """Number of DAG nodes."""
+        return len(self.kind)
+
+    def children_of(self, node, first_payoff):
+        """Returns the children of a DAG node together with their first
+        payoffs, without expanding anything else.
+
+        Args:
+            node (int): DAG node
+            first_payoff (int): First payoff of the subtree of node
+
+        Returns:
+            list of tuples: (child DAG node, first payoff of the child)
+        """
+        start, stop = self.child_offsets[node], self.child_offsets[node + 1]
+        return list(zip(self.children[start:stop].tolist(),
+                        (first_payoff + self.payoff_offsets[start:stop]).tolist()))
+
+    def subtree_sizes(self):
+        """Returns the number of tree nodes below every DAG node, itself
+        included.
+
+        Returns:
+            numpy 1d array: Expanded size of every DAG node
+        """
+        sizes = np.ones(self.number_of_nodes, dtype=np.int64)
+        # Children come before their parents
+        for node in range(0, self.number_of_nodes):
+            sizes[node] += sizes[self.children[self.child_offsets[node]:self.child_offsets[node + 1]]].sum()
+        return sizes
+
+    def iter_events(self, node=None, first_payoff=None):
+        """Walks the expanded tree lazily with an explicit stack and yields
+        the same depth-first events as GEFIIArrays.iter_events.
+
+        Args:
+            node (int, optional): DAG node to start from. Defaults to the root.
+            first_payoff (int, optional): First payoff of the subtree of node.
+            Defaults to the root payoff.
+        """
+        if node is None:
+            node, first_payoff = self.root, self.root_payoff
+        stack = [iter([(node, first_payoff)])]
+        while stack:
+            entry = next(stack[-1], None)
+            if entry is None:
+                stack.pop()
+                if stack:
+                    yield ("end",)
+                continue
+            node, first_payoff = entry
+            if self.kind[node] == OUTCOME:
+                yield ("outcome", first_payoff)
+            else:
+                yield ("choice", int(self.player[node]), int(self.information_set[node]),
+                       int(self.child_offsets[node + 1] - self.child_offsets[node]))
+                stack.append(iter(self.children_of(node, first_payoff)))
+
+    def expand(self):
+        """Expands the DAG back to a dictionary valid along the GEFII jschema.
+
+        Returns:
+            dict: GEFII dictionary
+        """
+        return GEFII_dict_from_events(self.iter_events())
+
+    def to_arrays(self):
+        """Expands the DAG back to the columnar GEFII tree.
+
+        Returns:
+            GEFIIArrays: The GEFII tree
+        """
+        return GEFIIArrays.from_events(self.iter_events())
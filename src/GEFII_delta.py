@@ -0,0 +1,151 @@
+import numpy as np
+
+# Kinds of PMF edits supported by GEFII.apply_delta
+DELTA_ADD_AXIS = "add_axis"
+DELTA_ADD_WIRE = "add_wire"
+DELTA_ADD_LAB = "add_lab"
+DELTA_TYPES = (DELTA_ADD_AXIS, DELTA_ADD_WIRE, DELTA_ADD_LAB)
+
+def apply_delta_to_CS_graph(CS_graph, map_labidx2CSplayer, delta):
+    """Applies a PMF edit to a causal structure graph, in place. The graph is
+    left unchanged if the edit is invalid. The edits are:
+        {"type": "add_axis", "lab": lab index}: one more measurement axis
+        {"type": "add_wire", "from": lab index, "to": lab index}: one more wire
+        {"type": "add_lab", "lab": new lab index, "axes": int, "outcomes": int,
+         "wires_from": [lab indices], "wires_to": [lab indices]}: one more lab,
+        appended to the Labs array, with wires from and to existing labs
+    Wires from Start or to End (lab indices 0 and 1) do not change the causal
+    structure.
+
+    Args:
+        CS_graph (nx.DiGraph): Causal structure graph, as built by
+        GEFII._build_CS_graph
+        map_labidx2CSplayer (dict): Maps "a" and "x" to dictionaries from lab
+        indices to CS players, updated in place
+        delta (dict): The edit
+
+    Raises:
+        ValueError: If the edit is unknown, refers to unknown labs or makes
+        the causal structure cyclic
+    """
+    import networkx as nx
+    if delta.get("type") not in DELTA_TYPES:
+        raise ValueError("Error: unknown delta type " + str(delta.get("type")))
+    if delta["type"] == DELTA_ADD_AXIS:
+        if delta["lab"] not in map_labidx2CSplayer["a"]:
+            raise ValueError("Error: unknown lab " + str(delta["lab"]))
+        CS_graph.nodes[map_labidx2CSplayer["a"][delta["lab"]]]["number_of_measurement_options"] += 1
+        return
+    new_nodes = []
+    if delta["type"] == DELTA_ADD_WIRE:
+        wires = [(delta["from"], delta["to"])]
+    else:
+        if delta["lab"] in (0, 1) or delta["lab"] in map_labidx2CSplayer["a"]:
+            raise ValueError("Error: lab " + str(delta["lab"]) + " already exists")
+        player_a = CS_graph.number_of_nodes()
+        new_nodes = [(player_a, {"number_of_measurement_options": delta["axes"]}),
+                     (player_a + 1, {"number_of_measurement_options": delta["outcomes"]})]
+        wires = ([(source, delta["lab"]) for source in delta.get("wires_from", [])]
+                 + [(delta["lab"], target) for target in delta.get("wires_to", [])])
+    # Work on a copy of the maps so that nothing changes on error
+    map_x = dict(map_labidx2CSplayer["x"])
+    if new_nodes:
+        map_x[delta["lab"]] = new_nodes[1][0]
+    edges = [(new_nodes[0][0], new_nodes[1][0])] if new_nodes else []
+    for source, target in wires:
+        if source <= 1 or target <= 1:
+            continue
+        if source not in map_x or target not in map_x:
+            raise ValueError("Error: unknown lab in wire " + str((source, target)))
+        edges.append((map_x[source], map_x[target]))
+    edited_graph = CS_graph.copy()
+    edited_graph.add_nodes_from(new_nodes)
+    edited_graph.add_edges_from(edges)
+    if not nx.is_directed_acyclic_graph(edited_graph):
+        raise ValueError("Error: the delta makes the causal structure cyclic")
+    CS_graph.add_nodes_from(new_nodes)
+    CS_graph.add_edges_from(edges)
+    if new_nodes:
+        map_labidx2CSplayer["a"][delta["lab"]] = new_nodes[0][0]
+        map_labidx2CSplayer["x"][delta["lab"]] = new_nodes[1][0]
+
+def informationset_mapping(old_numbering, old_LOplayer2CSplayer, new_numbering, new_LOplayer2CSplayer):
+    """Maps every information set of a GEFII before an additive edit to the
+    information sets it became after the edit. A player whose predecessors
+    grew has its information sets split, one old information set then maps
+    to several new ones. Information sets absent from the mapping values are
+    new.
+
+    Args:
+        old_numbering (InfosetNumbering): Numbering before the edit
+        old_LOplayer2CSplayer (list): LO order before the edit
+        new_numbering (InfosetNumbering): Numbering after the edit
+        new_LOplayer2CSplayer (list): LO order after the edit
+
+    Returns:
+        dict: Maps old information sets to lists of new information sets
+    """
+    old_LO_of = {CS_player: i for i, CS_player in enumerate(old_LOplayer2CSplayer)}
+    new_LO_of = {CS_player: i for i, CS_player in enumerate(new_LOplayer2CSplayer)}
+    old_indices = []
+    new_indices = []
+    for new_player, CS_player in enumerate(new_LOplayer2CSplayer):
+        if CS_player not in old_LO_of:
+            continue
+        old_player = old_LO_of[CS_player]
+        histories = new_numbering.informationset_histories(new_player)
+        old_predecessors = old_numbering.predecessors[old_player]
+        # Position after the edit of the predecessors before the edit
+        columns = np.asarray([new_LO_of[old_LOplayer2CSplayer[predecessor]] for predecessor in old_predecessors],
+                             dtype=np.int64)
+        digits = histories[:, columns]
+        # Decisions added by the edit did not exist before
+        existed = np.all(digits < old_numbering.radices[old_player], axis=1)
+        old_indices.append(old_numbering.informationset_offsets[old_player]
+                           + digits[existed] @ old_numbering.strides[old_player])
+        new_indices.append(new_numbering.informationset_offsets[new_player] + np.flatnonzero(existed))
+    mapping = {}
+    if old_indices:
+        old_indices = np.concatenate(old_indices)
+        new_indices = np.concatenate(new_indices)
+        order = np.argsort(old_indices, kind="stable")
+        old_indices, new_indices = old_indices[order], new_indices[order]
+        starts = np.flatnonzero(np.r_[True, old_indices[1:] != old_indices[:-1]])
+        for old, group in zip(old_indices[starts].tolist(), np.split(new_indices, starts[1:])):
+            mapping[old] = group.tolist()
+    return mapping
+
+def renumber_informationsets(GEFII_arrays, old_numbering, numbering):
+    """Updates the information sets of the choice nodes of a tree whose shape
+    did not change, i.e. whose LO players kept their numbers of decisions.
+    Players whose predecessors did not change only have their offset shifted,
+    in one pass over the nodes. The other ones are recomputed from the
+    histories of their nodes, read from the actions of their ancestors.
+
+    Args:
+        GEFII_arrays (GEFIIArrays): GEFII tree built from old_numbering,
+        whose information_set column is replaced by an updated copy
+        old_numbering (InfosetNumbering): Numbering before the edit
+        numbering (InfosetNumbering): Numbering after the edit
+
+    Returns:
+        list of ints: LO players whose information sets were recomputed
+    """
+    recomputed_players = [player for player in range(0, numbering.number_of_players)
+                          if not np.array_equal(numbering.predecessors[player], old_numbering.predecessors[player])]
+    shifts = numbering.informationset_offsets - old_numbering.informationset_offsets
+    information_set = GEFII_arrays.information_set.copy()
+    is_choice = GEFII_arrays.player >= 0
+    if np.any(shifts != 0):
+        information_set[is_choice] += shifts[GEFII_arrays.player[is_choice]]
+    for player in recomputed_players:
+        nodes = np.flatnonzero(GEFII_arrays.player == player)
+        histories = np.zeros((len(nodes), max(player, 1)), dtype=np.int64)
+        ancestors = nodes
+        for depth in range(player - 1, -1, -1):
+            histories[:, depth] = GEFII_arrays.action[ancestors]
+            ancestors = GEFII_arrays.parent[ancestors]
+        information_set[nodes] = (numbering.informationset_offsets[player]
+                                  + histories[:, numbering.predecessors[player]] @ numbering.strides[player])
+    GEFII_arrays.information_set = information_set
+    return recomputed_players
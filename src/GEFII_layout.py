@@ -0,0 +1,178 @@
+import numpy as np
+from src.GEFII_arrays import CHOICE
+from src.GEFII_dag import GEFIIDAG
+
+# Kinds of the laid out nodes
+LAYOUT_CHOICE = "choice"
+LAYOUT_OUTCOME = "outcome"
+LAYOUT_COLLAPSED = "collapsed"
+LAYOUT_TRUNCATED = "truncated"
+# Fill colors of the laid out nodes, by kind
+LAYOUT_COLORS = {LAYOUT_CHOICE: "white", LAYOUT_OUTCOME: "red",
+                 LAYOUT_COLLAPSED: "lightgrey", LAYOUT_TRUNCATED: "lightblue"}
+
+class TreeLayout:
+    """Positions of the displayed nodes of a GEFII tree. Displayed nodes are
+    kept in depth-first order and referred to by their rank in it.
+    """
+    __slots__ = ("nodes", "x", "y", "parent", "kind", "label")
+
+    def __init__(self, nodes, x, y, parent, kind, label):
+        """Initializes the layout.
+
+        Args:
+            nodes (numpy 1d array): Tree node of every displayed node
+            x (numpy 1d array): Horizontal position, in leaf slots
+            y (numpy 1d array): Vertical position, i.e. the depth, which is
+            the position of the player in the LO
+            parent (numpy 1d array): Displayed parent, -1 for the root
+            kind (list of strings): LAYOUT_CHOICE, LAYOUT_OUTCOME,
+            LAYOUT_COLLAPSED or LAYOUT_TRUNCATED
+            label (list of strings): Information set of choice nodes and
+            payoff of outcome nodes
+        """
+        self.nodes = nodes
+        self.x = x
+        self.y = y
+        self.parent = parent
+        self.kind = kind
+        self.label = label
+
+    @property
+    def number_of_nodes(self):
+        """int: Number of displayed nodes"""
+        return len(self.nodes)
+
+def _subtree_interiors(GEFII_arrays, roots):
+    """Returns the mask of the nodes strictly below the given roots."""
+    delta = np.zeros(GEFII_arrays.number_of_nodes + 1, dtype=np.int64)
+    np.add.at(delta, roots + 1, 1)
+    np.add.at(delta, GEFII_arrays.subtree_end[roots], -1)
+    return np.cumsum(delta[:-1]) > 0
+
+def tree_layout(GEFII_arrays, max_depth=None, collapse=False, sample=None, seed=0):
+    """Lays a GEFII tree out in layers, in time linear in the number of
+    nodes: every node is placed at the depth of its player in the LO, leaves
+    are spread evenly in depth-first order and every inner node is centered
+    above its first and last displayed children.
+
+    Args:
+        GEFII_arrays (GEFIIArrays): The GEFII tree
+        max_depth (int, optional): If given, nodes deeper than max_depth are
+        not displayed and the choice nodes at max_depth are marked as
+        truncated. Defaults to None.
+        collapse (bool, optional): If True, a subtree identical to one
+        displayed before, up to its payoffs, is displayed as a single
+        collapsed node. Defaults to False.
+        sample (int, optional): If given, only the paths to sample randomly
+        drawn displayed leaves are kept. Defaults to None.
+        seed (int, optional): Seed of the sampling. Defaults to 0.
+
+    Returns:
+        TreeLayout: The layout of the displayed nodes
+    """
+    number_of_nodes = GEFII_arrays.number_of_nodes
+    is_choice = GEFII_arrays.kind == CHOICE
+    has_children = np.diff(GEFII_arrays.child_offsets) > 0
+    kind = np.where(is_choice, LAYOUT_CHOICE, LAYOUT_OUTCOME).astype(object)
+    displayed = np.ones(number_of_nodes, dtype=bool)
+    if max_depth is not None:
+        displayed &= GEFII_arrays.depth <= max_depth
+        kind[(GEFII_arrays.depth == max_depth) & is_choice & has_children] = LAYOUT_TRUNCATED
+    if collapse:
+        dag_ids = GEFIIDAG.hash_cons(GEFII_arrays)[1]
+        candidates = np.flatnonzero(is_choice & has_children & displayed)
+        # Nodes are in depth-first order, the first occurrence is displayed
+        _, first = np.unique(dag_ids[candidates], return_index=True)
+        repeated = np.ones(len(candidates), dtype=bool)
+        repeated[first] = False
+        collapsed = candidates[repeated]
+        displayed &= ~_subtree_interiors(GEFII_arrays, collapsed)
+        kind[collapsed] = LAYOUT_COLLAPSED
+    if sample is not None:
+        displayed_children = np.bincount(GEFII_arrays.parent[displayed & (GEFII_arrays.parent >= 0)],
+                                         minlength=number_of_nodes)
+        leaves = np.flatnonzero(displayed & (displayed_children == 0))
+        if len(leaves) > sample:
+            kept = np.zeros(number_of_nodes, dtype=bool)
+            current = np.random.default_rng(seed).choice(leaves, size=sample, replace=False)
+            # Keep the sampled leaves and their ancestors, one level at a time
+            while len(current) > 0:
+                kept[current] = True
+                current = np.unique(GEFII_arrays.parent[current])
+                current = current[current >= 0]
+                current = current[~kept[current]]
+            displayed &= kept
+    nodes = np.flatnonzero(displayed)
+    # Leaves get consecutive slots in depth-first order
+    displayed_children = np.bincount(GEFII_arrays.parent[nodes[1:]], minlength=number_of_nodes)
+    is_leaf = displayed_children[nodes] == 0
+    x = np.zeros(number_of_nodes)
+    x[nodes[is_leaf]] = np.arange(int(is_leaf.sum()))
+    # Inner nodes are centered above their children, deepest first
+    first_child_x = np.full(number_of_nodes, np.inf)
+    last_child_x = np.full(number_of_nodes, -np.inf)
+    depths = GEFII_arrays.depth[nodes]
+    for depth in range(int(depths.max()), 0, -1):
+        children = nodes[depths == depth]
+        inner = nodes[(depths == depth - 1) & ~is_leaf]
+        np.minimum.at(first_child_x, GEFII_arrays.parent[children], x[children])
+        np.maximum.at(last_child_x, GEFII_arrays.parent[children], x[children])
+        x[inner] = (first_child_x[inner] + last_child_x[inner]) / 2
+    ranks = np.full(number_of_nodes, -1, dtype=np.int64)
+    ranks[nodes] = np.arange(len(nodes))
+    parents = GEFII_arrays.parent[nodes]
+    label = np.where(is_choice, GEFII_arrays.information_set, GEFII_arrays.payoff)[nodes].astype(str).tolist()
+    return TreeLayout(nodes, x[nodes], depths.astype(float),
+                      np.where(parents >= 0, ranks[np.maximum(parents, 0)], -1),
+                      kind[nodes].tolist(), label)
+
+def write_svg(layout, path, horizontal_spacing=40, vertical_spacing=60, node_radius=12):
+    """Writes a layout as an SVG picture, without any plotting library.
+
+    Args:
+        layout (TreeLayout): The layout
+        path (string): Path to store the SVG file at
+        horizontal_spacing (int, optional): Pixels between two leaf slots.
+        Defaults to 40.
+        vertical_spacing (int, optional): Pixels between two depths. Defaults
+        to 60.
+        node_radius (int, optional): Radius of the nodes in pixels. Defaults
+        to 12.
+    """
+    margin = 2 * node_radius
+    x = margin + layout.x * horizontal_spacing
+    y = margin + layout.y * vertical_spacing
+    width = (x.max() if layout.number_of_nodes > 0 else 0) + margin
+    height = (y.max() if layout.number_of_nodes > 0 else 0) + margin
+    x, y = x.tolist(), y.tolist()
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<svg xmlns="http://www.w3.org/2000/svg" width="{:.0f}" height="{:.0f}">\n'.format(width, height))
+        f.write('<g stroke="black" stroke-width="1">\n')
+        f.writelines('<line x1="{:.1f}" y1="{:.1f}" x2="{:.1f}" y2="{:.1f}"/>\n'.format(x[p], y[p], x[i], y[i])
+                     for i, p in enumerate(layout.parent.tolist()) if p >= 0)
+        f.write('</g>\n<g stroke="black" stroke-width="1" font-size="10" text-anchor="middle">\n')
+        for i in range(0, layout.number_of_nodes):
+            f.write('<circle cx="{:.1f}" cy="{:.1f}" r="{}" fill="{}"/>'
+                    '<text x="{:.1f}" y="{:.1f}" stroke="none">{}</text>\n'.format(
+                        x[i], y[i], node_radius, LAYOUT_COLORS[layout.kind[i]], x[i], y[i] + 4, layout.label[i]))
+        f.write('</g>\n</svg>\n')
+
+def write_dot(layout, path):
+    """Writes a layout as a Graphviz DOT graph with pinned positions, e.g. for
+    neato -n.
+
+    Args:
+        layout (TreeLayout): The layout
+        path (string): Path to store the DOT file at
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("digraph GEFII {\n    node [shape=circle, style=filled];\n")
+        for i in range(0, layout.number_of_nodes):
+            f.write('    n{} [label="{}", fillcolor="{}", pos="{:g},{:g}!"];\n'.format(
+                int(layout.nodes[i]), layout.label[i], LAYOUT_COLORS[layout.kind[i]],
+                layout.x[i], -layout.y[i]))
+        for i, p in enumerate(layout.parent.tolist()):
+            if p >= 0:
+                f.write("    n{} -> n{};\n".format(int(layout.nodes[p]), int(layout.nodes[i])))
+        f.write("}\n")
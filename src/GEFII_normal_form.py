@@ -0,0 +1,104 @@
+import numpy as np
+
+# Default cap on the working memory of one chunk of strategy profiles
+DEFAULT_MAX_BYTES = 1 << 28
+
+def number_of_strategies(numbering):
+    """Returns the number of pure strategies of every player, i.e. one
+    decision per information set.
+
+    Args:
+        numbering (InfosetNumbering): Numbering of the information sets
+
+    Returns:
+        list of ints: Number of pure strategies of every LO player
+    """
+    return [int(numbering.possible_decisions[player]) ** int(numbering.informationset_counts[player])
+            for player in range(0, numbering.number_of_players)]
+
+def leaves_of_profiles(numbering, profiles):
+    """Returns the outcome reached by every strategy profile of a chunk. A
+    pure strategy of a player is an integer whose digits in base the player's
+    number of decisions are its decisions in its information sets, the
+    information set of local index 0 being the least significant digit.
+    Players are evaluated in LO order, for all profiles at once.
+
+    Args:
+        numbering (InfosetNumbering): Numbering of the information sets
+        profiles (numpy 2d array): One row of strategies per LO player, one
+        column per profile
+
+    Returns:
+        numpy 1d array: Payoff index of the outcome reached by every profile,
+        i.e. its position among the leaves in depth-first order
+    """
+    decisions = numbering.possible_decisions
+    histories = np.empty(profiles.shape, dtype=np.int64)
+    # Predecessors are accumulated one by one, without copying their rows
+    local_informationsets = np.empty(profiles.shape[1], dtype=np.int64)
+    for player in range(0, numbering.number_of_players):
+        local_informationsets.fill(0)
+        for predecessor, stride in zip(numbering.predecessors[player].tolist(), numbering.strides[player].tolist()):
+            local_informationsets += stride * histories[predecessor]
+        np.floor_divide(profiles[player], decisions[player] ** local_informationsets, out=histories[player])
+        np.remainder(histories[player], decisions[player], out=histories[player])
+    # The depth-first index of a leaf is its history read as a mixed-radix number
+    leaf_strides = np.ones(numbering.number_of_players, dtype=np.int64)
+    if numbering.number_of_players > 1:
+        leaf_strides[:-1] = np.cumprod(decisions[::-1])[::-1][1:]
+    return leaf_strides @ histories
+
+def export_normal_form(numbering, leaf_values=None, path=None, max_bytes=DEFAULT_MAX_BYTES):
+    """Builds the normal form of a GEFII: the tensor indexed by the pure
+    strategy of every LO player holding the value of the outcome reached.
+    Strategy profiles are enumerated in chunks fitting max_bytes and
+    evaluated with vectorized indexing, never walking the tree.
+
+    Args:
+        numbering (InfosetNumbering): Numbering of the information sets
+        leaf_values (numpy 1d array, optional): Value of every outcome, by
+        payoff index, e.g. the outcome probabilities. Defaults to the payoff
+        indices themselves.
+        path (string, optional): If given, the tensor is streamed to this .npy
+        file, opened as a memmap, instead of being kept in memory. Defaults to
+        None.
+        max_bytes (int, optional): Cap on the working memory of one chunk.
+        Defaults to 256 MiB.
+
+    Returns:
+        numpy ndarray or memmap: The normal form payoff tensor
+    """
+    shape = tuple(number_of_strategies(numbering))
+    number_of_profiles = 1
+    for strategies in shape:
+        number_of_profiles *= strategies
+    assert number_of_profiles < np.iinfo(np.int64).max, "Error: too many strategy profiles to index"
+    dtype = np.int64 if leaf_values is None else np.asarray(leaf_values).dtype
+    if path is not None:
+        normal_form = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+    else:
+        normal_form = np.empty(shape, dtype=dtype)
+    # Per profile of a chunk: 8 bytes per player for its strategy and as
+    # many for its history, 8 for the profile index, 8 for the local
+    # information sets, 16 for the temporaries of leaves_of_profiles, 8 for
+    # the leaves and their values
+    chunk_size = max(1, max_bytes // (8 * (2 * numbering.number_of_players + 5) + np.dtype(dtype).itemsize))
+    chunk_size = min(chunk_size, max(number_of_profiles, 1))
+    profile_indices = np.empty(chunk_size, dtype=np.int64)
+    chunk_profiles = np.empty((len(shape), chunk_size), dtype=np.int64)
+    flat_normal_form = normal_form.reshape(-1)
+    for start in range(0, number_of_profiles, chunk_size):
+        stop = min(start + chunk_size, number_of_profiles)
+        indices = profile_indices[:stop - start]
+        profiles = chunk_profiles[:, :stop - start]
+        # Digits of the profile indices, the last player varying the fastest
+        # as in np.unravel_index, written in place
+        indices[:] = np.arange(start, stop, dtype=np.int64)
+        for player in range(len(shape) - 1, -1, -1):
+            np.remainder(indices, shape[player], out=profiles[player])
+            np.floor_divide(indices, shape[player], out=indices)
+        leaves = leaves_of_profiles(numbering, profiles)
+        flat_normal_form[start:stop] = leaves if leaf_values is None else np.asarray(leaf_values)[leaves]
+    if path is not None:
+        normal_form.flush()
+    return normal_form
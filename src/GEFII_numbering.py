@@ -0,0 +1,255 @@
+from collections.abc import Sequence
+import itertools
+import math
+import numpy as np
+
+_INT64_MAX = np.iinfo(np.int64).max
+
+def _offsets(counts):
+    """Returns the exclusive prefix sums of counts, as Python ints."""
+    return [0] + list(itertools.accumulate(counts))[:-1] if counts else []
+
+def _int64_array(values, name):
+    """Converts Python ints to an int64 array.
+
+    Raises:
+        ValueError: If a value does not fit in int64
+    """
+    if any(value > _INT64_MAX for value in values):
+        raise ValueError("Error: " + name + " do not fit in 64-bit integers, the PMF is too wide")
+    return np.asarray(values, dtype=np.int64)
+
+class InfosetNumbering:
+    """Closed form (mixed-radix) numbering of information sets and payoffs.
+
+    The information set of a player only depends on its position in the
+    linear order (LO) and on the outcomes of its causal predecessors. Hence
+    its index is the player's offset plus the predecessors' outcomes read as
+    a mixed-radix number, the first predecessor being the most significant
+    digit. This reproduces exactly the numbering of GEFII._build_T without
+    storing one history per information set.
+    """
+    def __init__(self, predecessors, successors, possible_decisions):
+        """Precomputes the per-player offsets, radices and strides.
+
+        Args:
+            predecessors (dict): Maps every LO player to the list of its
+            causal predecessors (LO indices), as in GEFII._predecessors.
+            successors (dict): Maps every LO player to the list of its
+            causal successors (LO indices), as in GEFII._successors.
+            possible_decisions (list): Number of possible decisions of every
+            player, indexed in LO order.
+        """
+        self.number_of_players = len(possible_decisions)
+        self.possible_decisions = np.asarray(possible_decisions, dtype=np.int64)
+        self.predecessors = []
+        self.radices = []
+        self.strides = []
+        # Counts and offsets are computed with Python ints, which do not wrap
+        # around, and only then stored as int64
+        informationset_counts = []
+        self.is_leaf = np.zeros(self.number_of_players, dtype=bool)
+        for player in range(0, self.number_of_players):
+            player_predecessors = np.asarray(predecessors[player], dtype=np.int64)
+            radices = [int(possible_decisions[predecessor]) for predecessor in predecessors[player]]
+            # Last predecessor is the least significant digit
+            strides = [1] * len(radices)
+            for digit in range(len(radices) - 2, -1, -1):
+                strides[digit] = strides[digit + 1] * radices[digit + 1]
+            self.predecessors.append(player_predecessors)
+            self.radices.append(np.asarray(radices, dtype=np.int64))
+            self.strides.append(_int64_array(strides, "information set strides"))
+            informationset_counts.append(math.prod(radices))
+            self.is_leaf[player] = len(successors[player]) == 0
+        self.informationset_counts = _int64_array(informationset_counts, "information set counts")
+        # Information sets of player i come after the ones of all players j < i
+        self.informationset_offsets = _int64_array(_offsets(informationset_counts), "information set offsets")
+        self.number_of_informationsets = sum(informationset_counts)
+        # Payoffs are only attached to leaf players, one per outcome and information set
+        payoff_counts = [count * int(decisions) if leaf else 0
+                         for count, decisions, leaf in zip(informationset_counts, possible_decisions, self.is_leaf)]
+        self.payoff_offsets = _int64_array(_offsets(payoff_counts), "payoff offsets")
+        self.number_of_payoffs = sum(payoff_counts)
+        _int64_array([self.number_of_informationsets, self.number_of_payoffs], "information set and payoff counts")
+
+    @property
+    def number_of_tree_nodes(self):
+        """int: Number of nodes of the GEFII tree, in which every path goes
+        through all players in LO order"""
+        number_of_nodes = 1
+        for decisions in self.possible_decisions[::-1].tolist():
+            number_of_nodes = 1 + decisions * number_of_nodes
+        return number_of_nodes
+
+    def local_informationset(self, player, history):
+        """Returns the index of the information set among the ones of the player.
+
+        Args:
+            player (int): Player index in the LO
+            history (numpy 1d array): History in which the outcomes of all the
+            player's predecessors are set
+
+        Returns:
+            int: Local information set's index
+        """
+        return int(np.dot(history[self.predecessors[player]], self.strides[player]))
+
+    def informationset(self, player, history):
+        """Returns the index of the information set corresponding to the given
+        history and player. Matches GEFII._infoset_from_T.
+
+        Args:
+            player (int): Player index in the LO
+            history (numpy 1d array): History corresponding to the searched
+            information set
+
+        Returns:
+            int: Information set's index
+        """
+        return int(self.informationset_offsets[player]) + self.local_informationset(player, history)
+
+    def payoff(self, player, history):
+        """Returns the index of the payoff reached when the leaf player plays
+        history[player] in the given history. Matches the payoff tuples of T.
+
+        Args:
+            player (int): Index in the LO of a leaf player
+            history (numpy 1d array): History in which the outcomes of the
+            player and of all its predecessors are set
+
+        Returns:
+            int: Payoff's index
+        """
+        assert self.is_leaf[player], "Error: payoffs only exist for leaf players"
+        local_index = self.local_informationset(player, history)
+        return (int(self.payoff_offsets[player])
+                + local_index * int(self.possible_decisions[player])
+                + int(history[player]))
+
+    def informationset_histories(self, player):
+        """Enumerates the masked histories of all information sets of a player
+        at once, as a mixed-radix grid over the predecessors' decisions. Rows
+        are in the order of T, the first predecessor varying the slowest.
+
+        Args:
+            player (int): Player index in the LO
+
+        Returns:
+            numpy 2d array: One history per row, -1 for unset players
+        """
+        histories = np.full((int(self.informationset_counts[player]), self.number_of_players), -1, dtype=np.int64)
+        if len(self.radices[player]) > 0:
+            # Digits of the row indices, without one array axis per
+            # predecessor, which numpy caps at 64
+            rows = np.arange(int(self.informationset_counts[player]), dtype=np.int64)
+            histories[:, self.predecessors[player]] = rows[:, None] // self.strides[player] % self.radices[player]
+        return histories
+
+    def payoff_histories(self, player, informationset_histories=None):
+        """Enumerates the histories of all payoffs of a leaf player at once,
+        in the order of T.
+
+        Args:
+            player (int): Index in the LO of a leaf player
+            informationset_histories (numpy 2d array, optional): The result of
+            informationset_histories(player), if already computed.
+
+        Returns:
+            numpy 2d array: One history per row, -1 for unset players
+        """
+        assert self.is_leaf[player], "Error: payoffs only exist for leaf players"
+        if informationset_histories is None:
+            informationset_histories = self.informationset_histories(player)
+        decisions = int(self.possible_decisions[player])
+        histories = np.repeat(informationset_histories, decisions, axis=0)
+        histories[:, player] = np.tile(np.arange(decisions), len(informationset_histories))
+        return histories
+
+class TableView(Sequence):
+    """Read-only view of the matrix map T backed by one block of histories
+    per player, as built by GEFII._build_T(vectorized=True). It behaves like
+    the list of tuples (player, history, index), payoffs of a leaf player
+    following each of its information sets, without storing the tuples.
+    """
+    def __init__(self, numbering):
+        """Enumerates the information set and payoff histories of every
+        player, one numpy operation per player.
+
+        Args:
+            numbering (InfosetNumbering): Numbering of the information sets
+        """
+        self.numbering = numbering
+        self.informationset_blocks = []
+        self.payoff_blocks = []
+        segment_sizes = np.zeros(numbering.number_of_players, dtype=np.int64)
+        for player in range(0, numbering.number_of_players):
+            histories = numbering.informationset_histories(player)
+            self.informationset_blocks.append(histories)
+            if numbering.is_leaf[player]:
+                self.payoff_blocks.append(numbering.payoff_histories(player, histories))
+                segment_sizes[player] = len(histories) * (1 + numbering.possible_decisions[player])
+            else:
+                self.payoff_blocks.append(None)
+                segment_sizes[player] = len(histories)
+        self._segment_ends = np.cumsum(segment_sizes)
+
+    def __len__(self):
+        return int(self._segment_ends[-1]) if len(self._segment_ends) > 0 else 0
+
+    def _tuple(self, player, row, outcome):
+        """Returns the tuple of T for the row-th information set of the player,
+        or for its payoff reached with the given outcome."""
+        if outcome < 0:
+            return (player, self.informationset_blocks[player][row],
+                    int(self.numbering.informationset_offsets[player]) + row)
+        decisions = int(self.numbering.possible_decisions[player])
+        return (-1, self.payoff_blocks[player][row * decisions + outcome],
+                int(self.numbering.payoff_offsets[player]) + row * decisions + outcome)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("T index out of range")
+        player = int(np.searchsorted(self._segment_ends, index, side="right"))
+        local_index = index - (int(self._segment_ends[player - 1]) if player > 0 else 0)
+        if self.payoff_blocks[player] is None:
+            return self._tuple(player, local_index, -1)
+        row, position = divmod(local_index, 1 + int(self.numbering.possible_decisions[player]))
+        return self._tuple(player, row, position - 1)
+
+    def __iter__(self):
+        for player in range(0, self.numbering.number_of_players):
+            for row in range(0, len(self.informationset_blocks[player])):
+                yield self._tuple(player, row, -1)
+                if self.payoff_blocks[player] is not None:
+                    for outcome in range(0, int(self.numbering.possible_decisions[player])):
+                        yield self._tuple(player, row, outcome)
+
+    def lookup(self, player, history):
+        """Returns the index stored in T for the given player and masked
+        history, or for the payoff history if player is -1. The matching row
+        is found in closed form and checked against the stored history.
+
+        Args:
+            player (int): Player index in the LO, or -1 for a payoff
+            history (numpy 1d array): Masked history
+
+        Returns:
+            int: Information set's or payoff's index
+        """
+        if player != -1:
+            row = self.numbering.local_informationset(player, history)
+            stored_history = self.informationset_blocks[player][row]
+            index = int(self.numbering.informationset_offsets[player]) + row
+        else:
+            player = int(np.argwhere(history != -1)[-1][0])
+            assert self.numbering.is_leaf[player], "Error: payoffs only exist for leaf players"
+            row = (self.numbering.local_informationset(player, history)
+                   * int(self.numbering.possible_decisions[player]) + int(history[player]))
+            stored_history = self.payoff_blocks[player][row]
+            index = int(self.numbering.payoff_offsets[player]) + row
+        assert (stored_history == history).all(), "Error: information-set is not a single value. I.e. there exist no tuple for this information-set"
+        return index
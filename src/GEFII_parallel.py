@@ -0,0 +1,218 @@
+import collections
+import concurrent.futures
+import io
+import itertools
+import os
+import numpy as np
+from src import utils
+from src.GEFII_arrays import GEFIIArrays, CHOICE
+
+def _shard_depth(numbering, shard_depth):
+    """Clamps the shard depth so that every shard root exists: the first
+    shard_depth players must all have at least one decision."""
+    shard_depth = min(shard_depth, numbering.number_of_players)
+    for player in range(0, shard_depth):
+        if numbering.possible_decisions[player] == 0:
+            return player
+    return shard_depth
+
+def shard_prefixes(numbering, shard_depth):
+    """Lists the decisions of the first shard_depth players leading to each
+    shard, in depth-first order, together with the payoff of the first
+    outcome of each shard. As every path goes through all players, all shards
+    have the same number of outcomes.
+
+    Args:
+        numbering (InfosetNumbering): Numbering of the information sets
+        shard_depth (int): Number of LO players above the shard roots
+
+    Returns:
+        list of tuples: (prefix, first payoff) of every shard
+    """
+    decisions = numbering.possible_decisions
+    outcomes_per_shard = int(np.prod(decisions[shard_depth:]))
+    prefixes = itertools.product(*[range(0, int(decisions[player])) for player in range(0, shard_depth)])
+    return [(prefix, rank * outcomes_per_shard) for rank, prefix in enumerate(prefixes)]
+
+def _top_events(numbering, shard_depth, shard_subtrees):
+    """Yields the events of the first shard_depth levels of the tree, with one
+    ("subtree", text or file) event per shard in place of its subtree.
+
+    Args:
+        numbering (InfosetNumbering): Numbering of the information sets
+        shard_depth (int): Number of LO players above the shard roots
+        shard_subtrees (iterable): Text or file of every shard, in order
+    """
+    decisions = numbering.possible_decisions
+    history = np.full(numbering.number_of_players, -1, dtype=np.int64)
+    previous_prefix = None
+    shard_subtrees = iter(shard_subtrees)
+    for prefix, _ in shard_prefixes(numbering, shard_depth):
+        # Close the levels where the prefix differs from the previous one
+        common_length = 0
+        if previous_prefix is not None:
+            while prefix[common_length] == previous_prefix[common_length]:
+                common_length += 1
+            for _ in range(common_length + 1, shard_depth):
+                yield ("end",)
+            common_length += 1
+        # Open the new levels
+        history[:shard_depth] = prefix
+        for player in range(common_length, shard_depth):
+            yield ("choice", player, numbering.informationset(player, history), int(decisions[player]))
+        yield ("subtree", next(shard_subtrees))
+        previous_prefix = prefix
+    for _ in range(0, shard_depth):
+        yield ("end",)
+
+def _build_shard_arrays(numbering, prefix, first_payoff):
+    """Worker task building the arrays of one shard."""
+    return GEFIIArrays.from_numbering(numbering, prefix, first_payoff)
+
+def _write_shard_json(numbering, prefix, first_payoff, compact, spill_path):
+    """Worker task writing the JSON text of one shard, to spill_path if given.
+    Returns the spill path or the text."""
+    events = GEFIIArrays.from_numbering(numbering, prefix, first_payoff).iter_events()
+    if spill_path is not None:
+        utils.save_GEFII_events_to_json(events, spill_path, compact=compact, base_level=len(prefix))
+        return spill_path
+    text = io.StringIO()
+    utils.save_GEFII_events_to_json(events, text, compact=compact, base_level=len(prefix))
+    return text.getvalue()
+
+def _map_shards(task, shards, workers):
+    """Runs task over the shards in worker processes, serially if workers is
+    1, and yields the results in shard order. At most twice as many shards
+    as workers are in flight, a new one being submitted whenever a result is
+    yielded, so that only these results are kept in memory or on disk."""
+    if workers == 1:
+        for arguments in shards:
+            yield task(*arguments)
+        return
+    shards = iter(shards)
+    in_flight = 2 * (workers or os.cpu_count() or 1)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = collections.deque(executor.submit(task, *arguments)
+                                    for arguments in itertools.islice(shards, in_flight))
+        try:
+            while pending:
+                # The future is dropped once its result is taken
+                result = pending.popleft().result()
+                for arguments in itertools.islice(shards, 1):
+                    pending.append(executor.submit(task, *arguments))
+                yield result
+                del result
+        finally:
+            for future in pending:
+                future.cancel()
+
+def build_GEFII_arrays_parallel(numbering, shard_depth=1, workers=None, progress=None):
+    """Builds the GEFII arrays by building the subtrees below the first
+    shard_depth players in parallel worker processes and stitching them.
+    The result is identical to GEFIIArrays.from_numbering(numbering).
+
+    Args:
+        numbering (InfosetNumbering): Numbering of the information sets
+        shard_depth (int, optional): Number of LO players above the shard
+        roots. Defaults to 1.
+        workers (int, optional): Number of worker processes. Defaults to the
+        number of CPUs.
+        progress (ProgressReporter, optional): Updated with the number of
+        nodes built after every shard. Defaults to None.
+
+    Returns:
+        GEFIIArrays: The GEFII tree
+    """
+    shard_depth = _shard_depth(numbering, shard_depth)
+    shards = shard_prefixes(numbering, shard_depth)
+    decisions = numbering.possible_decisions
+    subtree_sizes = np.ones(numbering.number_of_players + 1, dtype=np.int64)
+    for k in range(numbering.number_of_players - 1, -1, -1):
+        subtree_sizes[k] = 1 + decisions[k] * subtree_sizes[k + 1]
+    columns = {"kind": np.empty(int(subtree_sizes[0]), dtype=np.int8)}
+    for name in ("player", "information_set", "payoff", "parent", "action", "depth", "subtree_end"):
+        columns[name] = np.empty(int(subtree_sizes[0]), dtype=np.int64)
+    # The first levels are small, fill them in serially. The position of a
+    # node follows from its history as in GEFIIArrays.from_numbering.
+    history = np.full(numbering.number_of_players, -1, dtype=np.int64)
+    for depth in range(0, shard_depth):
+        for prefix in itertools.product(*[range(0, int(decisions[player])) for player in range(0, depth)]):
+            history[:depth] = prefix
+            position = int(np.dot(np.asarray(prefix, dtype=np.int64), subtree_sizes[1:depth + 1]) + depth)
+            columns["kind"][position] = CHOICE
+            columns["player"][position] = depth
+            columns["information_set"][position] = numbering.informationset(depth, history)
+            columns["payoff"][position] = -1
+            columns["parent"][position] = position - 1 - prefix[-1] * subtree_sizes[depth] if depth > 0 else -1
+            columns["action"][position] = prefix[-1] if depth > 0 else -1
+            columns["depth"][position] = depth
+            columns["subtree_end"][position] = position + subtree_sizes[depth]
+    tasks = [(numbering, prefix, first_payoff) for prefix, first_payoff in shards]
+    nodes_built = int(subtree_sizes[0]) - len(shards) * int(subtree_sizes[shard_depth])
+    for rank, shard in enumerate(_map_shards(_build_shard_arrays, tasks, workers)):
+        prefix = shards[rank][0]
+        start = int(np.dot(np.asarray(prefix, dtype=np.int64), subtree_sizes[1:shard_depth + 1]) + shard_depth)
+        stop = start + shard.number_of_nodes
+        columns["kind"][start:stop] = shard.kind
+        columns["player"][start:stop] = shard.player
+        columns["information_set"][start:stop] = shard.information_set
+        columns["payoff"][start:stop] = shard.payoff
+        columns["parent"][start:stop] = shard.parent + start
+        columns["action"][start:stop] = shard.action
+        columns["depth"][start:stop] = shard.depth + shard_depth
+        columns["subtree_end"][start:stop] = shard.subtree_end + start
+        if shard_depth > 0:
+            columns["parent"][start] = start - 1 - prefix[-1] * subtree_sizes[shard_depth]
+            columns["action"][start] = prefix[-1]
+        nodes_built += shard.number_of_nodes
+        if progress is not None:
+            progress.update(nodes_built)
+    return GEFIIArrays(**columns)
+
+def save_GEFII_to_json_parallel(numbering, path_or_file, shard_depth=1, workers=None, compact=False, spill_directory=None):
+    """Writes the GEFII JSON of a numbering with the subtrees below the first
+    shard_depth players serialized in parallel worker processes. The output
+    is byte-identical to the serial writers.
+
+    Args:
+        numbering (InfosetNumbering): Numbering of the information sets
+        path_or_file (string or file-like): Path to store the JSON file at or
+        text file-like object to write to
+        shard_depth (int, optional): Number of LO players above the shard
+        roots. Defaults to 1.
+        workers (int, optional): Number of worker processes. Defaults to the
+        number of CPUs.
+        compact (bool, optional): If True, writes the JSON without
+        indentation nor whitespace. Defaults to False.
+        spill_directory (string, optional): If given, every shard is written
+        to its own file in this folder instead of being kept in memory, so
+        that trees bigger than RAM can be produced. Only the shards in
+        flight, about twice as many as workers, are on disk at a time, every
+        shard file being removed once copied. Defaults to None.
+    """
+    shard_depth = _shard_depth(numbering, shard_depth)
+    shards = shard_prefixes(numbering, shard_depth)
+    if spill_directory is not None:
+        os.makedirs(spill_directory, exist_ok=True)
+    tasks = [(numbering, prefix, first_payoff, compact,
+              None if spill_directory is None else os.path.join(spill_directory, "shard_{}.json".format(rank)))
+             for rank, (prefix, first_payoff) in enumerate(shards)]
+
+    def _subtrees():
+        for result in _map_shards(_write_shard_json, tasks, workers):
+            if spill_directory is None:
+                yield result
+            else:
+                with open(result, "r", encoding="utf-8") as shard_file:
+                    yield shard_file
+                # Copied once the writer resumes, so that at most the
+                # pending shards are kept on disk next to the output
+                os.remove(result)
+
+    try:
+        utils.save_GEFII_events_to_json(_top_events(numbering, shard_depth, _subtrees()), path_or_file, compact=compact)
+    finally:
+        if spill_directory is not None:
+            for task in tasks:
+                if os.path.exists(task[-1]):
+                    os.remove(task[-1])
@@ -0,0 +1,134 @@
+import json
+import os
+import numpy as np
+from src import utils
+from src.GEFII_arrays import GEFIIArrays, GEFII_dict_from_events, CHOICE
+
+# Name and version of the binary storage format
+STORE_FORMAT = "GEFII-NPY"
+STORE_VERSION = 1
+STORE_HEADER = "header.json"
+# Columns of the tree, each stored as its own .npy file
+STORE_COLUMNS = ("kind", "player", "information_set", "payoff", "parent", "action", "depth",
+                 "subtree_end", "child_offsets", "children")
+
+def save_GEFII_store(GEFII_arrays, directory, GEFII_name=None):
+    """Saves a GEFII tree as a directory of typed .npy arrays and a small JSON
+    header. Besides the tree columns, the choice nodes of every information
+    set are stored in compressed sparse row format. The header is written
+    last, so a directory without header is an incomplete store.
+
+    Args:
+        GEFII_arrays (GEFIIArrays): The GEFII tree
+        directory (string): Folder to write the store to
+        GEFII_name (string, optional): Name recorded in the header. Defaults
+        to None.
+    """
+    os.makedirs(directory, exist_ok=True)
+    header_path = os.path.join(directory, STORE_HEADER)
+    if os.path.exists(header_path):
+        os.remove(header_path)
+    columns = {name: getattr(GEFII_arrays, name) for name in STORE_COLUMNS}
+    choices = np.flatnonzero(GEFII_arrays.kind == CHOICE)
+    informationsets = GEFII_arrays.information_set[choices]
+    number_of_informationsets = int(informationsets.max()) + 1 if len(choices) > 0 else 0
+    columns["informationset_nodes"] = choices[np.argsort(informationsets, kind="stable")]
+    columns["informationset_offsets"] = np.zeros(number_of_informationsets + 1, dtype=np.int64)
+    np.cumsum(np.bincount(informationsets, minlength=number_of_informationsets),
+              out=columns["informationset_offsets"][1:])
+    for name, column in columns.items():
+        np.save(os.path.join(directory, name + ".npy"), column)
+    header = {"format": STORE_FORMAT, "version": STORE_VERSION, "name": GEFII_name,
+              "number_of_nodes": GEFII_arrays.number_of_nodes,
+              "number_of_informationsets": number_of_informationsets,
+              "columns": {name: str(column.dtype) for name, column in columns.items()}}
+    utils.save_to_json(header, header_path)
+
+class GEFIIStore:
+    """GEFII tree opened from a binary store. The arrays are memory-mapped
+    read-only, so opening is instantaneous whatever the size of the game,
+    only the pages actually visited are read, and processes opening the same
+    store share them through the page cache. Pickling a store only pickles
+    its directory: worker processes map the files again instead of receiving
+    a copy.
+    """
+    def __init__(self, directory, mmap=True):
+        """Opens a store.
+
+        Args:
+            directory (string): Folder of the store
+            mmap (bool, optional): If True, memory-maps the arrays, otherwise
+            reads them in memory. Defaults to True.
+        """
+        self.directory = directory
+        self.mmap = mmap
+        with open(os.path.join(directory, STORE_HEADER), "r", encoding="utf-8") as header_file:
+            self.header = json.load(header_file)
+        assert self.header.get("format") == STORE_FORMAT, "Error: not a " + STORE_FORMAT + " store"
+        assert self.header.get("version") == STORE_VERSION, "Error: unsupported " + STORE_FORMAT + " version"
+        mmap_mode = "r" if mmap else None
+        columns = {name: np.load(os.path.join(directory, name + ".npy"), mmap_mode=mmap_mode)
+                   for name in self.header["columns"]}
+        self._informationset_nodes = columns.pop("informationset_nodes")
+        self._informationset_offsets = columns.pop("informationset_offsets")
+        self.GEFII_arrays = GEFIIArrays(**columns)
+
+    def __getstate__(self):
+        return {"directory": self.directory, "mmap": self.mmap}
+
+    def __setstate__(self, state):
+        self.__init__(state["directory"], state["mmap"])
+
+    @property
+    def number_of_nodes(self):
+        """int: Number of nodes of the tree"""
+        return self.header["number_of_nodes"]
+
+    def nodes_of_informationset(self, informationset):
+        """Returns all choice nodes of an information set, without scanning
+        the tree.
+
+        Args:
+            informationset (int): Information set's index
+
+        Returns:
+            numpy 1d array: Node indices
+        """
+        start = self._informationset_offsets[informationset]
+        return self._informationset_nodes[start:self._informationset_offsets[informationset + 1]]
+
+    def subtree_dict(self, node=0):
+        """Returns the GEFII dictionary of the subtree of a node, reading only
+        the pages of that subtree.
+
+        Args:
+            node (int, optional): Root of the subtree. Defaults to the root.
+
+        Returns:
+            dict: GEFII dictionary of the subtree
+        """
+        return GEFII_dict_from_events(self.GEFII_arrays.iter_events(node))
+
+def GEFII_json_to_store(json_file, path, directory):
+    """Converts a GEFII JSON file to a binary store.
+
+    Args:
+        json_file (string): Name of GEFII JSON file inside the path folder
+        path (string): Path to GEFII JSON file's folder
+        directory (string): Folder to write the store to
+    """
+    GEFII_arrays = GEFIIArrays.from_dict(utils.load_GEFII_json(json_file, path))
+    save_GEFII_store(GEFII_arrays, directory, GEFII_name=json_file)
+
+def store_to_GEFII_json(directory, path_or_file, compact=False):
+    """Converts a binary store back to a GEFII JSON file, streaming the tree
+    from the memory-mapped arrays.
+
+    Args:
+        directory (string): Folder of the store
+        path_or_file (string or file-like): Path to store the JSON file at or
+        text file-like object to write to
+        compact (bool, optional): If True, writes the JSON without
+        indentation nor whitespace. Defaults to False.
+    """
+    utils.save_GEFII_events_to_json(GEFIIStore(directory).GEFII_arrays.iter_events(), path_or_file, compact=compact)
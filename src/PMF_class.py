@@ -1,15 +1,16 @@
-import json
-import jsonschema
-import networkx as nx
-import matplotlib.pyplot as plt
 from src import utils
+from src import instrumentation
+from src.PMF_model import PMFModel
+from src.PMF_probabilities import OutcomeProbabilities
 
 class PMF:
     """Process Matrix Framework (PMF) class
     """
-    def __init__(self, PATH_TO_PMF_JSONS, PMF_json, PMF_name, PATH_TO_FIGURES, plot_PMF=False):
-        """Initializes a Process Matrix Framework (PMF) object by building the
-        PMF graph and W.
+    def __init__(self, PATH_TO_PMF_JSONS, PMF_json, PMF_name, PATH_TO_FIGURES, plot_PMF=False,
+                 validation=utils.VALIDATION_FULL, profile=instrumentation.PROFILE_NONE):
+        """Initializes a Process Matrix Framework (PMF) object by building its
+        index-based model. The PMF graph is only built when plotting or on
+        access to PMF_graph.
 
         Args:
             PMF_json (dict): dict read directly from a valid JSON document
@@ -17,45 +18,69 @@ class PMF:
             PATH_TO_FIGURES (string): 
             plot_PMF (bool, optional): If True, stores a visual representation
             of the PMF graph. Defaults to False.
+            validation (string, optional): "full" validates PMF_json against
+            the jschema, "none" skips validation. Defaults to "full".
+            profile (string, optional): One of instrumentation.PROFILE_MODES,
+            "cprofile" or "tracemalloc" capture the initialization in
+            self.stats. Defaults to "none".
         """
-        # First, checks that the PMF JSON object is valid and well-formed
-        with open(str(PATH_TO_PMF_JSONS + "PMF_schema.jschema"), "r", encoding="utf-8") as PMF_schema:
-            self.PMF_schema = json.load(PMF_schema)
-        self.validate_PMF(PMF_json, message=True)
-        self.PMF_name = PMF_name
-        self.PMF_graph = self._build_PMF_graph(PMF_json)
+        # Wall time, peak of allocated bytes when tracemalloc is tracing and
+        # counts of every stage
+        self.stats = instrumentation.ConversionStats(profile)
+        stage_start = self.stats.start_profile()
+        try:
+            # First, checks that the PMF JSON object is valid and well-formed.
+            # The schema is compiled once per process and shared by all PMF objects.
+            self._PMF_validator = utils.load_schema_validator(str(PATH_TO_PMF_JSONS + "PMF_schema.jschema"))
+            self.PMF_schema = self._PMF_validator.schema
+            assert validation in (utils.VALIDATION_NONE, utils.VALIDATION_FULL), "Error: unknown PMF validation level " + str(validation)
+            if validation == utils.VALIDATION_FULL:
+                self.validate_PMF(PMF_json, message=True)
+            stage_start = self.stats.record("validate", stage_start)
+            self.PMF_name = PMF_name
+            self._outcome_probabilities = None
+            self._PMF_graph = None
+            # Labs and wires as flat arrays, CPMaps are parsed on demand
+            self.PMF_model = PMFModel(PMF_json)
+            self.stats.record("build_PMF_model", stage_start, labs=self.PMF_model.number_of_labs,
+                              wires=self.PMF_model.number_of_wires)
+        finally:
+            self.stats.stop_profile()
         if plot_PMF:
             self.plot_PMF_graph(PATH_TO_FIGURES)
 
-    def _build_PMF_graph(self, PMF_json):
-        """Build the PMF graph containing all information from the JSON file.
-
-        Args:
-            PMF_json (dict): dict representation of the PMF json
+    @property
+    def outcome_probabilities(self):
+        """Engine computing the joint outcome probabilities from the CPMaps,
+        built on first access.
 
         Returns:
-            nx.MultiDiGraph: the PMF graph
+            OutcomeProbabilities: Outcome probabilities of this PMF
         """
-        # Get the two basic array labs and wires.
-        data_dictionary = utils.extract_PMF_data(PMF_json)
-        labs_array = data_dictionary["Labs_array"]
-        wires_array = data_dictionary["Wires_array"]
-        # Get all nodes and their dictionary of properties.
-        nodes = []
-        for lab in labs_array:
-            nodes.append((lab["Index"], lab))
+        if self._outcome_probabilities is None:
+            self._outcome_probabilities = OutcomeProbabilities(self.PMF_model)
+        return self._outcome_probabilities
+
+    @property
+    def PMF_graph(self):
+        """nx.MultiDiGraph: PMF graph, a networkx view of PMF_model built on
+        first access."""
+        if self._PMF_graph is None:
+            self._PMF_graph = self._build_PMF_graph(self.PMF_model)
+        return self._PMF_graph
 
-        # Get all edges and their dictionary of properties.
-        wires = []
-        for wire in wires_array:
-            wires.append((wire["From"]["LabIdx"], wire["To"]["LabIdx"], wire))
+    def _build_PMF_graph(self, PMF_model):
+        """Build the PMF graph from the PMF model. Nodes are lab indices with
+        the lab names, numbers of qubits, axes and outcomes, and edges are
+        wires with their local qubit indices.
 
-        # Build the PMF graph.
-        self.PMF_graph = nx.MultiDiGraph()
-        self.PMF_graph.add_nodes_from(nodes)
-        self.PMF_graph.add_edges_from(wires)
+        Args:
+            PMF_model (PMFModel): model of the PMF
 
-        return self.PMF_graph
+        Returns:
+            nx.MultiDiGraph: the PMF graph
+        """
+        return PMF_model.to_networkx()
 
     def plot_PMF_graph(self,path):
         """Saves a matplotlib plot of the PMF graph
@@ -63,6 +88,8 @@ class PMF:
         Args:
             path (string): path to figures folder
         """
+        import networkx as nx
+        import matplotlib.pyplot as plt
         plt.figure()
         graph_options = {
             "font_size": 32,
@@ -90,6 +117,6 @@ class PMF:
             message (bool, optional): If True, prints whether the underlying
             PMF dictionary is well-formed and valid. Defaults to False.
         """
-        jsonschema.validate(instance=PMF_json,schema=self.PMF_schema)
+        self._PMF_validator.validate(PMF_json)
         if message:
             print("PMF is valid")
\ No newline at end of file
@@ -0,0 +1,111 @@
+"""Generator of synthetic PMF JSON dictionaries, valid along the PMF jschema,
+to measure how the conversion scales.
+
+Usage: python -m src.PMF_generator OUTPUT --labs N [--axes A] [--outcomes O]
+[--density D] [--depth K] [--seed S]
+"""
+import argparse
+import sys
+import numpy as np
+from src import utils
+
+def _lab(index, name, number_of_axes, number_of_outcomes, in_qubits, out_qubits, CPMaps):
+    """Returns the dictionary of a lab. The CPMaps are (2^out, 2^in) uniform
+    Kraus operators if CPMaps is True, [[0]] placeholders otherwise."""
+    if CPMaps:
+        CPMap = np.full((2 ** out_qubits, 2 ** in_qubits), 1 / number_of_outcomes).tolist()
+    else:
+        CPMap = [[0]]
+    return {"Name": name, "Index": index,
+            "NumberOfInQubits": in_qubits, "NumberOfOutQubits": out_qubits,
+            "Measurements": [{"MeasurementAxisIndex": axis,
+                              "CPMaps": [{"MeasurementOutcomeIndex": outcome, "CPMap": CPMap}
+                                         for outcome in range(0, number_of_outcomes)]}
+                             for axis in range(0, number_of_axes)]}
+
+def generate_PMF(number_of_labs, number_of_axes=2, number_of_outcomes=2, wiring_density=0.3,
+                 depth=None, seed=0, CPMaps=True):
+    """Generates a random PMF whose causal structure is a DAG of the given
+    depth. Labs are spread over depth layers. Every lab of a layer gets one
+    wire from a lab of the previous layer, so the longest chain of labs has
+    exactly depth labs, and every other pair of labs in increasing layers is
+    wired with probability wiring_density. Labs without incoming wires are
+    fed by Start, labs without outgoing wires feed End.
+
+    Args:
+        number_of_labs (int): Number of labs apart from Start and End
+        number_of_axes (int, optional): Measurement axes per lab. Defaults
+        to 2.
+        number_of_outcomes (int, optional): Outcomes per axis. Defaults to 2.
+        wiring_density (float, optional): Probability of a wire between two
+        labs of increasing layers. Defaults to 0.3.
+        depth (int, optional): Number of layers, between 1 and
+        number_of_labs. Defaults to number_of_labs, i.e. a chain.
+        seed (int, optional): Seed of the random wiring. Defaults to 0.
+        CPMaps (bool, optional): If True, CPMaps are (2^out, 2^in) Kraus
+        operators, otherwise they are [[0]] placeholders, which keeps
+        densely wired PMFs small. Defaults to True.
+
+    Returns:
+        dict: PMF dictionary
+    """
+    assert number_of_labs >= 1, "Error: a PMF needs at least one lab"
+    if depth is None:
+        depth = number_of_labs
+    assert 1 <= depth <= number_of_labs, "Error: depth must be between 1 and the number of labs"
+    rng = np.random.default_rng(seed)
+    # Lab indices 0 and 1 are Start and End, every layer has at least one lab
+    layers = np.concatenate((np.arange(depth), rng.integers(0, depth, number_of_labs - depth)))
+    layers.sort()
+    lab_indices = np.arange(2, number_of_labs + 2)
+    wires = set()
+    for lab in range(0, number_of_labs):
+        if layers[lab] > 0:
+            sources = np.flatnonzero(layers == layers[lab] - 1)
+            wires.add((int(lab_indices[rng.choice(sources)]), int(lab_indices[lab])))
+    for source in range(0, number_of_labs):
+        for target in np.flatnonzero(layers > layers[source]):
+            if rng.random() < wiring_density:
+                wires.add((int(lab_indices[source]), int(lab_indices[target])))
+    wires = sorted(wires)
+    has_input = {target for _, target in wires}
+    has_output = {source for source, _ in wires}
+    wires = ([(0, int(lab)) for lab in lab_indices if lab not in has_input]
+             + wires
+             + [(int(lab), 1) for lab in lab_indices if lab not in has_output])
+    # One qubit per wire, numbered locally in wire order
+    in_qubits = {lab: 0 for lab in range(0, number_of_labs + 2)}
+    out_qubits = {lab: 0 for lab in range(0, number_of_labs + 2)}
+    wires_array = []
+    for source, target in wires:
+        wires_array.append({"From": {"LabIdx": source, "OutQubitLocalIdx": out_qubits[source]},
+                            "To": {"LabIdx": target, "InQubitLocalIdx": in_qubits[target]}})
+        out_qubits[source] += 1
+        in_qubits[target] += 1
+    labs_array = [_lab(0, "Start", 1, 1, 0, out_qubits[0], False),
+                  _lab(1, "End", 1, 1, in_qubits[1], 0, False)]
+    labs_array.extend(_lab(int(lab), "L" + str(lab - 2), number_of_axes, number_of_outcomes,
+                           in_qubits[lab], out_qubits[lab], CPMaps)
+                      for lab in lab_indices)
+    return {"$schema": "PMF_schema.jschema",
+            "ProcessMatrixFramework": {"Labs": labs_array, "Wires": wires_array}}
+
+def main(argv=None):
+    """Command line entry point of the generator."""
+    parser = argparse.ArgumentParser(description="Generates a synthetic PMF JSON file.")
+    parser.add_argument("output", help="path of the PMF JSON file to write")
+    parser.add_argument("--labs", type=int, required=True, help="number of labs apart from Start and End")
+    parser.add_argument("--axes", type=int, default=2, help="measurement axes per lab (default: 2)")
+    parser.add_argument("--outcomes", type=int, default=2, help="outcomes per axis (default: 2)")
+    parser.add_argument("--density", type=float, default=0.3, help="wiring density (default: 0.3)")
+    parser.add_argument("--depth", type=int, default=None, help="depth of the DAG of labs (default: number of labs)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default: 0)")
+    parser.add_argument("--placeholder-CPMaps", action="store_true", help="write [[0]] CPMaps")
+    args = parser.parse_args(argv)
+    PMF_json = generate_PMF(args.labs, args.axes, args.outcomes, args.density, args.depth, args.seed,
+                            CPMaps=not args.placeholder_CPMaps)
+    utils.save_to_json(PMF_json, args.output)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
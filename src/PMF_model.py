@@ -0,0 +1,192 @@
+import numpy as np
+
+class PMFModel:
+    """Compact index-based model of a PMF, shared by PMF, GEFII and
+    OutcomeProbabilities. Labs are referred to by their position in the Labs
+    array and wires by their position in the Wires array. Every attribute is
+    a flat numpy array, apart from the lab names. The CPMaps of a lab are
+    parsed into a numpy array on first access only, and kept.
+    """
+    __slots__ = ("lab_indices", "lab_names", "number_of_in_qubits", "number_of_out_qubits",
+                 "number_of_axes", "number_of_outcomes", "wire_sources", "wire_targets",
+                 "wire_out_qubits", "wire_in_qubits", "out_wire_offsets", "out_wires",
+                 "in_wire_offsets", "in_wires", "_positions", "_measurements", "_CPMaps")
+
+    def __init__(self, PMF_json):
+        """Extracts the model from a PMF dictionary in one pass over its labs
+        and wires.
+
+        Args:
+            PMF_json (dict): PMF dictionary
+        """
+        labs_array = PMF_json["ProcessMatrixFramework"]["Labs"]
+        wires_array = PMF_json["ProcessMatrixFramework"]["Wires"]
+        self.lab_indices = np.asarray([lab["Index"] for lab in labs_array], dtype=np.int64)
+        self.lab_names = [lab.get("Name", str(lab["Index"])) for lab in labs_array]
+        self.number_of_in_qubits = np.asarray([lab["NumberOfInQubits"] for lab in labs_array], dtype=np.int64)
+        self.number_of_out_qubits = np.asarray([lab["NumberOfOutQubits"] for lab in labs_array], dtype=np.int64)
+        self.number_of_axes = np.asarray([len(lab["Measurements"]) for lab in labs_array], dtype=np.int64)
+        self.number_of_outcomes = np.asarray([len(lab["Measurements"][0]["CPMaps"]) if lab["Measurements"] else 0
+                                              for lab in labs_array], dtype=np.int64)
+        self._positions = {lab_index: position for position, lab_index in enumerate(self.lab_indices.tolist())}
+        wires = np.asarray([(self._positions[wire["From"]["LabIdx"]], self._positions[wire["To"]["LabIdx"]],
+                             wire["From"]["OutQubitLocalIdx"], wire["To"]["InQubitLocalIdx"])
+                            for wire in wires_array], dtype=np.int64).reshape(-1, 4)
+        self.wire_sources, self.wire_targets, self.wire_out_qubits, self.wire_in_qubits = wires.T.copy()
+        # Wires leaving and entering every lab in compressed sparse row
+        # format, e.g. the wires leaving lab i are
+        # out_wires[out_wire_offsets[i]:out_wire_offsets[i+1]]
+        self.out_wire_offsets, self.out_wires = self._adjacency(self.wire_sources)
+        self.in_wire_offsets, self.in_wires = self._adjacency(self.wire_targets)
+        # Kept to parse the CPMaps on demand
+        self._measurements = [lab["Measurements"] for lab in labs_array]
+        self._CPMaps = [None] * len(labs_array)
+
+    def _adjacency(self, endpoints):
+        """Returns the offsets and wires of the CSR adjacency of the labs."""
+        offsets = np.zeros(self.number_of_labs + 1, dtype=np.int64)
+        np.cumsum(np.bincount(endpoints, minlength=self.number_of_labs), out=offsets[1:])
+        return offsets, np.argsort(endpoints, kind="stable")
+
+    @classmethod
+    def from_PMF(cls, PMF):
+        """Returns PMF as a PMFModel, building it from a PMF dictionary if
+        needed.
+
+        Args:
+            PMF (dict or PMFModel): PMF dictionary or model
+
+        Returns:
+            PMFModel: The model
+        """
+        return PMF if isinstance(PMF, cls) else cls(PMF)
+
+    @property
+    def number_of_labs(self):
+        """int: Number of labs, Start and End included"""
+        return len(self.lab_indices)
+
+    @property
+    def number_of_wires(self):
+        """int: Number of wires"""
+        return len(self.wire_sources)
+
+    @property
+    def player_labs(self):
+        """numpy 1d array: Positions of the labs apart from Start and End, in
+        the order of the Labs array"""
+        return np.flatnonzero(self.lab_indices > 1)
+
+    def position(self, lab_index):
+        """Returns the position in the Labs array of the lab of the given
+        index.
+
+        Args:
+            lab_index (int): Index of the lab
+
+        Returns:
+            int: Position of the lab
+        """
+        return self._positions[lab_index]
+
+    def successors(self, position):
+        """Returns the positions of the labs wired from a lab, once per wire.
+
+        Args:
+            position (int): Position of the lab
+
+        Returns:
+            numpy 1d array: Positions of the targets of its outgoing wires
+        """
+        return self.wire_targets[self.out_wires[self.out_wire_offsets[position]:self.out_wire_offsets[position + 1]]]
+
+    def predecessors(self, position):
+        """Returns the positions of the labs wired to a lab, once per wire.
+
+        Args:
+            position (int): Position of the lab
+
+        Returns:
+            numpy 1d array: Positions of the sources of its incoming wires
+        """
+        return self.wire_sources[self.in_wires[self.in_wire_offsets[position]:self.in_wire_offsets[position + 1]]]
+
+    def CPMaps(self, position):
+        """Returns the CPMaps of a lab as a numpy array indexed by (axis,
+        outcome, row, column), parsed once. A CPMap is either the Choi matrix
+        of the map, of shape (2^(in+out), 2^(in+out)), or its single Kraus
+        operator, of shape (2^out, 2^in), the same form for all CPMaps of the
+        lab. The two only coincide for labs without qubits, whose 1x1 CPMaps
+        are read as Choi matrices.
+
+        Args:
+            position (int): Position of the lab
+
+        Returns:
+            numpy 4d array: CPMaps of the lab
+
+        Raises:
+            ValueError: If the lab has a varying number of outcomes per axis
+            or if its CPMaps have neither shape
+        """
+        if self._CPMaps[position] is None:
+            measurements = self._measurements[position]
+            CPMaps = [[np.asarray(CPMap["CPMap"], dtype=float) for CPMap in measurement["CPMaps"]]
+                      for measurement in measurements]
+            lab_index = str(self.lab_indices[position])
+            if len(set(len(outcomes) for outcomes in CPMaps)) > 1:
+                raise ValueError("Error: lab " + lab_index + " has a varying number of outcomes per axis")
+            in_dimension = 2 ** int(self.number_of_in_qubits[position])
+            out_dimension = 2 ** int(self.number_of_out_qubits[position])
+            shapes = set(CPMap.shape for outcomes in CPMaps for CPMap in outcomes)
+            if len(shapes) > 1 or not shapes <= {(in_dimension * out_dimension,) * 2, (out_dimension, in_dimension)}:
+                raise ValueError("Error: CPMaps of lab " + lab_index + " are neither (2^(NumberOfInQubits+NumberOfOutQubits), "
+                                 "2^(NumberOfInQubits+NumberOfOutQubits)) Choi matrices nor (2^NumberOfOutQubits, "
+                                 "2^NumberOfInQubits) Kraus operators, found " + ", ".join(str(shape) for shape in sorted(shapes)))
+            self._CPMaps[position] = np.asarray(CPMaps, dtype=float).reshape(
+                (len(measurements), int(self.number_of_outcomes[position])) + (shapes.pop() if shapes else (0, 0)))
+            # The dictionaries are no longer needed
+            self._measurements[position] = None
+        return self._CPMaps[position]
+
+    def causal_structure(self):
+        """Returns the only data the conversion to a GEFII depends on: the
+        numbers of measurement axes and outcomes of the labs apart from Start
+        and End, and the wires between them, in the order of the PMF arrays.
+
+        Returns:
+            dict: Dictionary with the "Labs" list of [number of axes, number of
+            outcomes] and the "Wires" list of [from position, to position],
+            positions among the labs apart from Start and End
+        """
+        player_labs = self.player_labs
+        player_positions = np.full(self.number_of_labs, -1, dtype=np.int64)
+        player_positions[player_labs] = np.arange(len(player_labs))
+        sources = player_positions[self.wire_sources]
+        targets = player_positions[self.wire_targets]
+        between_players = (sources >= 0) & (targets >= 0)
+        return {"Labs": np.stack((self.number_of_axes[player_labs], self.number_of_outcomes[player_labs]),
+                                 axis=1).tolist(),
+                "Wires": np.stack((sources[between_players], targets[between_players]), axis=1).tolist()}
+
+    def to_networkx(self):
+        """Builds a networkx view of the model, e.g. for plotting. Nodes are
+        lab indices and edges are wires, with their attributes.
+
+        Returns:
+            nx.MultiDiGraph: The PMF graph
+        """
+        import networkx as nx
+        graph = nx.MultiDiGraph()
+        graph.add_nodes_from((int(self.lab_indices[position]),
+                              {"Name": self.lab_names[position],
+                               "NumberOfInQubits": int(self.number_of_in_qubits[position]),
+                               "NumberOfOutQubits": int(self.number_of_out_qubits[position]),
+                               "number_of_axes": int(self.number_of_axes[position]),
+                               "number_of_outcomes": int(self.number_of_outcomes[position])})
+                             for position in range(0, self.number_of_labs))
+        graph.add_edges_from((int(self.lab_indices[source]), int(self.lab_indices[target]),
+                              {"OutQubitLocalIdx": int(out_qubit), "InQubitLocalIdx": int(in_qubit)})
+                             for source, target, out_qubit, in_qubit
+                             in zip(self.wire_sources, self.wire_targets, self.wire_out_qubits, self.wire_in_qubits))
+        return graph
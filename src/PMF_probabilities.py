@@ -0,0 +1,242 @@
+import numpy as np
+from src.GEFII_arrays import OUTCOME
+from src.PMF_model import PMFModel
+
+# np.einsum accepts at most 52 distinct indices in sublist format, so the
+# labs are contracted one at a time with the indices renumbered every step
+_MAX_EINSUM_INDICES = 52
+# Contraction orders, cached per causal structure
+_order_cache = {}
+
+class OutcomeProbabilities:
+    """Joint outcome probabilities of a PMF computed from the CPMaps of its
+    labs and the wires between them, by the Born rule.
+
+    Every wire carries one qubit. The CPMap of a lab for a given measurement
+    axis and outcome is a completely positive map from the density matrices
+    of its input qubits to those of its output qubits, given by its Choi
+    matrix or by a single Kraus operator (see PMFModel.CPMaps), the qubit of
+    lowest local index being the most significant. Start prepares its output
+    qubits in an explicit initial state and End traces out its input
+    qubits, as well as any output qubit left unwired. The weight of a
+    complete history is the contraction of the initial state and the Choi
+    matrices of all labs along the wires, each wire joining the ket and the
+    bra indices of its two ends. Weights are normalized for every choice of
+    measurement axes.
+
+    The labs are contracted one at a time, in a greedy order cached per
+    structure that keeps few wires open. The axis and outcome of every lab
+    contracted so far form a single batch index of the partial result, so
+    the contractions shared between histories are computed once.
+    """
+    def __init__(self, PMF_json, initial_state=None):
+        """Builds the Choi tensor of every lab (apart from Start and End)
+        indexed by (axis, outcome, input kets..., output kets..., input
+        bras..., output bras...).
+
+        Args:
+            PMF_json (dict or PMFModel): PMF dictionary or model
+            initial_state (numpy 2d array, optional): Density matrix of the
+            output qubits of Start. Defaults to all of them in the state |0>.
+
+        Raises:
+            ValueError: If a CPMap does not match the lab's number of qubits,
+            if a wire between labs refers to a qubit one of them does not
+            have, if an input qubit of a lab is not wired or if the initial
+            state does not match the output qubits of Start
+        """
+        model = PMFModel.from_PMF(PMF_json)
+        labs = model.player_labs.tolist()
+        self.lab_indices = model.lab_indices[labs].tolist()
+        self.number_of_axes = model.number_of_axes[labs].tolist()
+        self.number_of_outcomes = model.number_of_outcomes[labs].tolist()
+        self.lab_tensors = [self._lab_tensor(model, lab) for lab in labs]
+        start = model.position(0)
+        end = model.position(1)
+        # One (ket, bra) pair of index labels per qubit, shared by both ends
+        # of its wire. Qubits traced out have equal ket and bra labels.
+        in_labels = [[None] * int(qubits) for qubits in model.number_of_in_qubits]
+        out_labels = [[None] * int(qubits) for qubits in model.number_of_out_qubits]
+        next_label = 0
+        for source, target, out_qubit, in_qubit in zip(model.wire_sources.tolist(), model.wire_targets.tolist(),
+                                                       model.wire_out_qubits.tolist(), model.wire_in_qubits.tolist()):
+            exists = 0 <= out_qubit < len(out_labels[source]) and 0 <= in_qubit < len(in_labels[target])
+            if not exists and (source == start or target == end):
+                # Wires of Start and End without qubits only order the labs
+                continue
+            if not 0 <= out_qubit < len(out_labels[source]):
+                raise ValueError("Error: wire leaves output qubit " + str(out_qubit) + " of lab "
+                                 + str(model.lab_indices[source]) + ", which has "
+                                 + str(len(out_labels[source])) + " output qubits")
+            if not 0 <= in_qubit < len(in_labels[target]):
+                raise ValueError("Error: wire enters input qubit " + str(in_qubit) + " of lab "
+                                 + str(model.lab_indices[target]) + ", which has "
+                                 + str(len(in_labels[target])) + " input qubits")
+            labels = (next_label, next_label) if target == end else (next_label, next_label + 1)
+            out_labels[source][out_qubit] = labels
+            in_labels[target][in_qubit] = labels
+            next_label += 2
+        for position in labs + [start]:
+            for qubit, labels in enumerate(out_labels[position]):
+                if labels is None: # Unwired, traced out
+                    out_labels[position][qubit] = (next_label, next_label)
+                    next_label += 1
+        for position in labs:
+            if None in in_labels[position]:
+                raise ValueError("Error: input qubit " + str(in_labels[position].index(None)) + " of lab "
+                                 + str(model.lab_indices[position]) + " is not wired")
+        number_of_start_qubits = len(out_labels[start])
+        if initial_state is None:
+            initial_state = np.zeros((2 ** number_of_start_qubits,) * 2)
+            initial_state[0, 0] = 1
+        initial_state = np.asarray(initial_state)
+        if initial_state.shape != (2 ** number_of_start_qubits,) * 2:
+            raise ValueError("Error: the initial state must be a (2^" + str(number_of_start_qubits) + ", 2^"
+                             + str(number_of_start_qubits) + ") density matrix of the output qubits of Start")
+        self.initial_state = initial_state
+        self._start_sublist = [ket for ket, _ in out_labels[start]] + [bra for _, bra in out_labels[start]]
+        self._sublists = []
+        for position in labs:
+            qubit_labels = in_labels[position] + out_labels[position]
+            self._sublists.append([ket for ket, _ in qubit_labels] + [bra for _, bra in qubit_labels])
+        self._probabilities = None
+
+    def _lab_tensor(self, model, lab):
+        """Returns the Choi matrices of a lab as a tensor indexed by (axis,
+        outcome, input kets..., output kets..., input bras..., output
+        bras...), building them from the Kraus operators if needed."""
+        CPMaps = model.CPMaps(lab)
+        in_qubits = int(model.number_of_in_qubits[lab])
+        out_qubits = int(model.number_of_out_qubits[lab])
+        if CPMaps.shape[2:] == (2 ** out_qubits, 2 ** in_qubits) and in_qubits + out_qubits > 0:
+            # Choi matrix of rho -> K rho K^dagger, indexed by (input ket,
+            # output ket, input bra, output bra)
+            CPMaps = np.einsum("...ki,...lj->...ikjl", CPMaps, CPMaps.conj())
+        return CPMaps.reshape(CPMaps.shape[:2] + (2,) * (2 * (in_qubits + out_qubits)))
+
+    def _contraction_order(self):
+        """Returns the order in which to contract the labs, computed once per
+        structure: greedily the lab leaving the fewest wires open."""
+        key = (tuple(self._start_sublist), tuple(tuple(sublist) for sublist in self._sublists))
+        if key not in _order_cache:
+            remaining = list(range(0, len(self._sublists)))
+            open_labels = set(self._start_sublist)
+            order = []
+            while remaining:
+                # Labels still open after contracting each candidate
+                open_after = {i: (open_labels | set(self._sublists[i]))
+                              & set().union(*[self._sublists[j] for j in remaining if j != i])
+                              for i in remaining}
+                lab = min(remaining, key=lambda i: len(open_after[i]))
+                open_labels = open_after[lab]
+                remaining.remove(lab)
+                order.append(lab)
+            _order_cache[key] = order
+        return _order_cache[key]
+
+    def _weights(self):
+        """Contracts the initial state and the labs one at a time and returns
+        the unnormalized weights indexed by axes and outcomes."""
+        order = self._contraction_order()
+        # Partial result indexed by (batch, open labels...), the batch index
+        # running over the axes and outcomes of the labs contracted so far
+        partial = self.initial_state.reshape((1,) + (2,) * len(self._start_sublist))
+        partial_sublist = self._start_sublist
+        for step, lab in enumerate(order):
+            later = set().union(*[self._sublists[j] for j in order[step + 1:]])
+            sublist = self._sublists[lab]
+            kept = [label for label in dict.fromkeys(partial_sublist + sublist) if label in later]
+            # Batch, axis and outcome are 0, 1 and 2, qubit labels follow
+            local = {label: i for i, label in enumerate(dict.fromkeys(partial_sublist + sublist), start=3)}
+            if len(local) + 3 > _MAX_EINSUM_INDICES:
+                raise ValueError("Error: too many qubits in flight to contract lab " + str(self.lab_indices[lab]))
+            partial = np.einsum(partial, [0] + [local[label] for label in partial_sublist],
+                                self.lab_tensors[lab], [1, 2] + [local[label] for label in sublist],
+                                [0, 1, 2] + [local[label] for label in kept])
+            partial = partial.reshape((-1,) + partial.shape[3:])
+            partial_sublist = kept
+        # The batch index enumerates (axis, outcome) pairs in contraction
+        # order, sort them to the axes then the outcomes in the Labs order
+        number_of_labs = len(order)
+        weights = partial.reshape([dimension for lab in order
+                                   for dimension in (self.number_of_axes[lab], self.number_of_outcomes[lab])])
+        rank = np.argsort(order)
+        return weights.transpose([2 * rank[i] for i in range(0, number_of_labs)]
+                                 + [2 * rank[i] + 1 for i in range(0, number_of_labs)])
+
+    def probabilities(self):
+        """Returns the dense tensor of joint outcome probabilities, indexed
+        by the measurement axes of all labs followed by their outcomes, labs
+        in the order of the PMF's Labs array. The result is cached.
+
+        Returns:
+            numpy ndarray: Probability tensor, summing to 1 over the outcomes
+            for every choice of axes
+
+        Raises:
+            ValueError: If the CPMaps give a zero total weight to a choice of
+            measurement axes
+        """
+        if self._probabilities is None:
+            weights = self._weights()
+            number_of_labs = len(self.lab_indices)
+            outcome_axes = tuple(range(number_of_labs, 2 * number_of_labs))
+            totals = weights.sum(axis=outcome_axes, keepdims=True)
+            if np.any(totals == 0):
+                axes = np.argwhere(totals == 0)[0][:number_of_labs].tolist()
+                raise ValueError("Error: the CPMaps give a zero total weight to the measurement axes "
+                                 + str(axes) + " of labs " + str(self.lab_indices))
+            self._probabilities = weights / totals
+        return self._probabilities
+
+    def leaf_probabilities(self, GEFII):
+        """Returns the probability of every outcome node of a GEFII converted
+        from the same PMF, in depth-first order, i.e. by payoff.
+
+        Args:
+            GEFII (GEFII): GEFII object
+
+        Returns:
+            numpy 1d array: Probability of every outcome node
+        """
+        decisions = GEFII.numbering.possible_decisions
+        # Complete LO histories in depth-first order, one per row, as the
+        # digits of the row indices, the first player varying the slowest
+        strides = np.ones(len(decisions), dtype=np.int64)
+        strides[:-1] = np.cumprod(decisions[:0:-1])[::-1]
+        rows = np.arange(int(np.prod(decisions)), dtype=np.int64)
+        histories = rows[:, None] // strides % decisions
+        # CS players 2i and 2i+1 are the axis and outcome of the i-th lab
+        CS_histories = np.empty_like(histories)
+        CS_histories[:, GEFII.map_LOplayer2CSplayer] = histories
+        number_of_labs = len(self.lab_indices)
+        index = tuple(CS_histories[:, 0:2 * number_of_labs:2].T) + tuple(CS_histories[:, 1:2 * number_of_labs:2].T)
+        return self.probabilities()[index]
+
+    def fill_outcome_nodes(self, GEFII):
+        """Returns a copy of GEFII_json where every outcome node carries the
+        probability of its history under "probability".
+
+        Args:
+            GEFII (GEFII): GEFII object converted from the same PMF
+
+        Returns:
+            dict: GEFII dictionary with filled outcome nodes
+        """
+        leaf_probabilities = self.leaf_probabilities(GEFII)
+        GEFII_arrays = GEFII.GEFII_arrays
+        node_probabilities = np.zeros(GEFII_arrays.number_of_nodes)
+        is_outcome = GEFII_arrays.kind == OUTCOME
+        node_probabilities[is_outcome] = leaf_probabilities[GEFII_arrays.payoff[is_outcome]]
+        GEFII_json = GEFII_arrays.to_dict()
+        # The depth-first order of the dictionary is the order of the arrays
+        stack = [GEFII_json]
+        node = 0
+        while stack:
+            current = stack.pop()
+            if current["kind"] == "outcome":
+                current["probability"] = float(node_probabilities[node])
+            else:
+                stack.extend(reversed(current["children"]))
+            node += 1
+        return GEFII_json
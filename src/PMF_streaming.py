@@ -0,0 +1,115 @@
+import json
+import mmap
+import re
+import numpy as np
+
+# Start of the value of a CPMap key. "CPMaps" does not match.
+_CPMAP_PATTERN = re.compile(rb'"CPMap"\s*:\s*\[')
+
+class LazyCPMap:
+    """CPMap matrix left unparsed in its PMF JSON file. The matrix is read
+    from its byte range and parsed into a contiguous numpy array on first
+    access only, so loading a PMF costs nothing per matrix entry.
+    """
+    __slots__ = ("path", "start", "stop", "_array")
+
+    def __init__(self, path, start, stop):
+        """Records where the CPMap lies in its file.
+
+        Args:
+            path (string): Path to the PMF JSON file
+            start (int): Offset of the opening bracket of the matrix
+            stop (int): Offset right after its closing bracket
+        """
+        self.path = path
+        self.start = start
+        self.stop = stop
+        self._array = None
+
+    @property
+    def array(self):
+        """numpy 2d array: The CPMap, parsed on first access"""
+        if self._array is None:
+            with open(self.path, "rb") as PMF_file:
+                PMF_file.seek(self.start)
+                text = PMF_file.read(self.stop - self.start)
+            rows = json.loads(text)
+            assert all(isinstance(row, list) for row in rows), "Error: CPMap is not a matrix in " + self.path
+            assert len(set(len(row) for row in rows)) <= 1, "Error: CPMap rows of unequal length in " + self.path
+            self._array = np.array(rows, dtype=float).reshape(len(rows), len(rows[0]) if rows else 0)
+        return self._array
+
+    def __array__(self, dtype=None, copy=None):
+        return self.array if dtype is None else self.array.astype(dtype, copy=False)
+
+    def __len__(self):
+        return len(self.array)
+
+    def __iter__(self):
+        # Rows as lists, e.g. for the jsonschema validation of the numbers
+        return iter(self.array.tolist())
+
+    def __eq__(self, other):
+        return np.array_equal(self.array, np.asarray(other, dtype=float))
+
+    __hash__ = None
+
+    def tolist(self):
+        """Returns the CPMap as lists of floats, as json.load would."""
+        return self.array.tolist()
+
+def _skip_array(buffer, start):
+    """Returns the offset right after the array opening at start. Only
+    brackets are looked for, so numbers are jumped over without being read."""
+    depth = 0
+    position = start
+    while True:
+        opening = buffer.find(b"[", position)
+        closing = buffer.find(b"]", position)
+        assert closing >= 0, "Error: unterminated CPMap array"
+        if 0 <= opening < closing:
+            depth += 1
+            position = opening + 1
+        else:
+            depth -= 1
+            position = closing + 1
+            if depth == 0:
+                return position
+
+def load_PMF_json_streaming(json_file, path):
+    """Loads a PMF JSON file without parsing its CPMaps. The file is scanned
+    through a memory map, every CPMap matrix is cut out of the text that is
+    parsed and replaced by a LazyCPMap pointing to its byte range. The rest
+    of the dictionary, e.g. the labs' numbers of axes and outcomes and the
+    wires, is identical to the one of json.load.
+
+    Args:
+        json_file (string): Name of PMF JSON file inside the path folder
+        path (string): Path to PMF JSON file's folder
+
+    Returns:
+        dict: Dictionary storage of the PMF JSON object with lazy CPMaps
+    """
+    PMF_path = str(path + json_file)
+    pieces = []
+    CPMap_ranges = []
+    with open(PMF_path, "rb") as PMF_file:
+        with mmap.mmap(PMF_file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            position = 0
+            for match in _CPMAP_PATTERN.finditer(buffer):
+                if match.start() < position:
+                    continue # Nested in a CPMap already skipped
+                start = match.end() - 1
+                stop = _skip_array(buffer, start)
+                # The placeholder is the index of the CPMap
+                pieces.append(buffer[position:start])
+                pieces.append(str(len(CPMap_ranges)).encode("ascii"))
+                CPMap_ranges.append((start, stop))
+                position = stop
+            pieces.append(buffer[position:])
+    PMF_json = json.loads(b"".join(pieces).decode("utf-8"))
+    for lab in PMF_json["ProcessMatrixFramework"]["Labs"]:
+        for measurement in lab["Measurements"]:
+            for CPMap in measurement["CPMaps"]:
+                CPMap["CPMap"] = LazyCPMap(PMF_path, *CPMap_ranges[CPMap["CPMap"]])
+    return PMF_json
@@ -0,0 +1,223 @@
+"""Parallel batch conversion of PMF JSON files to GEFII JSON files.
+
+Usage: python -m src.batch INPUT [INPUT ...] --output-dir DIR [--workers N]
+
+Every INPUT is a PMF JSON file, a directory of PMF JSON files or a glob
+pattern. One line of summary per file is written to a JSON lines file.
+"""
+import argparse
+import collections
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+import glob
+import json
+import os
+import sys
+from src import utils
+from src import headless
+from src.GEFII_cache import ConversionCache
+
+PATH_TO_SRC = os.path.dirname(os.path.abspath(__file__))
+PATH_TO_GEFII_JSONS = os.path.join(PATH_TO_SRC, "GEFII_JSONs", "")
+PATH_TO_PMF_JSONS = os.path.join(PATH_TO_SRC, "PMF_JSONs", "")
+
+# Per worker process state, set up once by _initialize_worker. True stands
+# for the default conversion cache.
+_worker_cache = True
+
+def _initialize_worker(cache_directory, validation, cache=True):
+    """Loads and compiles the schemas once per worker process and opens the
+    conversion cache.
+
+    Args:
+        cache_directory (string or None): Directory of the conversion cache,
+        None for the default one
+        validation (string): GEFII validation level of the batch
+        cache (bool, optional): If False, conversions are not cached.
+        Defaults to True.
+    """
+    global _worker_cache
+    utils.load_schema_validator(PATH_TO_PMF_JSONS + "PMF_schema.jschema")
+    if validation == utils.VALIDATION_FULL:
+        utils.load_schema_validator(PATH_TO_GEFII_JSONS + "GEFII_schema.jschema")
+    _worker_cache = ConversionCache(cache_directory) if cache and cache_directory is not None else cache
+
+def collect_PMF_files(inputs):
+    """Expands directories and glob patterns into a sorted list of PMF files.
+    JSON schemas are left out.
+
+    Args:
+        inputs (list of strings): Files, directories or glob patterns
+
+    Returns:
+        list of strings: Paths to the PMF JSON files
+    """
+    PMF_files = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            candidates = glob.glob(os.path.join(item, "*.json"))
+        else:
+            candidates = glob.glob(item)
+        PMF_files.update(path for path in candidates
+                         if os.path.isfile(path) and not path.endswith(".jschema"))
+    return sorted(PMF_files)
+
+def convert_file(PMF_path, output_dir, validation=utils.VALIDATION_STRUCTURAL, compact=False):
+    """Converts one PMF JSON file and writes its GEFII JSON file. Never raises:
+    errors are reported in the returned summary.
+
+    Args:
+        PMF_path (string): Path to the PMF JSON file
+        output_dir (string): Folder to write the GEFII JSON file to
+        validation (string, optional): GEFII validation level. Defaults to
+        "structural".
+        compact (bool, optional): If True, writes compact JSON. Defaults to
+        False.
+
+    Returns:
+        dict: Summary with the file, status, error, counts and stage timings
+    """
+    PMF_name = os.path.splitext(os.path.basename(PMF_path))[0]
+    output_path = os.path.join(output_dir, PMF_name + "_GEFII")
+    summary = {"file": PMF_path}
+    summary.update(headless.convert_to_json(
+        lambda: utils.load_PMF_json(os.path.basename(PMF_path), os.path.join(os.path.dirname(PMF_path), "")),
+        output_path, PMF_name, validation=validation, compact=compact, cache=_worker_cache))
+    if summary["status"] == "ok":
+        summary["output"] = output_path
+    return summary
+
+def _convert_in_pool(PMF_files, output_dir, workers, initargs, validation, compact, report):
+    """Converts PMF files in a fresh process pool, with at most one file in
+    flight per worker so that the files being converted are known when a
+    worker process dies, which breaks the pool.
+
+    Args:
+        PMF_files (list of strings): Paths to the PMF JSON files
+        output_dir (string): Folder to write the GEFII JSON files to
+        workers (int or None): Number of worker processes
+        initargs (tuple): Arguments of _initialize_worker
+        validation (string): GEFII validation level
+        compact (bool): If True, writes compact JSON
+        report (callable): Called with the summary of every converted file
+
+    Returns:
+        tuple: Files in flight when a worker process died and files not
+        submitted yet, both empty if the pool did not break
+    """
+    remaining = collections.deque(PMF_files)
+    max_in_flight = workers or os.cpu_count() or 1
+    in_flight = {}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_initialize_worker,
+                                                initargs=initargs) as executor:
+        try:
+            while remaining or in_flight:
+                while remaining and len(in_flight) < max_in_flight:
+                    in_flight[executor.submit(convert_file, remaining[0], output_dir, validation, compact)] = remaining[0]
+                    remaining.popleft()
+                done, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    summary = _summary_of(future, in_flight[future])
+                    if summary is None:
+                        raise BrokenProcessPool()
+                    del in_flight[future]
+                    report(summary)
+        except BrokenProcessPool:
+            # Files converted before the pool broke are still reported
+            broken = []
+            for future in concurrent.futures.as_completed(in_flight):
+                summary = _summary_of(future, in_flight[future])
+                if summary is None:
+                    broken.append(in_flight[future])
+                else:
+                    report(summary)
+            return broken, list(remaining)
+    return [], []
+
+def _summary_of(future, PMF_path):
+    """Returns the summary of a completed conversion, or None if its worker
+    process died."""
+    try:
+        return future.result()
+    except BrokenProcessPool:
+        return None
+    except Exception as error: # e.g. the summary could not be sent back
+        return {"file": PMF_path, "status": "error", "error": type(error).__name__ + ": " + str(error), "timings": {}}
+
+def convert_batch(PMF_files, output_dir, workers=None, summary_path=None,
+                  validation=utils.VALIDATION_STRUCTURAL, compact=False, cache_directory=None, cache=True):
+    """Converts PMF files across a process pool. A file whose conversion kills
+    its worker process is reported as failed, and the pool is restarted to
+    convert the other files: the files that were in flight with it are
+    retried one at a time, to find the one that killed the worker.
+
+    Args:
+        PMF_files (list of strings): Paths to the PMF JSON files
+        output_dir (string): Folder to write the GEFII JSON files to
+        workers (int, optional): Number of worker processes. Defaults to the
+        number of CPUs.
+        summary_path (string, optional): JSON lines file receiving one summary
+        per file. Defaults to "summary.jsonl" in output_dir.
+        validation (string, optional): GEFII validation level. Defaults to
+        "structural".
+        compact (bool, optional): If True, writes compact JSON. Defaults to
+        False.
+        cache_directory (string, optional): Directory of the conversion cache
+        shared by the workers. Defaults to GEFII_cache.default_cache().
+        cache (bool, optional): If False, conversions are not cached.
+        Defaults to True.
+
+    Returns:
+        list of dicts: Summaries in the order of PMF_files
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    if summary_path is None:
+        summary_path = os.path.join(output_dir, "summary.jsonl")
+    initargs = (cache_directory, validation, cache)
+    summaries = {}
+    with open(summary_path, "w", encoding="utf-8") as summary_file:
+        def _report(summary):
+            summaries[summary["file"]] = summary
+            summary_file.write(json.dumps(summary) + "\n")
+            summary_file.flush()
+
+        remaining = list(PMF_files)
+        while remaining:
+            in_flight, remaining = _convert_in_pool(remaining, output_dir, workers, initargs, validation,
+                                                    compact, _report)
+            for PMF_path in in_flight:
+                # Alone in its pool, a file breaking it again is the culprit
+                if len(in_flight) == 1 or _convert_in_pool([PMF_path], output_dir, 1, initargs, validation,
+                                                           compact, _report)[0]:
+                    _report({"file": PMF_path, "status": "error",
+                             "error": "BrokenProcessPool: the worker process converting this file died",
+                             "timings": {}})
+    return [summaries[PMF_path] for PMF_path in PMF_files]
+
+def main(argv=None):
+    """Command line entry point of the batch conversion."""
+    parser = argparse.ArgumentParser(description="Converts PMF JSON files to GEFII JSON files in parallel.")
+    parser.add_argument("inputs", nargs="+", help="PMF JSON files, directories or glob patterns")
+    parser.add_argument("--output-dir", required=True, help="folder to write the GEFII JSON files to")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: number of CPUs)")
+    parser.add_argument("--summary", default=None, help="JSON lines summary file (default: OUTPUT_DIR/summary.jsonl)")
+    parser.add_argument("--validation", choices=utils.VALIDATION_LEVELS, default=utils.VALIDATION_STRUCTURAL,
+                        help="GEFII validation level (default: structural)")
+    parser.add_argument("--compact", action="store_true", help="write GEFII JSON without indentation")
+    parser.add_argument("--cache-dir", default=None,
+                        help="directory of the on-disk conversion cache (default: $GEFII_CACHE_DIR or ~/.cache/quantumgameconverter)")
+    parser.add_argument("--no-cache", action="store_true", help="convert without the on-disk conversion cache")
+    args = parser.parse_args(argv)
+
+    PMF_files = collect_PMF_files(args.inputs)
+    summaries = convert_batch(PMF_files, args.output_dir, workers=args.workers, summary_path=args.summary,
+                              validation=args.validation, compact=args.compact, cache_directory=args.cache_dir,
+                              cache=not args.no_cache)
+    failures = [summary for summary in summaries if summary["status"] != "ok"]
+    print("Converted {} of {} PMF files".format(len(summaries) - len(failures), len(summaries)))
+    for failure in failures:
+        print("  " + failure["file"] + ": " + failure["error"])
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,227 @@
+"""Scaling benchmark of the PMF to GEFII conversion on synthetic PMFs.
+
+Usage: python -m src.benchmark [--labs N [N ...]] [--axes A] [--outcomes O]
+[--density D] [--depth K] [--repeat R] [--output FILE] [--plot FILE]
+[--compare BASELINE]
+
+For every number of labs, a PMF is generated with src.PMF_generator and
+converted. The wall time and the peak of allocated memory of every stage are
+written to a JSON results file, which can be compared with the results of
+another commit to catch regressions.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from src import utils
+from src import GEFII_class as gefii
+from src.PMF_generator import generate_PMF
+
+PATH_TO_SRC = os.path.dirname(os.path.abspath(__file__))
+PATH_TO_GEFII_JSONS = os.path.join(PATH_TO_SRC, "GEFII_JSONs", "")
+# Conversion stages recorded by GEFII itself, followed by the ones timed here
+CONVERSION_STAGES = ("build_CS_graph", "build_LO_order", "numbering", "build_T", "build_tree", "validate")
+EXTRA_STAGES = ("validate_GEFII", "visualize_GEFII", "save_GEFII_to_json")
+# A stage regresses if it gets slower than this factor times the baseline
+DEFAULT_TOLERANCE = 1.5
+# Seconds below which timings are too noisy to be compared
+NOISE_FLOOR = 0.01
+
+def _measure(function):
+    """Runs function and returns its wall time and the peak of memory it
+    allocated. tracemalloc must be tracing."""
+    tracemalloc.reset_peak()
+    memory_start = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    function()
+    seconds = time.perf_counter() - start
+    return seconds, max(tracemalloc.get_traced_memory()[1] - memory_start, 0)
+
+def benchmark_PMF(PMF_json, PMF_name, output_dir, build_T=False, visualize=True):
+    """Converts one PMF and measures every stage.
+
+    Args:
+        PMF_json (dict): PMF dictionary
+        PMF_name (string): Name of the PMF, used for the output files
+        output_dir (string): Folder receiving the figures and GEFII JSONs
+        build_T (bool or string, optional): Passed to GEFII. Defaults to False.
+        visualize (bool, optional): If True, also measures the tree layout
+        written as SVG. Defaults to True.
+
+    Returns:
+        dict: Counts of the game and, per stage, "seconds", "peak_bytes" and
+        the counts of the stage
+    """
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    try:
+        GEFII = gefii.GEFII(PATH_TO_GEFII_JSONS, os.path.join(output_dir, ""), PMF_json, PMF_name,
+                            build_T=build_T, cache=False, validation=utils.VALIDATION_STRUCTURAL)
+        conversion_stats = GEFII.stats.to_dict()
+        stages = {stage: conversion_stats[stage] for stage in CONVERSION_STAGES}
+        extra_stages = {"validate_GEFII": lambda: GEFII.validate_GEFII(level=utils.VALIDATION_FULL),
+                        "save_GEFII_to_json": lambda: GEFII.save_GEFII_to_json(
+                            streaming=True, file=os.path.join(output_dir, PMF_name + "_GEFII"))}
+        if visualize:
+            extra_stages["visualize_GEFII"] = lambda: GEFII.visualize_GEFII(True, file_format="svg")
+        for stage, function in extra_stages.items():
+            seconds, peak_bytes = _measure(function)
+            stages[stage] = {"seconds": seconds, "peak_bytes": peak_bytes}
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+    return {"number_of_players": GEFII.number_of_players,
+            "number_of_informationsets": GEFII.number_of_informationsets,
+            "number_of_payoffs": GEFII.number_of_payoffs,
+            "number_of_tree_nodes": GEFII.GEFII_arrays.number_of_nodes,
+            "stages": stages}
+
+def _git_commit():
+    """Returns the current git commit, or None outside of a git checkout."""
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=PATH_TO_SRC).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmark(labs, number_of_axes=2, number_of_outcomes=2, wiring_density=0.3, depth=None,
+                  repeat=1, seed=0, build_T=False, visualize=True):
+    """Benchmarks the conversion of generated PMFs of increasing sizes. Every
+    configuration is run repeat times and the fastest run is kept.
+
+    Args:
+        labs (list of ints): Numbers of labs to generate
+        number_of_axes (int, optional): Measurement axes per lab. Defaults
+        to 2.
+        number_of_outcomes (int, optional): Outcomes per axis. Defaults to 2.
+        wiring_density (float, optional): Wiring density. Defaults to 0.3.
+        depth (int, optional): Depth of the DAG of labs, capped by the number
+        of labs. Defaults to a chain.
+        repeat (int, optional): Runs per configuration. Defaults to 1.
+        seed (int, optional): Seed of the generator. Defaults to 0.
+        build_T (bool or string, optional): Passed to GEFII. Defaults to False.
+        visualize (bool, optional): If True, measures visualize_GEFII.
+        Defaults to True.
+
+    Returns:
+        dict: Machine-readable results with the environment and one entry
+        per configuration
+    """
+    results = {"commit": _git_commit(), "python": platform.python_version(),
+               "machine": platform.machine(), "results": []}
+    with tempfile.TemporaryDirectory() as output_dir:
+        # Warm up, so that lazy imports are not measured in the first stages
+        benchmark_PMF(generate_PMF(1, CPMaps=False), "benchmark_warm_up", output_dir, build_T=build_T,
+                      visualize=visualize)
+        for number_of_labs in labs:
+            configuration = {"labs": number_of_labs, "axes": number_of_axes, "outcomes": number_of_outcomes,
+                             "density": wiring_density,
+                             "depth": number_of_labs if depth is None else min(depth, number_of_labs),
+                             "seed": seed, "build_T": build_T}
+            PMF_json = generate_PMF(number_of_labs, number_of_axes, number_of_outcomes, wiring_density,
+                                    configuration["depth"], seed, CPMaps=False)
+            runs = [benchmark_PMF(PMF_json, "benchmark_" + str(number_of_labs), output_dir,
+                                  build_T=build_T, visualize=visualize)
+                    for _ in range(0, repeat)]
+            best = runs[0]
+            for stage in best["stages"]:
+                best["stages"][stage]["seconds"] = min(run["stages"][stage]["seconds"] for run in runs)
+            results["results"].append(dict(configuration, **best))
+            print("{} labs, {} tree nodes: {:.3f}s".format(
+                number_of_labs, best["number_of_tree_nodes"],
+                sum(stage["seconds"] for stage in best["stages"].values())))
+    return results
+
+def compare_results(baseline, current, tolerance=DEFAULT_TOLERANCE):
+    """Lists the stages that got slower than tolerance times their baseline,
+    matching configurations by their parameters.
+
+    Args:
+        baseline (dict): Results of run_benchmark for the reference commit
+        current (dict): Results of run_benchmark to check
+        tolerance (float, optional): Allowed slowdown factor. Defaults to 1.5.
+
+    Returns:
+        list of strings: One description per regression
+    """
+    def _key(result):
+        return tuple(result[name] for name in ("labs", "axes", "outcomes", "density", "depth", "seed", "build_T"))
+
+    baseline_results = {_key(result): result for result in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        reference = baseline_results.get(_key(result))
+        if reference is None:
+            continue
+        for stage, measure in result["stages"].items():
+            if stage not in reference["stages"]:
+                continue
+            # Stages under the noise floor are compared to the noise floor
+            reference_seconds = max(reference["stages"][stage]["seconds"], NOISE_FLOOR)
+            if measure["seconds"] > tolerance * reference_seconds:
+                regressions.append("{} labs, {}: {:.4f}s instead of {:.4f}s".format(
+                    result["labs"], stage, measure["seconds"], reference["stages"][stage]["seconds"]))
+    return regressions
+
+def plot_scaling_curves(results, path):
+    """Plots the time of every stage against the number of tree nodes, on log
+    scales.
+
+    Args:
+        results (dict): Results of run_benchmark
+        path (string): Path to store the PNG figure at
+    """
+    import matplotlib.pyplot as plt
+    nodes = [result["number_of_tree_nodes"] for result in results["results"]]
+    plt.figure()
+    for stage in CONVERSION_STAGES + EXTRA_STAGES:
+        seconds = [result["stages"].get(stage, {}).get("seconds") for result in results["results"]]
+        if all(second is not None for second in seconds):
+            plt.plot(nodes, seconds, marker="o", label=stage)
+    plt.xscale("log")
+    plt.yscale("log")
+    plt.xlabel("GEFII tree nodes")
+    plt.ylabel("seconds")
+    plt.legend(fontsize=8)
+    plt.savefig(path)
+
+def main(argv=None):
+    """Command line entry point of the benchmark."""
+    parser = argparse.ArgumentParser(description="Benchmarks the conversion on synthetic PMFs.")
+    parser.add_argument("--labs", type=int, nargs="+", default=[2, 4, 6, 8], help="numbers of labs (default: 2 4 6 8)")
+    parser.add_argument("--axes", type=int, default=2, help="measurement axes per lab (default: 2)")
+    parser.add_argument("--outcomes", type=int, default=2, help="outcomes per axis (default: 2)")
+    parser.add_argument("--density", type=float, default=0.3, help="wiring density (default: 0.3)")
+    parser.add_argument("--depth", type=int, default=None, help="depth of the DAG of labs (default: a chain)")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per configuration, the fastest is kept (default: 1)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default: 0)")
+    parser.add_argument("--build-T", action="store_true", help="also build the matrix map T")
+    parser.add_argument("--no-visualize", action="store_true", help="skip visualize_GEFII")
+    parser.add_argument("--output", default="benchmark.json", help="JSON results file (default: benchmark.json)")
+    parser.add_argument("--plot", default=None, help="PNG file receiving the scaling curves")
+    parser.add_argument("--compare", default=None, help="JSON results of a baseline to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed slowdown factor against the baseline (default: 1.5)")
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args.labs, args.axes, args.outcomes, args.density, args.depth, args.repeat,
+                            args.seed, build_T=args.build_T, visualize=not args.no_visualize)
+    utils.save_to_json(results, args.output)
+    if args.plot is not None:
+        plot_scaling_curves(results, args.plot)
+    if args.compare is not None:
+        with open(args.compare, "r", encoding="utf-8") as baseline_file:
+            regressions = compare_results(json.load(baseline_file), results, args.tolerance)
+        for regression in regressions:
+            print("Regression: " + regression)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""Headless entry point converting PMF dictionaries to GEFIIs without any
+plotting. Importing this module only pulls numpy and the conversion code:
+networkx is imported on the first conversion, matplotlib and jsonschema never
+are unless plots or full validation are requested.
+"""
+import os
+import re
+import sys
+import time
+from src import utils
+from src import GEFII_class as gefii
+
+PATH_TO_GEFII_JSONS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "GEFII_JSONs", "")
+PATH_TO_FIGURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Figures_PNG", "")
+PATH_TO_PMF_JSONS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "PMF_JSONs", "")
+# Budget for importing this module, measured with python -X importtime
+IMPORT_TIME_BUDGET_SECONDS = 0.2
+
+def convert(PMF_json, PMF_name="headless", validation=utils.VALIDATION_STRUCTURAL, cache=True):
+    """Converts a PMF dictionary to a GEFII object without plotting.
+
+    Args:
+        PMF_json (dict): Dict object representing a quantum experiment in
+        process matrix format.
+        PMF_name (string, optional): Name of the quantum experiment. Defaults
+        to "headless".
+        validation (string, optional): Validation level of the produced GEFII.
+        Defaults to "structural".
+        cache (bool or ConversionCache, optional): On-disk conversion cache,
+        see GEFII. Defaults to True, i.e. the default cache.
+
+    Returns:
+        GEFII: The converted GEFII
+    """
+    return gefii.GEFII(PATH_TO_GEFII_JSONS, PATH_TO_FIGURES, PMF_json, PMF_name,
+                       plot_CS=False, plot_GEFII=False, cache=cache, validation=validation)
+
+def convert_to_json(load_PMF_json, file, PMF_name="headless", validation=utils.VALIDATION_STRUCTURAL,
+                    compact=False, cache=True):
+    """Loads a PMF, validates it against the PMF jschema, converts it and
+    writes its GEFII JSON document. Used by the batch and service workers.
+    Never raises: errors are reported in the returned summary, so that one
+    bad PMF neither aborts a batch nor kills a worker.
+
+    Args:
+        load_PMF_json (callable): Returns the PMF dictionary, e.g. by loading
+        a file or parsing a request body
+        file (string or file-like): Path to write the GEFII JSON file to, or
+        text file-like object to write to
+        PMF_name (string, optional): Name of the quantum experiment. Defaults
+        to "headless".
+        validation (string, optional): GEFII validation level. Defaults to
+        "structural".
+        compact (bool, optional): If True, writes compact JSON. Defaults to
+        False.
+        cache (bool or ConversionCache, optional): On-disk conversion cache,
+        see GEFII. Defaults to True.
+
+    Returns:
+        dict: Summary with the "status" ("ok" or "error"), the "error", the
+        "timings" of every stage and, on success, the counts of the GEFII
+    """
+    summary = {"status": "ok", "error": None, "timings": {}}
+    try:
+        stage_start = time.perf_counter()
+        PMF_json = load_PMF_json()
+        summary["timings"]["load_PMF"] = time.perf_counter() - stage_start
+        stage_start = time.perf_counter()
+        utils.load_schema_validator(PATH_TO_PMF_JSONS + "PMF_schema.jschema").validate(PMF_json)
+        summary["timings"]["validate_PMF"] = time.perf_counter() - stage_start
+        GEFII = convert(PMF_json, PMF_name, validation=validation, cache=cache)
+        summary["timings"].update(GEFII.timings)
+        stage_start = time.perf_counter()
+        GEFII.save_GEFII_to_json(compact=compact, file=file)
+        summary["timings"]["save_GEFII"] = time.perf_counter() - stage_start
+        summary.update({"number_of_players": GEFII.number_of_players,
+                        "number_of_informationsets": GEFII.number_of_informationsets,
+                        "number_of_payoffs": GEFII.number_of_payoffs,
+                        "number_of_tree_nodes": GEFII.GEFII_arrays.number_of_nodes})
+    except Exception as error:
+        summary["status"] = "error"
+        summary["error"] = type(error).__name__ + ": " + str(error)
+    return summary
+
+def measure_import_time(module="src.headless"):
+    """Measures the cumulative import time of a module in a fresh interpreter.
+
+    Args:
+        module (string, optional): Module to import. Defaults to "src.headless".
+
+    Returns:
+        float: Import time in seconds
+    """
+    import subprocess
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + module],
+                            capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    # Lines look like "import time:   self [us] | cumulative | module"
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s*\d+\s*\|\s*(\d+)\s*\|\s*(\S+)\s*$", line)
+        if match and match.group(2) == module:
+            return int(match.group(1)) / 1e6
+    raise RuntimeError("Error: no import time reported for " + module)
+
+def check_import_budget():
+    """Checks that importing the headless entry point stays within budget.
+
+    Returns:
+        bool: True if the import time is within IMPORT_TIME_BUDGET_SECONDS
+    """
+    import_time = measure_import_time()
+    print("Import time of src.headless: {:.3f}s (budget {:.3f}s)".format(import_time, IMPORT_TIME_BUDGET_SECONDS))
+    return import_time <= IMPORT_TIME_BUDGET_SECONDS
+
+if __name__ == "__main__":
+    sys.exit(0 if check_import_budget() else 1)
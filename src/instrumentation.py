@@ -0,0 +1,224 @@
+import io
+import os
+import sys
+import time
+
+# Opt-in profiling modes of a conversion
+PROFILE_NONE = "none"
+PROFILE_CPROFILE = "cprofile"
+PROFILE_TRACEMALLOC = "tracemalloc"
+PROFILE_MODES = (PROFILE_NONE, PROFILE_CPROFILE, PROFILE_TRACEMALLOC)
+
+def _tracing_tracemalloc():
+    """Returns the tracemalloc module if it is tracing, None otherwise. It is
+    only imported if tracing may have been started, i.e. by an earlier import
+    or at startup with -X tracemalloc or PYTHONTRACEMALLOC, so that
+    conversions without profiling do not pay for it."""
+    if ("tracemalloc" not in sys.modules and "tracemalloc" not in sys._xoptions
+            and not os.environ.get("PYTHONTRACEMALLOC")):
+        return None
+    import tracemalloc
+    return tracemalloc if tracemalloc.is_tracing() else None
+
+class ConversionStats:
+    """Measurements of the stages of a conversion: wall time, peak of
+    allocated memory when tracemalloc is tracing, and counts such as players,
+    information sets, payoffs, nodes visited and information set lookups.
+    With a profiling mode, the whole conversion is also captured by cProfile
+    or by a tracemalloc snapshot.
+    """
+    def __init__(self, profile=PROFILE_NONE):
+        """Initializes empty stats.
+
+        Args:
+            profile (string, optional): One of PROFILE_MODES. "cprofile"
+            profiles the calls between start_profile and stop_profile,
+            "tracemalloc" traces allocations between them, and takes a
+            snapshot at the end. Defaults to "none".
+        """
+        assert profile in PROFILE_MODES, "Error: unknown profile mode " + str(profile)
+        self.profile = profile
+        # Wall time in seconds, peak of allocated bytes and counts per stage
+        self.timings = {}
+        self.memory_peaks = {}
+        self.counts = {}
+        # Results of the profiling mode
+        self.profile_stats = None
+        self.tracemalloc_snapshot = None
+        self._profiler = None
+        self._started_tracing = False
+        self._traced_memory_start = 0
+
+    def start_profile(self):
+        """Starts the profiling mode, if any, and the memory measurement of
+        the first stage.
+
+        Returns:
+            float: time.perf_counter(), i.e. the start of the first stage
+        """
+        if self.profile == PROFILE_TRACEMALLOC and _tracing_tracemalloc() is None:
+            import tracemalloc
+            tracemalloc.start()
+            self._started_tracing = True
+        elif self.profile == PROFILE_CPROFILE:
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        self.reset_memory_peak()
+        return time.perf_counter()
+
+    def stop_profile(self):
+        """Stops the profiling mode and keeps its results in profile_stats or
+        tracemalloc_snapshot."""
+        if self._profiler is not None:
+            import pstats
+            self._profiler.disable()
+            self.profile_stats = pstats.Stats(self._profiler)
+            self._profiler = None
+        tracemalloc = _tracing_tracemalloc()
+        if self.profile == PROFILE_TRACEMALLOC and tracemalloc is not None:
+            self.tracemalloc_snapshot = tracemalloc.take_snapshot()
+            if self._started_tracing:
+                tracemalloc.stop()
+                self._started_tracing = False
+
+    def reset_memory_peak(self):
+        """Starts measuring the peak of allocated memory from now on, if
+        tracemalloc is tracing."""
+        tracemalloc = _tracing_tracemalloc()
+        if tracemalloc is not None:
+            tracemalloc.reset_peak()
+            self._traced_memory_start = tracemalloc.get_traced_memory()[0]
+
+    def record(self, stage, stage_start, **counts):
+        """Stores the wall time of a stage, its peak of allocated memory if
+        tracemalloc is tracing, and its counts.
+
+        Args:
+            stage (string): Name of the stage
+            stage_start (float): time.perf_counter() at the start of the stage
+            **counts (int): Counts of the stage, e.g. nodes_visited=...
+
+        Returns:
+            float: time.perf_counter() at the end of the stage, i.e. the start
+            of the next one
+        """
+        stage_end = time.perf_counter()
+        self.timings[stage] = stage_end - stage_start
+        self.counts[stage] = {name: int(count) for name, count in counts.items()}
+        tracemalloc = _tracing_tracemalloc()
+        if tracemalloc is not None:
+            current, peak = tracemalloc.get_traced_memory()
+            self.memory_peaks[stage] = max(peak - self._traced_memory_start, 0)
+            tracemalloc.reset_peak()
+            self._traced_memory_start = current
+        return stage_end
+
+    def to_dict(self):
+        """Returns the stats of every stage, in stage order.
+
+        Returns:
+            dict: Maps stages to dictionaries with "seconds", "peak_bytes",
+            None if memory was not traced, and the counts of the stage
+        """
+        return {stage: dict({"seconds": seconds, "peak_bytes": self.memory_peaks.get(stage)},
+                            **self.counts.get(stage, {}))
+                for stage, seconds in self.timings.items()}
+
+    def report(self, limit=20):
+        """Formats the stats as a table, followed by the top entries of the
+        profiling mode if any.
+
+        Args:
+            limit (int, optional): Number of profile entries. Defaults to 20.
+
+        Returns:
+            string: The report
+        """
+        lines = ["{:<16} {:>10} {:>12}  {}".format("stage", "seconds", "peak bytes", "counts")]
+        for stage, stats in self.to_dict().items():
+            counts = ", ".join("{}={}".format(name, count) for name, count in self.counts.get(stage, {}).items())
+            lines.append("{:<16} {:>10.4f} {:>12}  {}".format(
+                stage, stats["seconds"], "-" if stats["peak_bytes"] is None else stats["peak_bytes"], counts))
+        if self.profile_stats is not None:
+            import pstats
+            text = io.StringIO()
+            self.profile_stats.stream = text
+            self.profile_stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(limit)
+            lines.append(text.getvalue())
+        if self.tracemalloc_snapshot is not None:
+            lines.append("Top allocations:")
+            lines.extend(str(statistic) for statistic in self.tracemalloc_snapshot.statistics("lineno")[:limit])
+        return "\n".join(lines)
+
+def print_progress(event):
+    """Progress callback printing one updating line per stage to stderr.
+
+    Args:
+        event (dict): Progress event, see ProgressReporter
+    """
+    eta = "?" if event["eta"] is None else "{:.1f}s".format(event["eta"])
+    sys.stderr.write("\r{}: {:.0%} ({}/{}) elapsed {:.1f}s, ETA {}".format(
+        event["stage"], event["done"] / max(event["total"], 1), event["done"], event["total"],
+        event["elapsed"], eta))
+    if event["done"] >= event["total"]:
+        sys.stderr.write("\n")
+    sys.stderr.flush()
+
+class ProgressReporter:
+    """Reports the progress of a long stage to a callback, at most every
+    min_interval seconds and once when the stage completes. Events are
+    dictionaries with the "stage", the units "done" and the "total" units,
+    the "elapsed" seconds and the "eta" in seconds, None until some units
+    are done.
+    """
+    def __init__(self, callback, stage, total, min_interval=0.5):
+        """Starts the stage.
+
+        Args:
+            callback (callable): Called with every event
+            stage (string): Name of the stage
+            total (int): Number of units of work of the stage
+            min_interval (float, optional): Minimum seconds between two
+            events. Defaults to 0.5.
+        """
+        self.callback = callback
+        self.stage = stage
+        self.total = int(total)
+        self.min_interval = min_interval
+        self._start = time.perf_counter()
+        self._last = None
+
+    def update(self, done):
+        """Reports that done units of work are complete, if min_interval
+        elapsed since the last event or the stage is complete.
+
+        Args:
+            done (int): Units of work complete
+        """
+        now = time.perf_counter()
+        if done < self.total and self._last is not None and now - self._last < self.min_interval:
+            return
+        self._last = now
+        elapsed = now - self._start
+        eta = elapsed * (self.total - done) / done if done > 0 else None
+        self.callback({"stage": self.stage, "done": int(done), "total": self.total,
+                       "elapsed": elapsed, "eta": eta})
+
+def progress_callback(progress):
+    """Returns the callback of a progress option.
+
+    Args:
+        progress (bool or callable): True prints progress to stderr, a
+        callable receives the progress events, None or False disables
+        progress
+
+    Returns:
+        callable or None: The callback
+    """
+    if progress is True:
+        return print_progress
+    if not progress:
+        return None
+    assert callable(progress), "Error: progress must be a bool or a callable"
+    return progress
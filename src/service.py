@@ -0,0 +1,483 @@
+"""Local conversion service: an asyncio HTTP server converting PMF JSON
+documents to GEFII JSON documents in a warm process pool.
+
+Usage: python -m src.service [--host HOST] [--port PORT] [--unix-socket PATH]
+[--workers N] [--cache-dir DIR] [--no-cache] [--result-cache-bytes B]
+
+Endpoints:
+    POST /convert?output=json|stream&validation=LEVEL&compact=0|1
+        The body is a PMF JSON document. The GEFII JSON document is returned
+        with a Content-Length ("json") or with chunked transfer encoding from
+        a spill file, keeping the memory of the service flat ("stream").
+        Invalid PMFs yield a 400 response with a JSON error. If a worker
+        process dies, the pool is restarted and the conversion retried once,
+        a second death yields a 503 response.
+    GET /metrics
+        Throughput, latency percentiles, cache hits and errors, as JSON.
+    GET /health
+        {"status": "ok"} once the workers are warm.
+
+Workers load the schemas and the conversion code once, and results of "json"
+requests are kept in an in-memory LRU cache keyed on the request, so repeated
+conversions never reach the pool. Identical requests in flight are only
+converted once.
+"""
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import urllib.parse
+import numpy as np
+from src import utils
+from src import GEFII_class as gefii
+from src import headless
+from src.GEFII_cache import ConversionCache
+from src.PMF_generator import generate_PMF
+
+PATH_TO_SRC = os.path.dirname(os.path.abspath(__file__))
+PATH_TO_GEFII_JSONS = os.path.join(PATH_TO_SRC, "GEFII_JSONs", "")
+PATH_TO_PMF_JSONS = os.path.join(PATH_TO_SRC, "PMF_JSONs", "")
+PATH_TO_FIGURES = os.path.join(PATH_TO_SRC, "Figures_PNG", "")
+# Output forms of /convert
+OUTPUT_JSON = "json"
+OUTPUT_STREAM = "stream"
+OUTPUTS = (OUTPUT_JSON, OUTPUT_STREAM)
+# Reasons of the HTTP statuses answered by the service
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+# Bytes per chunk of streamed responses
+STREAM_CHUNK_SIZE = 1 << 16
+# Number of latest requests the latency percentiles and throughput are
+# computed over
+METRICS_WINDOW = 4096
+
+# Per worker process state, set up once by _initialize_worker. True stands
+# for the default conversion cache.
+_worker_cache = True
+
+def _initialize_worker(cache_directory, cache=True):
+    """Loads and compiles the schemas once per worker process, opens the
+    conversion cache and warms the conversion code up.
+
+    Args:
+        cache_directory (string or None): Directory of the conversion cache,
+        None for the default one
+        cache (bool, optional): If False, conversions are not cached.
+        Defaults to True.
+    """
+    global _worker_cache
+    utils.load_schema_validator(PATH_TO_PMF_JSONS + "PMF_schema.jschema")
+    utils.load_schema_validator(PATH_TO_GEFII_JSONS + "GEFII_schema.jschema")
+    _worker_cache = ConversionCache(cache_directory) if cache and cache_directory is not None else cache
+    # Imports networkx and fills the numpy caches, the cache would skip both
+    gefii.GEFII(PATH_TO_GEFII_JSONS, PATH_TO_FIGURES, generate_PMF(1, CPMaps=False), "warm_up",
+                cache=False, validation=utils.VALIDATION_NONE)
+
+def _ping():
+    """Returns the worker's process id, used to start the workers."""
+    return os.getpid()
+
+def convert_request(body, output=OUTPUT_JSON, validation=utils.VALIDATION_STRUCTURAL, compact=True,
+                    spill_directory=None):
+    """Converts the body of a /convert request in a worker process. Never
+    raises: errors are reported in the returned summary.
+
+    Args:
+        body (bytes): PMF JSON document
+        output (string, optional): "json" returns the GEFII JSON document as
+        bytes, "stream" writes it to a spill file. Defaults to "json".
+        validation (string, optional): GEFII validation level. Defaults to
+        "structural".
+        compact (bool, optional): If True, writes compact JSON. Defaults to
+        True.
+        spill_directory (string, optional): Folder of the spill files.
+        Defaults to the temporary folder.
+
+    Returns:
+        dict: Summary with the status, error, counts and stage timings, and
+        the "GEFII" bytes or "spill_path" of the GEFII JSON document
+    """
+    def _load_PMF_json():
+        return json.loads(body)
+
+    if output == OUTPUT_STREAM:
+        try:
+            descriptor, spill_path = tempfile.mkstemp(suffix="_GEFII.json", dir=spill_directory)
+        except OSError as error:
+            return {"status": "error", "error": type(error).__name__ + ": " + str(error), "timings": {}}
+        summary = None
+        try:
+            with os.fdopen(descriptor, "w", encoding="utf-8") as spill_file:
+                summary = headless.convert_to_json(_load_PMF_json, spill_file, "service", validation=validation,
+                                                   compact=compact, cache=_worker_cache)
+        finally:
+            # Only a complete spill file is handed over to the server
+            if summary is None or summary["status"] != "ok":
+                os.remove(spill_path)
+        if summary["status"] == "ok":
+            summary["spill_path"] = spill_path
+        return summary
+    text = io.StringIO()
+    summary = headless.convert_to_json(_load_PMF_json, text, "service", validation=validation, compact=compact,
+                                       cache=_worker_cache)
+    if summary["status"] == "ok":
+        summary["GEFII"] = text.getvalue().encode("utf-8")
+    return summary
+
+class ServiceMetrics:
+    """Counters and latencies of the requests answered by the service."""
+    def __init__(self, window=METRICS_WINDOW):
+        """Initializes empty metrics.
+
+        Args:
+            window (int, optional): Number of latest requests the latency
+            percentiles and throughput are computed over. Defaults to 4096.
+        """
+        self.started = time.monotonic()
+        self.requests = 0
+        self.errors = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+        self.conversions = 0
+        self.in_flight = 0
+        self.pool_restarts = 0
+        # (end, latency) of the latest requests
+        self._latest = collections.deque(maxlen=window)
+
+    def record(self, latency, status):
+        """Records an answered request.
+
+        Args:
+            latency (float): Seconds from the request to the end of the
+            response
+            status (int): HTTP status of the response
+        """
+        self.requests += 1
+        if status >= 400:
+            self.errors += 1
+        self._latest.append((time.monotonic(), latency))
+
+    def to_dict(self):
+        """Returns the metrics.
+
+        Returns:
+            dict: Counters, throughput in requests per second over the latest
+            requests and over the uptime, and latency percentiles in seconds
+        """
+        now = time.monotonic()
+        metrics = {"uptime": now - self.started, "requests": self.requests, "errors": self.errors,
+                   "cache_hits": self.cache_hits, "coalesced": self.coalesced,
+                   "conversions": self.conversions, "in_flight": self.in_flight,
+                   "pool_restarts": self.pool_restarts,
+                   "throughput": self.requests / max(now - self.started, 1e-9),
+                   "recent_throughput": 0.0, "latency": None}
+        if self._latest:
+            ends, latencies = np.asarray(self._latest).T
+            if len(ends) > 1:
+                metrics["recent_throughput"] = (len(ends) - 1) / max(ends[-1] - ends[0], 1e-9)
+            percentiles = np.percentile(latencies, [50, 90, 99])
+            metrics["latency"] = {"mean": float(latencies.mean()), "p50": float(percentiles[0]),
+                                  "p90": float(percentiles[1]), "p99": float(percentiles[2]),
+                                  "max": float(latencies.max())}
+        return metrics
+
+class ConversionService:
+    """HTTP service dispatching conversions to a warm process pool."""
+    def __init__(self, workers=None, cache_directory=None, result_cache_bytes=1 << 26,
+                 max_body_bytes=1 << 26, spill_directory=None, cache=True):
+        """Starts the process pool. The server itself is started by serve.
+
+        Args:
+            workers (int, optional): Number of worker processes. Defaults to
+            the number of CPUs.
+            cache_directory (string, optional): Directory of the on-disk
+            conversion cache shared by the workers. Defaults to
+            GEFII_cache.default_cache().
+            result_cache_bytes (int, optional): Maximum size of the results of
+            "json" requests kept in memory. Defaults to 64 MiB.
+            max_body_bytes (int, optional): Maximum size of a request body.
+            Defaults to 64 MiB.
+            spill_directory (string, optional): Folder of the spill files of
+            "stream" requests. Defaults to the temporary folder.
+            cache (bool, optional): If False, conversions do not use the
+            on-disk conversion cache. Defaults to True.
+        """
+        self.workers = workers if workers is not None else os.cpu_count()
+        self.result_cache_bytes = result_cache_bytes
+        self.max_body_bytes = max_body_bytes
+        self.spill_directory = spill_directory
+        self.metrics = ServiceMetrics()
+        self._initargs = (cache_directory, cache)
+        self._executor = self._new_executor()
+        # Serializes the replacement of a broken process pool
+        self._executor_lock = asyncio.Lock()
+        # LRU cache of the summaries of "json" requests, by request key
+        self._results = collections.OrderedDict()
+        self._results_bytes = 0
+        # Conversions in flight, shared by identical requests
+        self._in_flight = {}
+
+    def _new_executor(self):
+        """Returns a new process pool of warm workers. Workers are spawned
+        rather than forked: a pool replaced while serving must not inherit
+        the sockets of the server and of its open connections."""
+        return concurrent.futures.ProcessPoolExecutor(max_workers=self.workers, initializer=_initialize_worker,
+                                                      initargs=self._initargs,
+                                                      mp_context=multiprocessing.get_context("spawn"))
+
+    async def _replace_executor(self, broken_executor):
+        """Replaces a process pool broken by the death of one of its workers,
+        unless another request already did."""
+        async with self._executor_lock:
+            if self._executor is broken_executor:
+                broken_executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = self._new_executor()
+                self.metrics.pool_restarts += 1
+
+    async def _run(self, *arguments):
+        """Runs convert_request in the process pool. If a worker process dies,
+        the pool is replaced and the conversion retried once.
+
+        Raises:
+            BrokenProcessPool: If the conversion breaks the new pool as well
+        """
+        loop = asyncio.get_running_loop()
+        for attempt in range(0, 2):
+            executor = self._executor
+            try:
+                return await loop.run_in_executor(executor, convert_request, *arguments)
+            except BrokenProcessPool:
+                await self._replace_executor(executor)
+                if attempt == 1:
+                    raise
+
+    async def warm_up(self):
+        """Starts all worker processes, which load the schemas and the
+        conversion code, before the first request."""
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[loop.run_in_executor(self._executor, _ping) for _ in range(0, self.workers)])
+
+    def close(self):
+        """Shuts the process pool down."""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def _cache_result(self, key, summary):
+        """Stores the summary of a "json" request in the LRU cache, evicting
+        the least recently used ones above result_cache_bytes."""
+        size = len(summary["GEFII"])
+        if size > self.result_cache_bytes:
+            return
+        self._results[key] = summary
+        self._results_bytes += size
+        while self._results_bytes > self.result_cache_bytes:
+            _, evicted = self._results.popitem(last=False)
+            self._results_bytes -= len(evicted["GEFII"])
+
+    async def convert(self, body, output=OUTPUT_JSON, validation=utils.VALIDATION_STRUCTURAL, compact=True):
+        """Converts a PMF JSON document in the process pool, looking it up in
+        the result cache and sharing the conversion of identical requests.
+
+        Args:
+            body (bytes): PMF JSON document
+            output (string, optional): "json" or "stream". Defaults to "json".
+            validation (string, optional): GEFII validation level. Defaults to
+            "structural".
+            compact (bool, optional): If True, returns compact JSON. Defaults
+            to True.
+
+        Returns:
+            dict: Summary of convert_request
+
+        Raises:
+            BrokenProcessPool: If the conversion kills its worker process
+            twice
+        """
+        if output == OUTPUT_STREAM:
+            self.metrics.conversions += 1
+            return await self._run(body, output, validation, compact, self.spill_directory)
+        key = (hashlib.sha256(body).digest(), validation, compact)
+        if key in self._results:
+            self._results.move_to_end(key)
+            self.metrics.cache_hits += 1
+            return self._results[key]
+        if key in self._in_flight:
+            self.metrics.coalesced += 1
+            return await asyncio.shield(self._in_flight[key])
+        future = asyncio.ensure_future(self._run(body, output, validation, compact))
+        self._in_flight[key] = future
+        self.metrics.conversions += 1
+        try:
+            summary = await future
+        finally:
+            del self._in_flight[key]
+        if summary["status"] == "ok":
+            self._cache_result(key, summary)
+        return summary
+
+    async def _respond(self, writer, status, body, content_type="application/json", keep_alive=True):
+        """Writes a complete HTTP response."""
+        writer.write("HTTP/1.1 {} {}\r\nContent-Type: {}\r\nContent-Length: {}\r\nConnection: {}\r\n\r\n".format(
+            status, HTTP_REASONS[status], content_type, len(body), "keep-alive" if keep_alive else "close")
+                     .encode("latin-1") + body)
+        await writer.drain()
+
+    async def _respond_file(self, writer, path, keep_alive=True):
+        """Writes a file as a chunked HTTP response and removes it."""
+        writer.write("HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nTransfer-Encoding: chunked\r\n"
+                     "Connection: {}\r\n\r\n".format("keep-alive" if keep_alive else "close").encode("latin-1"))
+        try:
+            with open(path, "rb") as f:
+                while True:
+                    chunk = f.read(STREAM_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    writer.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                    await writer.drain()
+        finally:
+            os.remove(path)
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def _handle_request(self, method, target, body, writer, keep_alive):
+        """Answers one request and returns its HTTP status."""
+        url = urllib.parse.urlsplit(target)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        if url.path in ("/metrics", "/health"):
+            if method != "GET":
+                await self._respond(writer, 405, b'{"error": "use GET"}', keep_alive=keep_alive)
+                return 405
+            answer = self.metrics.to_dict() if url.path == "/metrics" else {"status": "ok"}
+            await self._respond(writer, 200, json.dumps(answer).encode("utf-8"), keep_alive=keep_alive)
+            return 200
+        if url.path != "/convert":
+            await self._respond(writer, 404, b'{"error": "unknown path"}', keep_alive=keep_alive)
+            return 404
+        if method != "POST":
+            await self._respond(writer, 405, b'{"error": "use POST"}', keep_alive=keep_alive)
+            return 405
+        output = query.get("output", OUTPUT_JSON)
+        validation = query.get("validation", utils.VALIDATION_STRUCTURAL)
+        if output not in OUTPUTS or validation not in utils.VALIDATION_LEVELS:
+            await self._respond(writer, 400, json.dumps({"error": "unknown output or validation level"})
+                                .encode("utf-8"), keep_alive=keep_alive)
+            return 400
+        summary = await self.convert(body, output, validation, compact=query.get("compact", "1") != "0")
+        if summary["status"] != "ok":
+            await self._respond(writer, 400, json.dumps({"error": summary["error"]}).encode("utf-8"),
+                                keep_alive=keep_alive)
+            return 400
+        if output == OUTPUT_STREAM:
+            await self._respond_file(writer, summary["spill_path"], keep_alive=keep_alive)
+        else:
+            await self._respond(writer, 200, summary["GEFII"], keep_alive=keep_alive)
+        return 200
+
+    async def handle_connection(self, reader, writer):
+        """Serves the HTTP/1.1 requests of a connection until it is closed.
+
+        Args:
+            reader (asyncio.StreamReader): Reader of the connection
+            writer (asyncio.StreamWriter): Writer of the connection
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                start = time.perf_counter()
+                self.metrics.in_flight += 1
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                    headers = {}
+                    while True:
+                        line = await reader.readline()
+                        if line in (b"\r\n", b"\n", b""):
+                            break
+                        name, _, value = line.decode("latin-1").partition(":")
+                        headers[name.strip().lower()] = value.strip()
+                    keep_alive = (headers.get("connection", "").lower() != "close"
+                                  and version.upper() == "HTTP/1.1")
+                    length = int(headers.get("content-length", 0))
+                    if length > self.max_body_bytes:
+                        await self._respond(writer, 413, b'{"error": "body too large"}', keep_alive=False)
+                        status, keep_alive = 413, False
+                    else:
+                        body = await reader.readexactly(length)
+                        status = await self._handle_request(method.upper(), target, body, writer, keep_alive)
+                except (ValueError, asyncio.IncompleteReadError):
+                    await self._respond(writer, 400, b'{"error": "malformed request"}', keep_alive=False)
+                    status, keep_alive = 400, False
+                except BrokenProcessPool: # The request killed its worker twice
+                    await self._respond(writer, 503, b'{"error": "the worker process converting the request died"}',
+                                        keep_alive=False)
+                    status, keep_alive = 503, False
+                except Exception as error:
+                    await self._respond(writer, 500, json.dumps({"error": type(error).__name__ + ": " + str(error)})
+                                        .encode("utf-8"), keep_alive=False)
+                    status, keep_alive = 500, False
+                finally:
+                    self.metrics.in_flight -= 1
+                self.metrics.record(time.perf_counter() - start, status)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8765, unix_socket=None):
+        """Warms the workers up and serves until cancelled.
+
+        Args:
+            host (string, optional): Interface to listen on. Defaults to
+            "127.0.0.1".
+            port (int, optional): TCP port. Defaults to 8765.
+            unix_socket (string, optional): If given, listens on this Unix
+            socket instead of TCP. Defaults to None.
+        """
+        await self.warm_up()
+        if unix_socket is not None:
+            server = await asyncio.start_unix_server(self.handle_connection, path=unix_socket)
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port)
+        print("Serving on " + (unix_socket if unix_socket is not None else "http://{}:{}".format(host, port)))
+        async with server:
+            await server.serve_forever()
+
+def main(argv=None):
+    """Command line entry point of the service."""
+    parser = argparse.ArgumentParser(description="Serves PMF to GEFII conversions over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1", help="interface to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="TCP port (default: 8765)")
+    parser.add_argument("--unix-socket", default=None, help="listen on this Unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: number of CPUs)")
+    parser.add_argument("--cache-dir", default=None,
+                        help="directory of the on-disk conversion cache (default: $GEFII_CACHE_DIR or ~/.cache/quantumgameconverter)")
+    parser.add_argument("--no-cache", action="store_true", help="convert without the on-disk conversion cache")
+    parser.add_argument("--result-cache-bytes", type=int, default=1 << 26,
+                        help="bytes of results kept in memory (default: 64 MiB)")
+    parser.add_argument("--spill-dir", default=None, help="folder of the spill files of streamed responses")
+    args = parser.parse_args(argv)
+
+    service = ConversionService(workers=args.workers, cache_directory=args.cache_dir,
+                                result_cache_bytes=args.result_cache_bytes, spill_directory=args.spill_dir,
+                                cache=not args.no_cache)
+    try:
+        asyncio.run(service.serve(args.host, args.port, args.unix_socket))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
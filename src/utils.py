@@ -1,15 +1,95 @@
+import functools
 import json
+import shutil
 
-def save_to_json(dictionary, path):
+# Validation levels of generated GEFIIs: no validation, linear-time
+# structural checks of the GEFII arrays or full jsonschema validation
+VALIDATION_NONE = "none"
+VALIDATION_STRUCTURAL = "structural"
+VALIDATION_FULL = "full"
+VALIDATION_LEVELS = (VALIDATION_NONE, VALIDATION_STRUCTURAL, VALIDATION_FULL)
+
+def save_to_json(dictionary, path, compact=False):
     """Saves any dictionary to a json file within a given path.
 
     Args:
         dictionary (dict): Any well-formed JSON
         path (string): Path to store the JSON file at
+        compact (bool, optional): If True, writes the JSON without
+        indentation nor whitespace. Defaults to False.
     """
     # Save GEFII
     with open(path,"w", encoding="utf-8") as f:
-        json.dump(dictionary,f, indent=4)
+        if compact:
+            json.dump(dictionary, f, separators=(",", ":"))
+        else:
+            json.dump(dictionary,f, indent=4)
+
+def save_GEFII_events_to_json(events, path_or_file, compact=False, buffer_size=4096, base_level=0):
+    """Streams a GEFII to a json file from the events of GEFII._iterate_GEFII,
+    without materializing the GEFII dictionary. Apart from the write buffer,
+    memory only grows with the depth of the tree. The output is identical to
+    save_to_json applied to the corresponding GEFII dictionary.
+
+    Args:
+        events (iterable): Events as yielded by GEFII._iterate_GEFII
+        path_or_file (string or file-like): Path to store the JSON file at or
+        text file-like object to write to
+        compact (bool, optional): If True, writes the JSON without
+        indentation nor whitespace. Defaults to False.
+        buffer_size (int, optional): Number of pieces of text gathered before
+        writing them out. Defaults to 4096.
+        base_level (int, optional): Depth of the first node in an enclosing
+        GEFII, used to indent subtrees written separately. Defaults to 0.
+
+    Events may also be ("subtree", text) or ("subtree", file) to insert a
+    subtree already written with the matching base_level.
+    """
+    if not hasattr(path_or_file, "write"):
+        with open(path_or_file, "w", encoding="utf-8") as f:
+            save_GEFII_events_to_json(events, f, compact=compact, buffer_size=buffer_size, base_level=base_level)
+        return
+    indent = None if compact else 4
+    key_separator = ":" if compact else ": "
+
+    def _line(level):
+        return "" if indent is None else "\n" + " " * (indent * level)
+
+    buffer = []
+    # For every open choice node: [information-set, player, has children]
+    open_nodes = []
+    for event in events:
+        level = base_level + len(open_nodes)
+        if event[0] != "end" and open_nodes:
+            # Separate siblings
+            buffer.append(("," if open_nodes[-1][2] else "") + _line(2 * level))
+            open_nodes[-1][2] = True
+        if event[0] == "choice":
+            buffer.append("{" + _line(2 * level + 1) + '"children"' + key_separator + "[")
+            open_nodes.append([event[2], event[1], False])
+        elif event[0] == "outcome":
+            buffer.append("{" + _line(2 * level + 1) + '"payoffs"' + key_separator + str(event[1]) + ","
+                          + _line(2 * level + 1) + '"kind"' + key_separator + '"outcome"'
+                          + _line(2 * level) + "}")
+        elif event[0] == "subtree":
+            path_or_file.write("".join(buffer))
+            buffer = []
+            if hasattr(event[1], "read"):
+                shutil.copyfileobj(event[1], path_or_file)
+            else:
+                path_or_file.write(event[1])
+        else:
+            informationset, player, has_children = open_nodes.pop()
+            level = base_level + len(open_nodes)
+            buffer.append((_line(2 * level + 1) if has_children else "") + "],"
+                          + _line(2 * level + 1) + '"kind"' + key_separator + '"choice",'
+                          + _line(2 * level + 1) + '"information-set"' + key_separator + str(informationset) + ","
+                          + _line(2 * level + 1) + '"player"' + key_separator + str(player)
+                          + _line(2 * level) + "}")
+        if len(buffer) >= buffer_size:
+            path_or_file.write("".join(buffer))
+            buffer = []
+    path_or_file.write("".join(buffer))
 
 def load_GEFII_json(json_file, path):
     """Loads a JSON file of a game in extensive form with imperfect information
@@ -25,16 +105,40 @@ def load_GEFII_json(json_file, path):
     with open(str(path + json_file), "r", encoding="utf-8") as GEFII_json:
         return json.load(GEFII_json)
 
-def load_PMF_json(json_file, path):
+def load_GEFII_DAG_json(json_file, path, expand=False):
+    """Loads a JSON file of a hash-consed GEFII (see GEFII_dag.GEFIIDAG).
+
+    Args:
+        json_file (string): Name of GEFII DAG JSON file inside the path folder
+        path (string): Path to GEFII DAG JSON file's folder
+        expand (bool, optional): If True, expands the DAG back to a
+        dictionary valid along the GEFII jschema. Otherwise the DAG is
+        returned as is, to be traversed lazily. Defaults to False.
+
+    Returns:
+        GEFIIDAG or dict: The DAG, or the expanded GEFII dictionary
+    """
+    from src.GEFII_dag import GEFIIDAG
+    with open(str(path + json_file), "r", encoding="utf-8") as GEFII_DAG_json:
+        GEFII_DAG = GEFIIDAG.from_dict(json.load(GEFII_DAG_json))
+    return GEFII_DAG.expand() if expand else GEFII_DAG
+
+def load_PMF_json(json_file, path, lazy_CPMaps=False):
     """Loads a JSON file in a given path into a python dictionnary.
 
     Args:
         json_file (string): Name of PMF JSON file inside the path folder
         path (string): Path to PMF JSON file's folder
+        lazy_CPMaps (bool, optional): If True, the CPMap matrices are not
+        parsed but replaced by PMF_streaming.LazyCPMap objects, parsed into
+        numpy arrays on first access. Defaults to False.
 
     Returns:
         dict: Dictionary storage of the PMF JSON object
     """
+    if lazy_CPMaps:
+        from src.PMF_streaming import load_PMF_json_streaming
+        return load_PMF_json_streaming(json_file, path)
     with open(str(path + json_file), "r", encoding="utf-8") as PMF_json:
         return json.load(PMF_json)
 
@@ -55,3 +159,44 @@ def extract_PMF_data(PMF_json):
     data_dictionary["Labs_array"] = labs_array
     data_dictionary["Wires_array"] = wires_array
     return data_dictionary
+
+def extract_causal_structure(PMF_json):
+    """Extracts from a PMF json dictionary the only data the conversion to a
+    GEFII depends on: the number of measurement axes and outcomes of every
+    lab apart from Start and End, in the order of the Labs array, and the
+    wires between these labs, in the order of the Wires array. Labs are
+    referred to by their position, so lab names, lab indices and CPMap values
+    are left out.
+
+    Args:
+        PMF_json (dict or PMFModel): PMF dictionary or model
+
+    Returns:
+        dict: Dictionary with the "Labs" list of [number of axes, number of
+        outcomes] and the "Wires" list of [from position, to position]
+    """
+    from src.PMF_model import PMFModel
+    return PMFModel.from_PMF(PMF_json).causal_structure()
+
+@functools.lru_cache(maxsize=None)
+def load_schema_validator(schema_path):
+    """Loads a JSON schema and compiles it into a validator object. Validators
+    are cached, so every schema is read and checked once per process.
+
+    Args:
+        schema_path (string): Path to the jschema file
+
+    Returns:
+        jsonschema.protocols.Validator: Validator of the schema
+    """
+    import jsonschema
+    from src.PMF_streaming import LazyCPMap
+    with open(schema_path, "r", encoding="utf-8") as schema_file:
+        schema = json.load(schema_file)
+    validator_class = jsonschema.validators.validator_for(schema)
+    validator_class.check_schema(schema)
+    # Lazy CPMaps are arrays, their rows are parsed when validated
+    type_checker = validator_class.TYPE_CHECKER.redefine(
+        "array", lambda checker, instance: isinstance(instance, (list, LazyCPMap)))
+    validator_class = jsonschema.validators.extend(validator_class, type_checker=type_checker)
+    return validator_class(schema)